@@ -1,23 +1,37 @@
 """
 Healthcare Agents Package
+
+Exports are resolved lazily (PEP 562 module ``__getattr__``): importing
+``agents.tools`` or any other submodule no longer loads agno, openai and
+the agent definitions, which only the agent factories and the registry
+need.
 """
 
-from .healthcare_agents import (
-    get_greeting_agent,
-    get_mood_tracker_agent,
-    get_cgm_agent,
-    get_food_intake_agent,
-    get_meal_planner_agent,
-    get_interrupt_agent
-)
-from .tools import DatabaseTool
-
-__all__ = [
-    'get_greeting_agent',
-    'get_mood_tracker_agent',
-    'get_cgm_agent',
-    'get_food_intake_agent',
-    'get_meal_planner_agent',
-    'get_interrupt_agent',
-    'DatabaseTool'
-]
\ No newline at end of file
+import importlib
+
+_EXPORTS = {
+    'get_greeting_agent': '.healthcare_agents',
+    'get_mood_tracker_agent': '.healthcare_agents',
+    'get_cgm_agent': '.healthcare_agents',
+    'get_food_intake_agent': '.healthcare_agents',
+    'get_meal_planner_agent': '.healthcare_agents',
+    'get_interrupt_agent': '.healthcare_agents',
+    'AgentRegistry': '.registry',
+    'get_agent_registry': '.registry',
+    'DatabaseTool': '.tools',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,387 @@
+"""
+Population Analytics
+
+Cohort reports over every user at once: CGM time in range, mood
+distribution and food macros, grouped by city, diet, medical condition
+and physical limitation, optionally filtered to one cohort.
+
+Columns are loaded into NumPy arrays instead of per-user queries and
+loops. The users table becomes one row per user with categorical codes
+for city and diet and bitmasks for conditions and limitations (a user
+with two conditions counts towards both groups). Mood and food logs are
+scanned by log_id in chunks of ``ANALYTICS_CHUNK_ROWS`` and each chunk
+is reduced into per-user totals with ``np.bincount`` before the next
+one is read, so memory is bounded by the population size plus one
+chunk. CGM totals come from the daily rows of ``cgm_rollups`` the same
+way, one row per user per day instead of one per reading. Grouping
+per-user totals is another set of bincounts over a combined group code.
+
+Windows are whole UTC days: ``days=7`` covers today and the six days
+before. Mood and food windows must stay within the logs a retention pass
+left in the database (see agents.retention); a longer window is rejected
+rather than silently counting only part of it. CGM windows have no such
+limit, since the rollups of archived readings are kept.
+
+Per-user totals are cached for ``ANALYTICS_TTL`` seconds per metric and
+window (at most ``ANALYTICS_CACHE_SIZE`` of them), so reports over the
+same data with different groupings or filters only redo the grouping
+step.
+"""
+
+import os
+import threading
+import time
+from itertools import chain, product
+from operator import itemgetter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import cgm_rollups
+from .db import ConnectionPool, get_pool
+from .nutrition import parse_nutrients
+from .retention import LogArchive, month_bounds
+
+ANALYTICS_CHUNK_ROWS = int(os.environ.get("ANALYTICS_CHUNK_ROWS", 200000))
+ANALYTICS_TTL = float(os.environ.get("ANALYTICS_TTL", 300))
+# Cached (metric, window) totals; each holds a few arrays the size of the population
+ANALYTICS_CACHE_SIZE = int(os.environ.get("ANALYTICS_CACHE_SIZE", 8))
+
+METRICS = ("cgm", "mood", "food")
+# dimension -> users column; multi-valued dimensions hold ", "-separated labels
+DIMENSIONS = {"city": "city", "diet": "diet_preference"}
+MULTI_DIMENSIONS = {"condition": "medical_conditions", "limitation": "physical_limitations"}
+GROUP_BY = (*DIMENSIONS, *MULTI_DIMENSIONS)
+
+
+def factorize(values: Sequence, labels: Dict[str, int]) -> np.ndarray:
+    """Integer codes for values, adding unseen ones to labels (value -> code)"""
+    for value in set(values) - labels.keys():
+        labels[value] = len(labels)
+    return np.fromiter(map(labels.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+def column(rows: list, index: int) -> list:
+    return list(map(itemgetter(index), rows))
+
+
+def int_columns(rows: list) -> np.ndarray:
+    """(rows, columns) int64 array from rows of integers"""
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * len(rows[0])).reshape(len(rows), -1)
+
+
+def ordered(labels: Dict[str, int]) -> List[str]:
+    return sorted(labels, key=labels.get)
+
+
+class Population:
+    """Columnar snapshot of the users table"""
+
+    def __init__(self, pool: ConnectionPool, chunk_rows: int = ANALYTICS_CHUNK_ROWS):
+        ids, codes, sets = [], {name: [] for name in DIMENSIONS}, {name: [] for name in MULTI_DIMENSIONS}
+        lookups = {name: {} for name in (*DIMENSIONS, *MULTI_DIMENSIONS)}
+        columns = ", ".join((*DIMENSIONS.values(), *MULTI_DIMENSIONS.values()))
+        after = 0
+        while True:
+            with pool.connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT user_id, {columns} FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?
+                """, (after, chunk_rows)).fetchall()
+            if not rows:
+                break
+            ids.append(np.array(column(rows, 0), dtype=np.int64))
+            for offset, name in enumerate((*DIMENSIONS, *MULTI_DIMENSIONS), 1):
+                target = codes if name in DIMENSIONS else sets
+                target[name].append(factorize([value or "None" for value in column(rows, offset)], lookups[name]))
+            after = rows[-1][0]
+            if len(rows) < chunk_rows:
+                break
+
+        def concat(parts, dtype):
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        self.user_ids = concat(ids, np.int64)
+        self.size = len(self.user_ids)
+        self.codes = {name: concat(parts, np.int32) for name, parts in codes.items()}
+        self.labels = {name: ordered(lookups[name]) for name in DIMENSIONS}
+        # Multi-valued columns: distinct strings -> bitmask over their distinct labels
+        self.masks: Dict[str, np.ndarray] = {}
+        for name, parts in sets.items():
+            label_bits: Dict[str, int] = {}
+            combos = [[label_bits.setdefault(label.strip(), len(label_bits)) for label in text.split(",")]
+                      for text in ordered(lookups[name])]
+            combo_masks = np.array([sum(1 << bit for bit in bits) for bits in combos] or [0], dtype=np.int64)
+            self.masks[name] = combo_masks[concat(parts, np.int32)] if parts else np.empty(0, dtype=np.int64)
+            self.labels[name] = ordered(label_bits)
+        # user_id -> row; user IDs are dense integers in practice
+        self._rows = np.full(int(self.user_ids.max()) + 1 if self.size else 1, -1, dtype=np.int64)
+        self._rows[self.user_ids] = np.arange(self.size)
+
+    def rows(self, user_ids: np.ndarray) -> np.ndarray:
+        """Row of each user ID, -1 for IDs not in the snapshot"""
+        rows = np.full(len(user_ids), -1, dtype=np.int64)
+        known = user_ids < len(self._rows)
+        rows[known] = self._rows[user_ids[known]]
+        return rows
+
+    def members(self, dimension: str, label: str) -> np.ndarray:
+        """Boolean mask of users in one group of a dimension"""
+        if label not in self.labels[dimension]:
+            return np.zeros(self.size, dtype=bool)
+        index = self.labels[dimension].index(label)
+        if dimension in self.codes:
+            return self.codes[dimension] == index
+        return (self.masks[dimension] >> index) & 1 == 1
+
+
+def window_start(days: int) -> int:
+    """Start of a report window: UTC midnight, days - 1 days before today"""
+    today = int(time.time()) // 86400 * 86400
+    return today - (days - 1) * 86400
+
+
+def scan(pool: ConnectionPool, table: str, columns: str, since: int,
+         chunk_rows: int = ANALYTICS_CHUNK_ROWS) -> Iterator[list]:
+    """(log_id, user_id, *columns) rows logged at or after since, a chunk at a time, in log_id order"""
+    after = 0
+    while True:
+        with pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT log_id, user_id, {columns} FROM {table}
+                WHERE log_id > ? AND timestamp >= ? ORDER BY log_id LIMIT ?
+            """, (after, since, chunk_rows)).fetchall()
+        if not rows:
+            return
+        after = rows[-1][0]
+        yield rows
+        if len(rows) < chunk_rows:
+            return
+
+
+def cgm_totals(pool: ConnectionPool, population: Population, since: int) -> Dict[str, np.ndarray]:
+    """Per-user readings from the daily CGM rollups, a fraction of the rows of cgm_logs"""
+    n = population.size
+    readings, total, in_range = np.zeros(n), np.zeros(n), np.zeros(n)
+    day = cgm_rollups.SPANS["day"]
+    # At most one row per user per day: read ranges of user IDs
+    step = max(1, ANALYTICS_CHUNK_ROWS // ((int(time.time()) - since) // day + 1))
+    if not n:
+        return {"readings": readings, "total": total, "in_range": in_range}
+    for first in range(int(population.user_ids.min()) - 1, int(population.user_ids.max()), step):
+        with pool.connection() as conn:
+            chunk = conn.execute("""
+                SELECT user_id, count, total, in_range FROM cgm_rollups
+                WHERE user_id > ? AND user_id <= ? AND span = ? AND bucket >= ?
+            """, (first, first + step, day, since)).fetchall()
+        if not chunk:
+            continue
+        values = int_columns(chunk)
+        rows = population.rows(values[:, 0])
+        known = rows >= 0
+        rows = rows[known]
+        readings += np.bincount(rows, weights=values[known, 1], minlength=n)
+        total += np.bincount(rows, weights=values[known, 2], minlength=n)
+        in_range += np.bincount(rows, weights=values[known, 3], minlength=n)
+    return {"readings": readings, "total": total, "in_range": in_range}
+
+
+def _text_chunk(population: Population, chunk: list) -> Tuple[np.ndarray, np.ndarray, list]:
+    """Rows of the chunk's users, a mask of the known ones and the text column"""
+    rows = population.rows(np.array(column(chunk, 1), dtype=np.int64))
+    return rows, rows >= 0, column(chunk, 2)
+
+
+def mood_totals(pool: ConnectionPool, population: Population, since: int) -> Dict[str, np.ndarray]:
+    n = population.size
+    lookup: Dict[str, int] = {}
+    counts: List[np.ndarray] = []
+    for chunk in scan(pool, "mood_logs", "mood", since):
+        rows, known, moods = _text_chunk(population, chunk)
+        codes = factorize(moods, lookup)[known]
+        rows = rows[known]
+        counts.extend(np.zeros(n) for _ in range(len(lookup) - len(counts)))
+        for code in np.unique(codes):
+            counts[code] += np.bincount(rows[codes == code], minlength=n)
+    totals = {"logged": sum(counts, np.zeros(n))}
+    for mood, code in lookup.items():
+        key = f"mood:{mood.strip().lower()}"
+        totals[key] = totals[key] + counts[code] if key in totals else counts[code]
+    return totals
+
+
+def food_totals(pool: ConnectionPool, population: Population, since: int) -> Dict[str, np.ndarray]:
+    n = population.size
+    meals, parsed = np.zeros(n), np.zeros(n)
+    macros = np.zeros((3, n))
+    lookup: Dict[str, int] = {}
+    # Macros per distinct nutrients string, NaN when it does not parse
+    table: List[Tuple[float, float, float]] = []
+    for chunk in scan(pool, "food_logs", "nutrients", since):
+        rows, known, nutrients = _text_chunk(population, chunk)
+        codes = factorize(nutrients, lookup)
+        table.extend(parse_nutrients(text) or (np.nan,) * 3 for text in ordered(lookup)[len(table):])
+        values = np.array(table, dtype=float).reshape(-1, 3)[codes[known]]
+        rows = rows[known]
+        ok = ~np.isnan(values[:, 0])
+        meals += np.bincount(rows, minlength=n)
+        parsed += np.bincount(rows[ok], minlength=n)
+        for i in range(3):
+            macros[i] += np.bincount(rows[ok], weights=values[ok, i], minlength=n)
+    return {"meals": meals, "parsed": parsed, "carbs": macros[0], "protein": macros[1], "fat": macros[2]}
+
+
+TOTALS = {"cgm": cgm_totals, "mood": mood_totals, "food": food_totals}
+# Per-user total that makes a user active for a metric
+ACTIVITY = {"cgm": "readings", "mood": "logged", "food": "meals"}
+
+
+def summarize(metric: str, users: int, sums: Dict[str, float]) -> dict:
+    """Report fields of one group from its summed per-user totals"""
+    if metric == "cgm":
+        readings = sums["readings"]
+        return {
+            "users": users,
+            "active_users": int(sums["active"]),
+            "readings": int(readings),
+            "mean_glucose": round(sums["total"] / readings, 1) if readings else None,
+            "time_in_range": round(sums["in_range"] / readings, 4) if readings else None,
+        }
+    if metric == "mood":
+        moods = {key.split(":", 1)[1]: int(value) for key, value in sums.items() if key.startswith("mood:")}
+        logged = int(sums["logged"])
+        return {
+            "users": users,
+            "active_users": int(sums["active"]),
+            "moods_logged": logged,
+            "distribution": {mood: round(count / logged, 4)
+                             for mood, count in sorted(moods.items(), key=lambda item: -item[1]) if count}
+            if logged else {},
+        }
+    parsed = sums["parsed"]
+    return {
+        "users": users,
+        "active_users": int(sums["active"]),
+        "meals": int(sums["meals"]),
+        **{f"avg_{macro}_g": round(sums[macro] / parsed, 1) if parsed else None
+           for macro in ("carbs", "protein", "fat")},
+    }
+
+
+def group(metric: str, population: Population, totals: Dict[str, np.ndarray],
+          by: Sequence[str], filters: Dict[str, str]) -> List[dict]:
+    """Sum per-user totals into one report row per group"""
+    totals = {**totals, "active": (totals[ACTIVITY[metric]] > 0).astype(float)}
+
+    base = np.ones(population.size, dtype=bool)
+    for dimension, label in filters.items():
+        base &= population.members(dimension, label)
+
+    single = [dimension for dimension in by if dimension in DIMENSIONS]
+    multi = [dimension for dimension in by if dimension in MULTI_DIMENSIONS]
+    # Mixed-radix code over the single-valued dimensions
+    code = np.zeros(population.size, dtype=np.int64)
+    groups = 1
+    for dimension in single:
+        code = code * len(population.labels[dimension]) + population.codes[dimension]
+        groups *= len(population.labels[dimension])
+
+    report = []
+    for combo in product(*(population.labels[dimension] for dimension in multi)):
+        mask = base.copy()
+        for dimension, label in zip(multi, combo):
+            mask &= population.members(dimension, label)
+        codes = code[mask]
+        users = np.bincount(codes, minlength=groups)
+        sums = {key: np.bincount(codes, weights=array[mask], minlength=groups) for key, array in totals.items()}
+        for g in np.flatnonzero(users):
+            key, rest = {}, int(g)
+            for dimension in reversed(single):
+                rest, index = divmod(rest, len(population.labels[dimension]))
+                key[dimension] = population.labels[dimension][index]
+            key = {dimension: key[dimension] for dimension in single}
+            key.update(zip(multi, combo))
+            report.append({**key, **summarize(metric, int(users[g]), {k: float(v[g]) for k, v in sums.items()})})
+    return report
+
+
+class PopulationAnalytics:
+    """Cohort reports for one database, with per-user totals cached for ttl seconds"""
+
+    def __init__(self, pool: ConnectionPool, ttl: float = ANALYTICS_TTL):
+        self.pool = pool
+        self.ttl = ttl
+        self.archive = LogArchive(pool)
+        self._population: Optional[Tuple[float, Population]] = None
+        self._totals: Dict[tuple, Tuple[float, Population, Dict[str, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"scans": 0, "hits": 0}
+
+    def population(self) -> Population:
+        now = time.monotonic()
+        if self._population is None or self._population[0] <= now:
+            self._population = (now + self.ttl, Population(self.pool))
+        return self._population[1]
+
+    def totals(self, metric: str, days: int) -> Tuple[Population, Dict[str, np.ndarray]]:
+        with self._lock:
+            now = time.monotonic()
+            cached = self._totals.get((metric, days))
+            if cached is not None and cached[0] > now:
+                self.counters["hits"] += 1
+                return cached[1], cached[2]
+            population = self.population()
+            since = window_start(days)
+            totals = TOTALS[metric](self.pool, population, since)
+            for key in [key for key, entry in self._totals.items() if entry[0] <= now]:
+                del self._totals[key]
+            while self._totals and len(self._totals) >= ANALYTICS_CACHE_SIZE:
+                del self._totals[min(self._totals, key=lambda key: self._totals[key][0])]
+            self._totals[(metric, days)] = (now + self.ttl, population, totals)
+            self.counters["scans"] += 1
+            return population, totals
+
+    def max_days(self, metric: str) -> Optional[int]:
+        """Longest window still entirely in the log table, None when nothing is archived"""
+        if metric == "cgm":
+            return None
+        months = self.archive.months(metric)
+        if not months:
+            return None
+        return (window_start(1) - month_bounds(months[-1])[1]) // 86400 + 1
+
+    def report(self, metric: str, by: Sequence[str] = (), filters: Optional[Dict[str, str]] = None,
+               days: int = 7) -> dict:
+        """Grouped report of metric over the last days, e.g. report("cgm", ["city", "diet"])"""
+        filters = filters or {}
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; expected one of {', '.join(METRICS)}")
+        unknown = [dimension for dimension in (*by, *filters) if dimension not in GROUP_BY]
+        if unknown:
+            raise ValueError(f"Unknown dimension {unknown[0]!r}; expected one of {', '.join(GROUP_BY)}")
+        max_days = self.max_days(metric)
+        if max_days is not None and days > max_days:
+            raise ValueError(f"Older {metric} logs are archived; {metric} reports cover at most {max_days} days")
+        population, totals = self.totals(metric, days)
+        return {
+            "metric": metric,
+            "days": days,
+            "by": list(by),
+            "filters": filters,
+            "groups": group(metric, population, totals, list(dict.fromkeys(by)), filters),
+        }
+
+    def stats(self) -> dict:
+        return {"cached": len(self._totals), **self.counters}
+
+
+_analytics: Dict[str, PopulationAnalytics] = {}
+_analytics_lock = threading.Lock()
+
+
+def get_population_analytics(db_file: str) -> PopulationAnalytics:
+    """Return the process-wide analytics engine for a database file"""
+    with _analytics_lock:
+        engine = _analytics.get(db_file)
+        if engine is None:
+            engine = _analytics[db_file] = PopulationAnalytics(get_pool(db_file))
+        return engine
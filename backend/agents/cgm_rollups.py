@@ -0,0 +1,140 @@
+"""
+CGM Rollups and Downsampled History
+
+``cgm_rollups`` holds per-user hourly and daily aggregates of cgm_logs
+(count, sum, min, max and readings in range). Sums rather than means are
+stored so every write can fold its readings in with one upsert per
+bucket, in the same transaction as the insert; the table can never
+disagree with the committed readings. Buckets are aligned to UTC.
+
+``history`` answers a time-range query at the coarsest resolution that
+still gives about ``max_points`` points: raw readings for short ranges,
+hourly buckets for weeks and daily buckets beyond, so a multi-month
+chart reads hundreds of rows instead of hundreds of thousands.
+"""
+
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .glucose_stats import RANGE_HIGH, RANGE_LOW
+
+# resolution -> bucket width in seconds
+SPANS = {"hour": 3600, "day": 86400}
+RESOLUTIONS = ("auto", "raw", *SPANS)
+
+# Typical sensor cadence, used to estimate how many raw readings a range holds
+READING_INTERVAL = 300
+HISTORY_MAX_POINTS = 500
+
+INSERT_INTO = "INSERT INTO cgm_rollups (user_id, span, bucket, count, total, min_glucose, max_glucose, in_range)"
+MERGE = """
+    ON CONFLICT (user_id, span, bucket) DO UPDATE SET
+        count = count + excluded.count,
+        total = total + excluded.total,
+        min_glucose = MIN(min_glucose, excluded.min_glucose),
+        max_glucose = MAX(max_glucose, excluded.max_glucose),
+        in_range = in_range + excluded.in_range
+"""
+UPSERT_SQL = f"{INSERT_INTO} VALUES (?, ?, ?, ?, ?, ?, ?, ?) {MERGE}"
+
+# (user_id, epoch seconds, glucose mg/dL)
+Reading = Tuple[int, int, int]
+
+
+def aggregate(readings: Iterable[Reading]) -> List[tuple]:
+    """Pre-aggregate readings into upsert rows, one per user, span and bucket"""
+    buckets: Dict[tuple, list] = {}
+    spans = tuple(SPANS.values())
+    for user_id, timestamp, glucose in readings:
+        in_range = 1 if RANGE_LOW <= glucose <= RANGE_HIGH else 0
+        for span in spans:
+            key = (user_id, span, timestamp - timestamp % span)
+            acc = buckets.get(key)
+            if acc is None:
+                buckets[key] = [1, glucose, glucose, glucose, in_range]
+                continue
+            acc[0] += 1
+            acc[1] += glucose
+            if glucose < acc[2]:
+                acc[2] = glucose
+            elif glucose > acc[3]:
+                acc[3] = glucose
+            acc[4] += in_range
+    return [(*key, *acc) for key, acc in buckets.items()]
+
+
+def apply_readings(conn: sqlite3.Connection, readings: Iterable[Reading]) -> None:
+    """Fold readings into the rollups inside the caller's write transaction
+
+    Skipped while the table does not exist yet: those readings committed
+    before the migration created it, so its backfill covers them.
+    """
+    try:
+        conn.executemany(UPSERT_SQL, aggregate(readings))
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+
+
+def backfill(conn: sqlite3.Connection, after_log_id: int = 0, up_to_log_id: Optional[int] = None) -> int:
+    """Fold cgm_logs rows with after_log_id < log_id <= up_to_log_id into the rollups"""
+    if up_to_log_id is None:
+        up_to_log_id = conn.execute("SELECT COALESCE(MAX(log_id), 0) FROM cgm_logs").fetchone()[0]
+    for span in SPANS.values():
+        conn.execute(f"""
+            {INSERT_INTO}
+            SELECT user_id, {span}, timestamp - timestamp % {span}, COUNT(*), SUM(glucose_reading),
+                   MIN(glucose_reading), MAX(glucose_reading),
+                   SUM(glucose_reading BETWEEN {RANGE_LOW} AND {RANGE_HIGH})
+            FROM cgm_logs WHERE log_id > ? AND log_id <= ?
+            GROUP BY user_id, timestamp - timestamp % {span}
+            {MERGE}
+        """, (after_log_id, up_to_log_id))
+    return up_to_log_id
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """Recompute every rollup from cgm_logs, e.g. after a bulk load that bypassed them
+
+    Readings already moved to the archive (agents.retention) are not in
+    cgm_logs, so rebuild before archiving.
+    """
+    conn.execute("DELETE FROM cgm_rollups")
+    backfill(conn)
+
+
+def pick_resolution(start: int, end: int, max_points: int = HISTORY_MAX_POINTS) -> str:
+    """Finest resolution whose expected point count for the range fits max_points"""
+    seconds = max(0, end - start)
+    if seconds / READING_INTERVAL <= max_points:
+        return "raw"
+    if seconds / SPANS["hour"] <= max_points:
+        return "hour"
+    return "day"
+
+
+def history(conn: sqlite3.Connection, user_id: int, start: int, end: int,
+            resolution: str = "auto", max_points: int = HISTORY_MAX_POINTS) -> Tuple[str, list]:
+    """Readings or buckets in [start, end) for a user, oldest first
+
+    Returns the resolution used and its rows: (timestamp, glucose, log_id)
+    for raw readings, (bucket, count, total, min, max, in_range) for rollups.
+    A bucket is included when it starts inside the range.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}; expected one of {', '.join(RESOLUTIONS)}")
+    if resolution == "auto":
+        resolution = pick_resolution(start, end, max_points)
+    if resolution == "raw":
+        rows = conn.execute("""
+            SELECT timestamp, glucose_reading, log_id FROM cgm_logs
+            WHERE user_id = ? AND timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp, log_id
+        """, (user_id, start, end)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT bucket, count, total, min_glucose, max_glucose, in_range FROM cgm_rollups
+            WHERE user_id = ? AND span = ? AND bucket >= ? AND bucket < ?
+            ORDER BY bucket
+        """, (user_id, SPANS[resolution], start, end)).fetchall()
+    return resolution, rows
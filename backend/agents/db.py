@@ -0,0 +1,224 @@
+"""
+SQLite Connection Pool
+
+Several worker processes may share one database file (``WEB_CONCURRENCY``
+> 1). Readers run concurrently under WAL. Writers queue on a per-process
+lock and then on an exclusive ``flock`` of ``<db file>.write-lock``, so
+transactions from different workers follow each other instead of
+colliding in SQLite's busy handler; writes that still hit
+``database is locked`` (e.g. against a bulk load from another tool) are
+retried with jittered backoff by ``retry_busy``.
+"""
+
+import functools
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to SQLite's own locking
+    fcntl = None
+
+DB_FILE = os.environ.get("DB_FILE", "/app/data/user_data.db")
+
+# Pool tuning - overridable per deployment
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", 16384))
+MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+BUSY_RETRIES = int(os.environ.get("DB_BUSY_RETRIES", 5))
+PROCESS_WRITE_LOCK = os.environ.get("DB_PROCESS_WRITE_LOCK", "1").lower() in ("1", "true", "yes")
+STATEMENT_CACHE_SIZE = 256
+
+# Worker processes serving the app (uvicorn reads the same variable)
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+
+def is_busy_error(error: BaseException) -> bool:
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in str(error) or "busy" in str(error)
+    )
+
+
+def retry_busy(fn: Callable) -> Callable:
+    """Retry a write when SQLite reports the database locked or busy
+
+    The decorated function must be safe to run again: its transaction was
+    rolled back when the connection went back to the pool.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt >= BUSY_RETRIES or not is_busy_error(e):
+                    raise
+                time.sleep(random.uniform(0, min(1.0, 0.05 * 2 ** attempt)))
+                attempt += 1
+
+    return wrapper
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """Exclusive advisory lock shared by every process using ``path``
+
+    Yields whether the lock is held: with ``blocking=False`` another
+    holder makes it yield False straight away instead of waiting.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived, pre-tuned SQLite connections"""
+
+    def __init__(self, db_file: str, size: int = POOL_SIZE):
+        self.db_file = db_file
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        # SQLite allows one writer at a time; queueing writers here avoids
+        # the busy-handler's sleep/backoff loop when threads collide
+        self._write_lock = threading.Lock()
+        # Same across processes; opened on first write, used under _write_lock
+        self._process_lock_file = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with WAL and the tuned pragmas applied"""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        # Only takes effect on a new, empty database file (before WAL is
+        # enabled); existing files are converted by agents.retention
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while under the bound"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection to the pool, discarding any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection holding the write lock for this database
+
+        The lock is held by one thread of one process at a time.
+        """
+        with self._write_lock:
+            locked = self._lock_process()
+            try:
+                with self.connection() as conn:
+                    yield conn
+            finally:
+                if locked:
+                    fcntl.flock(self._process_lock_file, fcntl.LOCK_UN)
+
+    def _lock_process(self) -> bool:
+        if fcntl is None or not PROCESS_WRITE_LOCK or self.db_file == ":memory:":
+            return False
+        if self._process_lock_file is None:
+            self._process_lock_file = open(f"{self.db_file}.write-lock", "a")
+        fcntl.flock(self._process_lock_file, fcntl.LOCK_EX)
+        return True
+
+    def close(self) -> None:
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+        with self._write_lock:
+            if self._process_lock_file is not None:
+                self._process_lock_file.close()
+                self._process_lock_file = None
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file: Optional[str] = None) -> ConnectionPool:
+    """Return the process-wide pool for a database file"""
+    db_file = db_file or DB_FILE
+    pool = _pools.get(db_file)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_file)
+            if pool is None:
+                pool = ConnectionPool(db_file)
+                _pools[db_file] = pool
+    return pool
+
+
+def close_pools() -> None:
+    """Close every pool opened in this process"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,328 @@
+"""
+Streaming Glucose Statistics and Alerts
+
+Keeps per-user rolling statistics over true time windows (1h, 24h, 7d)
+in memory. Each reading updates every window in amortized O(1): readings
+are appended to one shared buffer per user, and each window only
+advances its start pointer past readings that have aged out. Range
+alerts, rate-of-change alerts and hypo/hyper event boundaries are
+derived from the same update.
+
+Readings older than a user's latest reading are stored in the database
+but skipped here until the next ``rebuild``.
+
+With several worker processes each one holds its own engine and would
+only see the readings it wrote itself. In that mode (``WEB_CONCURRENCY``
+> 1, or ``GLUCOSE_STATS_SYNC=1``) ``sync`` reads every cgm_logs row
+past the last ``log_id`` this engine has seen, so readings from all
+workers are folded in once each, in commit order. A reading logged
+through the chat endpoint is folded in ahead of that by ``add_committed``,
+which returns its alerts at once; ``sync`` then skips it, or, when a
+concurrent ``sync`` got to it first, keeps its alerts for the writer.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from .db import WORKERS, ConnectionPool
+
+GLUCOSE_STATS_SYNC = os.environ.get("GLUCOSE_STATS_SYNC", "1" if WORKERS > 1 else "0").lower() in ("1", "true", "yes")
+
+# Normal range shared by alerts, time-in-range and event detection (mg/dL)
+RANGE_LOW = 80
+RANGE_HIGH = 300
+
+# mg/dL per minute; rate is only computed between readings this close
+RAPID_CHANGE_RATE = 3.0
+MAX_RATE_GAP_SECONDS = 30 * 60
+
+WINDOWS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+MAX_WINDOW = max(WINDOWS.values())
+MAX_EVENTS = 20
+# Alerts of synced rows kept for writers that have not collected them yet
+MAX_UNCOLLECTED_ALERTS = 10000
+
+
+def range_alert(glucose: int) -> Optional[str]:
+    """Alert text for a single reading outside the normal range"""
+    if glucose < RANGE_LOW or glucose > RANGE_HIGH:
+        return f"⚠️ ALERT: Glucose reading outside normal range ({RANGE_LOW}-{RANGE_HIGH} mg/dL)"
+    return None
+
+
+class _Window:
+    __slots__ = ("span", "start", "total", "count", "in_range")
+
+    def __init__(self, span: int):
+        self.span = span
+        self.start = 0
+        self.total = 0
+        self.count = 0
+        self.in_range = 0
+
+
+class UserGlucoseStats:
+    """Rolling windows, last rate of change and event state for one user"""
+
+    __slots__ = ("times", "values", "windows", "rate", "event", "events")
+
+    def __init__(self):
+        self.times: List[int] = []
+        self.values: List[int] = []
+        self.windows = {name: _Window(span) for name, span in WINDOWS.items()}
+        self.rate: Optional[float] = None
+        # Open event: [kind, started_at, extreme reading]
+        self.event: Optional[list] = None
+        self.events: Deque[dict] = deque(maxlen=MAX_EVENTS)
+
+    @property
+    def last_time(self) -> Optional[int]:
+        return self.times[-1] if self.times else None
+
+    def _evict(self, now: int) -> None:
+        times, values = self.times, self.values
+        for window in self.windows.values():
+            cutoff = now - window.span
+            while window.start < len(times) and times[window.start] <= cutoff:
+                value = values[window.start]
+                window.total -= value
+                window.count -= 1
+                window.in_range -= RANGE_LOW <= value <= RANGE_HIGH
+                window.start += 1
+        # Drop the prefix every window has passed once it is large enough
+        oldest = min(window.start for window in self.windows.values())
+        if oldest > 64 and oldest * 2 > len(times):
+            del times[:oldest]
+            del values[:oldest]
+            for window in self.windows.values():
+                window.start -= oldest
+
+    def add(self, timestamp: int, glucose: int) -> List[str]:
+        """Fold one reading in and return the alerts it raises"""
+        last_time = self.last_time
+        if last_time is not None and timestamp < last_time:
+            alert = range_alert(glucose)
+            return [alert] if alert else []
+
+        alerts = []
+        self.rate = None
+        if last_time is not None and 0 < timestamp - last_time <= MAX_RATE_GAP_SECONDS:
+            self.rate = (glucose - self.values[-1]) * 60 / (timestamp - last_time)
+            if abs(self.rate) >= RAPID_CHANGE_RATE:
+                direction = "rising" if self.rate > 0 else "falling"
+                alerts.append(f"⚠️ ALERT: Glucose {direction} rapidly ({self.rate:+.1f} mg/dL/min)")
+
+        self.times.append(timestamp)
+        self.values.append(glucose)
+        in_range = RANGE_LOW <= glucose <= RANGE_HIGH
+        for window in self.windows.values():
+            window.total += glucose
+            window.count += 1
+            window.in_range += in_range
+        self._evict(timestamp)
+
+        kind = None if in_range else ("hypo" if glucose < RANGE_LOW else "hyper")
+        if self.event is not None and self.event[0] != kind:
+            open_kind, started, extreme = self.event
+            self.events.append({"kind": open_kind, "start": started, "end": timestamp, "extreme": extreme})
+            self.event = None
+        if kind is not None:
+            if self.event is None:
+                self.event = [kind, timestamp, glucose]
+                label = "Low glucose (hypoglycemia)" if kind == "hypo" else "High glucose (hyperglycemia)"
+                alerts.insert(0, f"{range_alert(glucose)}\n🚨 {label} event started")
+            else:
+                self.event[2] = min(self.event[2], glucose) if kind == "hypo" else max(self.event[2], glucose)
+                alerts.insert(0, range_alert(glucose))
+        return alerts
+
+    def readings(self) -> Iterable[Tuple[int, int]]:
+        start = self.windows["7d"].start
+        return zip(self.times[start:], self.values[start:])
+
+    def snapshot(self, now: Optional[int] = None) -> dict:
+        if now is not None:
+            self._evict(now)
+        windows = {}
+        for name, window in self.windows.items():
+            windows[name] = {
+                "count": window.count,
+                "mean": window.total / window.count if window.count else None,
+                "time_in_range": window.in_range / window.count if window.count else None,
+            }
+        event = None
+        if self.event is not None:
+            event = {"kind": self.event[0], "start": self.event[1], "extreme": self.event[2]}
+        return {
+            "latest": self.values[-1] if self.values else None,
+            "latest_timestamp": self.last_time,
+            "rate_of_change": self.rate,
+            "windows": windows,
+            "current_event": event,
+            "recent_events": list(self.events),
+        }
+
+
+class GlucoseStatsEngine:
+    """Process-wide map of per-user streaming glucose statistics"""
+
+    def __init__(self, sync: bool = GLUCOSE_STATS_SYNC):
+        self._users: Dict[int, UserGlucoseStats] = {}
+        self._lock = threading.Lock()
+        self.sync_enabled = sync
+        # Highest cgm_logs.log_id folded in; None until the first rebuild
+        self._synced_log_id: Optional[int] = None
+        self._sync_lock = threading.Lock()
+        # Rows past _synced_log_id already folded in by add_committed
+        self._folded_ahead: Set[int] = set()
+        # log_id -> non-empty alerts of rows sync folded in
+        self._uncollected: Dict[int, List[str]] = {}
+
+    @property
+    def syncing(self) -> bool:
+        """True when readings must be folded in with ``sync`` instead of added directly"""
+        return self.sync_enabled and self._synced_log_id is not None
+
+    def add_reading(self, user_id: int, timestamp: int, glucose: int) -> List[str]:
+        with self._lock:
+            return self._add(user_id, timestamp, glucose)
+
+    def add_committed(self, log_id: int, user_id: int, timestamp: int, glucose: int) -> List[str]:
+        """Fold in a reading this process just committed and return its alerts
+
+        Without sync this is ``add_reading``. With sync the reading is folded
+        in ahead of the rows other workers committed before it, so the writer
+        neither waits for nor reads them.
+        """
+        with self._lock:
+            if not self.syncing:
+                return self._add(user_id, timestamp, glucose)
+            if log_id <= self._synced_log_id:
+                return self._uncollected.pop(log_id, [])
+            self._folded_ahead.add(log_id)
+            return self._add(user_id, timestamp, glucose)
+
+    def _add(self, user_id: int, timestamp: int, glucose: int) -> List[str]:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = UserGlucoseStats()
+        return state.add(timestamp, glucose)
+
+    def add_readings(self, readings: Iterable[Tuple[int, int, int]]) -> None:
+        """Fold in (user_id, timestamp, glucose) rows, e.g. a committed batch"""
+        with self._lock:
+            for user_id, timestamp, glucose in sorted(readings, key=lambda r: r[1]):
+                state = self._users.get(user_id)
+                if state is None:
+                    state = self._users[user_id] = UserGlucoseStats()
+                state.add(timestamp, glucose)
+
+    def snapshot(self, user_id: int, now: Optional[int] = None) -> dict:
+        """Current statistics for a user, with windows evaluated at ``now``"""
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                state = UserGlucoseStats()
+            return state.snapshot(now)
+
+    def latest_readings(self) -> Dict[int, Tuple[int, int]]:
+        """user_id -> (timestamp, glucose) of each user's latest reading"""
+        with self._lock:
+            return {
+                user_id: (state.times[-1], state.values[-1])
+                for user_id, state in self._users.items() if state.times
+            }
+
+    def sync(self, pool: ConnectionPool) -> Dict[int, List[str]]:
+        """Fold in cgm_logs rows committed since the last sync; log_id -> alerts
+
+        Does nothing before the first rebuild, which sets the starting point.
+        """
+        with self._sync_lock:
+            if self._synced_log_id is None:
+                return {}
+            with pool.connection() as conn:
+                rows = conn.execute("""
+                    SELECT log_id, user_id, timestamp, glucose_reading FROM cgm_logs
+                    WHERE log_id > ? ORDER BY log_id
+                """, (self._synced_log_id,)).fetchall()
+            alerts = {}
+            with self._lock:
+                for log_id, user_id, timestamp, glucose in rows:
+                    if log_id in self._folded_ahead:
+                        self._folded_ahead.discard(log_id)
+                        continue
+                    alerts[log_id] = self._add(user_id, timestamp, glucose)
+                    if alerts[log_id]:
+                        self._uncollected[log_id] = alerts[log_id]
+                while len(self._uncollected) > MAX_UNCOLLECTED_ALERTS:
+                    del self._uncollected[next(iter(self._uncollected))]
+                if rows:
+                    self._synced_log_id = rows[-1][0]
+            return alerts
+
+    def rebuild(self, pool: ConnectionPool, now: Optional[int] = None) -> int:
+        """Reload the last 7 days from cgm_logs; returns readings loaded
+
+        Readings that arrive while the reload runs are replayed on top of the
+        reloaded state before it is swapped in. In sync mode they are instead
+        read again by the next ``sync``, which resumes after the last row the
+        reload saw.
+        """
+        now = int(time.time()) if now is None else now
+        fresh: Dict[int, UserGlucoseStats] = {}
+        loaded = 0
+        with pool.connection() as conn:
+            # One read transaction, so the high-water mark matches the rows loaded
+            conn.execute("BEGIN")
+            try:
+                last_log_id = conn.execute("SELECT COALESCE(MAX(log_id), 0) FROM cgm_logs").fetchone()[0]
+                cursor = conn.execute("""
+                    SELECT user_id, timestamp, glucose_reading FROM cgm_logs
+                    WHERE timestamp > ? AND log_id <= ? ORDER BY user_id, timestamp
+                """, (now - MAX_WINDOW, last_log_id))
+                for user_id, timestamp, glucose in cursor:
+                    state = fresh.get(user_id)
+                    if state is None:
+                        state = fresh[user_id] = UserGlucoseStats()
+                    state.add(timestamp, glucose)
+                    loaded += 1
+            finally:
+                conn.rollback()
+
+        if self.sync_enabled:
+            with self._sync_lock, self._lock:
+                self._users = fresh
+                self._synced_log_id = last_log_id
+                # Rows folded ahead are either in the reload or read again by the next sync
+                self._folded_ahead.clear()
+            return loaded
+
+        with self._lock:
+            for user_id, live in self._users.items():
+                state = fresh.get(user_id)
+                if state is None:
+                    fresh[user_id] = live
+                    continue
+                for timestamp, glucose in live.readings():
+                    if timestamp > state.last_time:
+                        state.add(timestamp, glucose)
+            self._users = fresh
+        return loaded
+
+
+_engines: Dict[str, GlucoseStatsEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_glucose_stats(db_file: str) -> GlucoseStatsEngine:
+    """Return the process-wide statistics engine for a database file"""
+    with _engines_lock:
+        engine = _engines.get(db_file)
+        if engine is None:
+            engine = _engines[db_file] = GlucoseStatsEngine()
+        return engine
@@ -3,52 +3,49 @@ Healthcare Agent Definitions
 """
 
 import os
+from typing import Optional
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
+from . import replies
 from .tools import DatabaseTool
+from .glucose_stats import RANGE_LOW, RANGE_HIGH
+from .llm_client import LLM_BASE_URL, LLM_MODEL
+from .nutrition import get_nutrient_estimator
+from .meal_plans import get_meal_planner
+from .metrics import TOOL_SECONDS, instrument
 
-# Configuration - Use Groq for faster responses
-LLM_MODEL = "llama-3.1-70b-versatile"  # Groq model
+# Configuration - Use Groq for faster responses (LLM_MODEL / LLM_BASE_URL)
 db_tool = DatabaseTool()
 
+MISSING_USER_MESSAGE = replies.STATIC["missing_user"].content
+
+def context_user_id(agent: Optional[Agent], user_id: Optional[int] = None) -> Optional[int]:
+    """Validated user from the run context (see agents.registry), else the ID the model passed"""
+    context = agent.context if agent is not None and agent.context else {}
+    return context.get("user_id") or user_id
+
 def get_greeting_agent() -> Agent:
     """Agent that greets users and validates their ID"""
     
+    @instrument(TOOL_SECONDS)
     def validate_and_greet(user_id: int) -> str:
         """Validate user ID and return greeting"""
         result = db_tool.validate_user(user_id)
-        
-        if result["valid"]:
-            return f"""User validated successfully!
-            
-Name: {result['first_name']} {result['last_name']}
-City: {result['city']}
-Diet: {result['diet_preference']}
-Medical Conditions: {result['medical_conditions']}
-Physical Limitations: {result['physical_limitations']}
-
-Hello, {result['first_name']} from {result['city']}! 👋
-
-How can I assist you today? I can help you with:
-- Logging your mood
-- Recording CGM readings
-- Tracking food intake
-- Generating personalized meal plans
-- Answering general questions"""
-        else:
-            return "❌ Invalid User ID. Please enter a valid ID between 1 and 100."
+        if not result["valid"]:
+            return replies.STATIC["invalid_user"].content
+        return replies.greeting(user_id, result).content
     
     return Agent(
         name="Greeting Agent",
         model=OpenAIChat(
             id=LLM_MODEL,
             api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
+            base_url=LLM_BASE_URL
         ),
         tools=[validate_and_greet],
         instructions=[
             "You are a friendly healthcare assistant.",
-            "Your first task is to ask the user for their User ID (1-100).",
+            "Your first task is to ask the user for their User ID.",
             "Once you receive a user ID, call the validate_and_greet function.",
             "If the ID is invalid, politely ask them to try again.",
             "If valid, show the greeting message and ask how you can help.",
@@ -59,8 +56,12 @@ How can I assist you today? I can help you with:
 def get_mood_tracker_agent() -> Agent:
     """Agent that tracks user mood"""
     
-    def log_mood_function(user_id: int, mood: str) -> str:
+    @instrument(TOOL_SECONDS)
+    def log_mood_function(agent: Agent, mood: str, user_id: Optional[int] = None) -> str:
         """Log mood and calculate summary"""
+        user_id = context_user_id(agent, user_id)
+        if user_id is None:
+            return MISSING_USER_MESSAGE
         result = db_tool.log_mood(user_id, mood)
         logs = db_tool.get_mood_logs(user_id, limit=7)
         
@@ -70,21 +71,14 @@ def get_mood_tracker_agent() -> Agent:
             m = log["mood"]
             mood_counts[m] = mood_counts.get(m, 0) + 1
         
-        summary = "\n".join([f"• {m}: {c} time(s)" for m, c in mood_counts.items()])
-        
-        return f"""✅ {result['message']}
-
-📊 Your 7-day mood summary:
-{summary}
-
-Your mood has been logged successfully!"""
+        return replies.mood_logged(mood, result["message"], mood_counts).content
     
     return Agent(
         name="Mood Tracker Agent",
         model=OpenAIChat(
             id=LLM_MODEL,
             api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
+            base_url=LLM_BASE_URL
         ),
         tools=[log_mood_function],
         instructions=[
@@ -100,35 +94,28 @@ Your mood has been logged successfully!"""
 def get_cgm_agent() -> Agent:
     """Agent that logs CGM readings"""
     
-    def log_cgm_function(user_id: int, glucose_reading: int) -> str:
+    @instrument(TOOL_SECONDS)
+    def log_cgm_function(agent: Agent, glucose_reading: int, user_id: Optional[int] = None) -> str:
         """Log CGM reading"""
+        user_id = context_user_id(agent, user_id)
+        if user_id is None:
+            return MISSING_USER_MESSAGE
         result = db_tool.log_cgm(user_id, glucose_reading)
-        
-        message = f"""✅ {result['message']}"""
-        
-        if result.get("alert"):
-            message += f"\n\n{result['alert']}"
-        
-        # Get recent readings
-        logs = db_tool.get_cgm_logs(user_id, limit=7)
-        if logs:
-            avg = sum(log["glucose"] for log in logs) / len(logs)
-            message += f"\n\n📊 7-day average: {avg:.1f} mg/dL"
-        
-        return message
+        # Rolling statistics maintained in memory as readings arrive
+        return replies.cgm_logged(glucose_reading, result["message"], result["alert"], result["stats"]).content
     
     return Agent(
         name="CGM Agent",
         model=OpenAIChat(
             id=LLM_MODEL,
             api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
+            base_url=LLM_BASE_URL
         ),
         tools=[log_cgm_function],
         instructions=[
             "You help users log their Continuous Glucose Monitor (CGM) readings.",
             "Ask for their current glucose reading in mg/dL.",
-            "Normal range is 80-300 mg/dL.",
+            f"Normal range is {RANGE_LOW}-{RANGE_HIGH} mg/dL.",
             "Call log_cgm_function with user_id and glucose_reading.",
             "If the reading is outside the normal range, acknowledge the alert.",
             "Provide the 7-day average if available.",
@@ -139,43 +126,25 @@ def get_cgm_agent() -> Agent:
 def get_food_intake_agent() -> Agent:
     """Agent that logs food intake and categorizes nutrients"""
     
-    def log_food_function(user_id: int, meal_description: str) -> str:
-        """Log food and categorize nutrients using LLM"""
-        
-        # Use LLM to categorize nutrients
-        from openai import OpenAI
-        client = OpenAI(
-            api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
-        )
+    @instrument(TOOL_SECONDS)
+    def log_food_function(agent: Agent, meal_description: str, user_id: Optional[int] = None) -> str:
+        """Log food and categorize nutrients (cache, food index, then LLM)"""
+        user_id = context_user_id(agent, user_id)
+        if user_id is None:
+            return MISSING_USER_MESSAGE
         
-        response = client.chat.completions.create(
-            model="llama-3.1-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are a nutrition expert. Analyze the meal and estimate macronutrients. Respond ONLY with format: 'Carbs: Xg, Protein: Yg, Fat: Zg'"},
-                {"role": "user", "content": f"Analyze this meal: {meal_description}"}
-            ],
-            max_tokens=50
-        )
-        
-        nutrients = response.choices[0].message.content.strip()
+        nutrients = get_nutrient_estimator().estimate(meal_description)
         
         # Log to database
         result = db_tool.log_food(user_id, meal_description, nutrients)
-        
-        return f"""✅ {result['message']}
-
-🍽️ Meal: {meal_description}
-📊 Estimated nutrients: {nutrients}
-
-Your food intake has been logged!"""
+        return replies.food_logged(meal_description, nutrients, result["message"]).content
     
     return Agent(
         name="Food Intake Agent",
         model=OpenAIChat(
             id=LLM_MODEL,
             api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
+            base_url=LLM_BASE_URL
         ),
         tools=[log_food_function],
         instructions=[
@@ -191,93 +160,24 @@ Your food intake has been logged!"""
 def get_meal_planner_agent() -> Agent:
     """Agent that generates adaptive meal plans"""
     
-    def generate_meal_plan(user_id: int) -> str:
-        """Generate adaptive 3-meal plan"""
-        
-        # Get user profile
-        user = db_tool.validate_user(user_id)
-        
-        # Get latest CGM reading
-        cgm_logs = db_tool.get_cgm_logs(user_id, limit=1)
-        latest_cgm = cgm_logs[0]["glucose"] if cgm_logs else None
-        
-        # Get recent moods
-        mood_logs = db_tool.get_mood_logs(user_id, limit=3)
-        recent_moods = [log["mood"] for log in mood_logs] if mood_logs else []
-        
-        # Create adaptive prompt
-        from openai import OpenAI
-        client = OpenAI(
-            api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
-        )
-        
-        prompt = f"""Generate a personalized 3-meal plan for today.
-
-User Profile:
-- Diet: {user['diet_preference']}
-- Medical Conditions: {user['medical_conditions']}
-- Physical Limitations: {user['physical_limitations']}
-- Latest CGM: {latest_cgm} mg/dL (Normal: 80-300)
-- Recent Moods: {', '.join(recent_moods) if recent_moods else 'No data'}
-
-IMPORTANT ADAPTIVE RULES:
-1. If CGM > 200 or < 85: Prioritize LOW-CARB, HIGH-FIBER meals to stabilize glucose
-2. If "Type 2 Diabetes" in conditions: All meals must be diabetes-friendly (low GI, high fiber)
-3. If "Celiac Disease": Must be gluten-free
-4. If physical limitations include swallowing difficulties: Recommend soft, easy-to-swallow foods
-5. Respect diet preference (vegetarian/vegan/non-vegetarian)
-
-Format your response EXACTLY as:
-
-🌅 BREAKFAST: [Meal Name]
-- [Item 1]
-- [Item 2]
-- [Item 3]
-📊 Macros: Carbs: Xg | Protein: Yg | Fat: Zg
-💡 Note: [Why this meal is appropriate]
-
-☀️ LUNCH: [Meal Name]
-- [Item 1]
-- [Item 2]
-- [Item 3]
-📊 Macros: Carbs: Xg | Protein: Yg | Fat: Zg
-💡 Note: [Why this meal is appropriate]
-
-🌙 DINNER: [Meal Name]
-- [Item 1]
-- [Item 2]
-- [Item 3]
-📊 Macros: Carbs: Xg | Protein: Yg | Fat: Zg
-💡 Note: [Why this meal is appropriate]
-
-🎯 PLAN RATIONALE:
-[1-2 sentences explaining why this plan is adaptive to their current health status]"""
-
-        response = client.chat.completions.create(
-            model="llama-3.1-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are an expert nutritionist and meal planner."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000
-        )
-        
-        meal_plan = response.choices[0].message.content
-        
-        return f"""🍽️ **Your Personalized Meal Plan**
-
-{meal_plan}
-
----
-✅ This plan has been generated based on your current health data and will help you achieve your wellness goals!"""
+    @instrument(TOOL_SECONDS)
+    def generate_meal_plan(agent: Agent, user_id: Optional[int] = None) -> str:
+        """Generate adaptive 3-meal plan (shared by users in the same health state)"""
+        user_id = context_user_id(agent, user_id)
+        if user_id is None:
+            return MISSING_USER_MESSAGE
+        
+        meal_plan = get_meal_planner().get_plan(user_id)
+        if meal_plan is None:
+            return replies.STATIC["invalid_user"].content
+        return replies.meal_plan(meal_plan).content + replies.MEAL_PLAN_FOOTER
     
     return Agent(
         name="Meal Planner Agent",
         model=OpenAIChat(
             id=LLM_MODEL,
             api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
+            base_url=LLM_BASE_URL
         ),
         tools=[generate_meal_plan],
         instructions=[
@@ -303,7 +203,7 @@ def get_interrupt_agent() -> Agent:
         model=OpenAIChat(
             id=LLM_MODEL,
             api_key=os.environ.get("GROQ_API_KEY"),
-            base_url="https://api.groq.com/openai/v1"
+            base_url=LLM_BASE_URL
         ),
         instructions=[
             "You are a general knowledge assistant.",
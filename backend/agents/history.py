@@ -0,0 +1,115 @@
+"""
+Log History Pages and Bulk Export
+
+Pages of a user's mood, CGM or food logs are read with keyset
+pagination: newest first, ordered by (timestamp, log_id), and each page
+carries an opaque cursor for the (timestamp, log_id) of its last row.
+The next page seeks straight to it through the (user_id, timestamp)
+index, so page 1000 costs the same as page 1, unlike OFFSET.
+
+Rows older than the retention window live in month archive files
+(``agents.retention``); pages and exports that reach back that far merge
+them in.
+
+Exports walk the same keys in ascending order, one user's logs by
+(timestamp, log_id) or the whole table by log_id followed by the
+archived months user by user, in batches of ``EXPORT_BATCH_SIZE`` rows.
+Each batch is its own short read, so memory stays constant, no pooled
+connection is held between batches and a long export does not hold back
+WAL checkpoints. Rows committed while an export runs are included if
+they sort after its position; a whole-table export that overlaps a
+retention pass can list a row it moved twice, with the same log_id.
+"""
+
+import base64
+import csv
+import io
+import json
+import os
+from typing import List, Optional, Tuple
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 5000))
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# kind -> (table, [(column, field name)])
+LOG_KINDS = {
+    "mood": ("mood_logs", [("mood", "mood")]),
+    "cgm": ("cgm_logs", [("glucose_reading", "glucose")]),
+    "food": ("food_logs", [("meal_description", "meal"), ("nutrients", "nutrients")]),
+}
+
+Cursor = Tuple[int, int]
+
+
+def log_kind(kind: str) -> tuple:
+    if kind not in LOG_KINDS:
+        raise ValueError(f"Unknown log kind {kind!r}; expected one of {', '.join(LOG_KINDS)}")
+    return LOG_KINDS[kind]
+
+
+def fields(kind: str) -> List[str]:
+    """Export columns for a log kind"""
+    return ["log_id", "user_id", "timestamp"] + [field for _, field in log_kind(kind)[1]]
+
+
+def encode_cursor(timestamp: int, log_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp}:{log_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, log_id = raw.split(":")
+        return int(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def page_query(kind: str, after: Optional[Cursor]) -> str:
+    """Newest-first rows for one user, strictly older than the cursor when given"""
+    table, columns = log_kind(kind)
+    seek = "AND (timestamp, log_id) < (?, ?)" if after else ""
+    return f"""
+        SELECT log_id, user_id, timestamp, {", ".join(column for column, _ in columns)} FROM {table}
+        WHERE user_id = ? {seek}
+        ORDER BY timestamp DESC, log_id DESC LIMIT ?
+    """
+
+
+def export_query(kind: str, user_id: Optional[int], after: Optional[Cursor]) -> Tuple[str, list]:
+    """Next export batch: one user's rows by (timestamp, log_id), or all rows by log_id"""
+    table, columns = log_kind(kind)
+    select = f"SELECT log_id, user_id, timestamp, {', '.join(column for column, _ in columns)} FROM {table}"
+    if user_id is None:
+        return f"{select} WHERE log_id > ? ORDER BY log_id LIMIT ?", [after[1] if after else 0]
+    if after is None:
+        return f"{select} WHERE user_id = ? ORDER BY timestamp, log_id LIMIT ?", [user_id]
+    return (f"{select} WHERE user_id = ? AND (timestamp, log_id) > (?, ?) ORDER BY timestamp, log_id LIMIT ?",
+            [user_id, *after])
+
+
+def merge_rows(hot: list, archived: list, limit: int, newest_first: bool = False) -> list:
+    """Log table and archive rows in (timestamp, log_id) order, each log_id once
+
+    A retention pass that stopped between writing the archive and deleting
+    from the log table leaves a row in both.
+    """
+    rows = {row[0]: row for row in archived}
+    rows.update((row[0], row) for row in hot)
+    return sorted(rows.values(), key=lambda row: (row[2], row[0]), reverse=newest_first)[:limit]
+
+
+def to_ndjson(kind: str, rows: list) -> str:
+    names = fields(kind)
+    return "".join(json.dumps(dict(zip(names, row))) + "\n" for row in rows)
+
+
+def to_csv(kind: str, rows: list, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(fields(kind))
+    writer.writerows(rows)
+    return buffer.getvalue()
@@ -0,0 +1,143 @@
+"""
+Batched CGM Ingestion
+
+Readings from ``POST /cgm/batch`` are buffered in a bounded in-memory
+queue and written by a single background thread that group-commits
+whatever has accumulated since its previous transaction with one
+``executemany``. Under light load each submission commits on its own;
+under heavy load many submissions share one transaction.
+
+Durability:
+- A submission's future resolves only after the transaction containing
+  it has committed. With WAL and ``synchronous=NORMAL`` a committed
+  reading survives a process crash; the last commits before a power
+  loss or OS crash may be rolled back.
+- Callers that acknowledge on enqueue instead of on commit accept that
+  readings still buffered are lost if the process dies.
+- When the buffer is full, ``submit`` raises ``IngestQueueFull`` and
+  nothing from that submission is buffered, so the client can retry it.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, List, Optional, Tuple
+
+from . import cgm_rollups
+from .db import ConnectionPool, retry_busy
+
+MAX_PENDING_READINGS = int(os.environ.get("CGM_INGEST_MAX_PENDING", 200000))
+MAX_BATCH_READINGS = int(os.environ.get("CGM_INGEST_BATCH_SIZE", 20000))
+
+# (user_id, epoch seconds, glucose mg/dL)
+Reading = Tuple[int, int, int]
+
+
+class IngestQueueFull(Exception):
+    """Raised when accepting a submission would exceed the buffer bound"""
+
+
+class CGMIngestQueue:
+    """Bounded buffer that group-commits CGM readings on a writer thread"""
+
+    def __init__(self, pool: ConnectionPool, max_pending: int = MAX_PENDING_READINGS,
+                 max_batch: int = MAX_BATCH_READINGS,
+                 on_commit: Optional[Callable[[List[Reading]], None]] = None):
+        self.pool = pool
+        self.on_commit = on_commit
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self._pending: Deque[Tuple[List[Reading], Future]] = deque()
+        self._pending_readings = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"committed": 0, "transactions": 0, "rejected": 0, "failed": 0}
+
+    @property
+    def pending(self) -> int:
+        return self._pending_readings
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="cgm-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Flush everything buffered, then stop the writer thread"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, readings: List[Reading]) -> Future:
+        """Buffer readings; the returned future resolves once they commit"""
+        future: Future = Future()
+        if not readings:
+            future.set_result(0)
+            return future
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("CGM ingest queue is not running")
+            if self._pending_readings + len(readings) > self.max_pending:
+                self.stats["rejected"] += len(readings)
+                raise IngestQueueFull(
+                    f"{self._pending_readings} readings pending, limit {self.max_pending}"
+                )
+            self._pending.append((readings, future))
+            self._pending_readings += len(readings)
+            self._cond.notify()
+        return future
+
+    def _take_group(self) -> List[Tuple[List[Reading], Future]]:
+        with self._cond:
+            while not self._pending and self._running:
+                self._cond.wait()
+            group = []
+            taken = 0
+            # Always take at least one submission, however large
+            while self._pending and (not group or taken + len(self._pending[0][0]) <= self.max_batch):
+                readings, future = self._pending.popleft()
+                group.append((readings, future))
+                taken += len(readings)
+            self._pending_readings -= taken
+            return group
+
+    @retry_busy
+    def _commit(self, rows: List[Reading]) -> None:
+        with self.pool.writer() as conn:
+            conn.executemany("""
+                INSERT INTO cgm_logs (user_id, timestamp, glucose_reading)
+                VALUES (?, ?, ?)
+            """, rows)
+            cgm_rollups.apply_readings(conn, rows)
+            conn.commit()
+
+    def _run(self) -> None:
+        while True:
+            group = self._take_group()
+            if not group:
+                return
+            rows = [reading for readings, _ in group for reading in readings]
+            try:
+                self._commit(rows)
+            except Exception as e:
+                self.stats["failed"] += len(rows)
+                for _, future in group:
+                    future.set_exception(e)
+                continue
+            self.stats["committed"] += len(rows)
+            self.stats["transactions"] += 1
+            if self.on_commit is not None:
+                try:
+                    self.on_commit(rows)
+                except Exception as e:
+                    print(f"CGM ingest on_commit hook failed: {e}")
+            for readings, future in group:
+                future.set_result(len(readings))
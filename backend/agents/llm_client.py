@@ -0,0 +1,251 @@
+"""
+Shared LLM Client
+
+One process-wide OpenAI-compatible client instead of a new ``OpenAI(...)``
+per tool call, so HTTP keep-alive connections and TLS sessions are
+reused. Requests run on a dedicated event-loop thread that owns the
+async client; async callers await them from any loop and synchronous
+agent tools block on them. On top of the connection pool the client
+adds a concurrency limit, per-attempt timeouts, retries with
+exponential backoff and full jitter, and coalescing: identical requests
+already in flight share one upstream call. ``stream`` forwards tokens as
+they arrive and cancels the upstream request as soon as the consumer
+stops reading (e.g. the HTTP client disconnected), so abandoned
+generations are not paid for to the end.
+
+Point ``LLM_BASE_URL`` at any OpenAI-compatible server (for example
+``benchmarks/mock_llm_server.py``) to run without the real provider.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+from typing import AsyncIterator, Dict, List, Optional
+
+import openai
+
+from .metrics import LLM_SECONDS, register_gauges, timed
+
+LLM_MODEL = os.environ.get("LLM_MODEL", "llama-3.1-70b-versatile")
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 30))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+_STREAM_END = object()
+
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMClient:
+    """Pooled, concurrency-limited, coalescing chat-completions client"""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 model: str = LLM_MODEL, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES):
+        self.base_url = base_url or LLM_BASE_URL
+        self.api_key = api_key or os.environ.get("GROQ_API_KEY") or "not-set"
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0, "errors": 0,
+                      "streams": 0, "streams_cancelled": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_client(self) -> openai.AsyncOpenAI:
+        # Created lazily on the owner loop; retries are handled here, not by the SDK
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    @staticmethod
+    def request_key(model: str, messages: List[dict], max_tokens: Optional[int],
+                    temperature: Optional[float]) -> str:
+        payload = json.dumps([model, messages, max_tokens, temperature], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _request_kwargs(model: str, messages: List[dict], max_tokens: Optional[int],
+                        temperature: Optional[float]) -> dict:
+        kwargs = {"model": model, "messages": messages}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        return kwargs
+
+    @staticmethod
+    def _retry_delay(attempt: int) -> float:
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def _call_upstream(self, model: str, messages: List[dict], max_tokens: Optional[int],
+                             temperature: Optional[float]) -> str:
+        client = self._ensure_client()
+        kwargs = self._request_kwargs(model, messages, max_tokens, temperature)
+
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self.stats["upstream_calls"] += 1
+                    with timed(LLM_SECONDS, "complete"):
+                        response = await client.chat.completions.create(**kwargs)
+                return response.choices[0].message.content
+            except RETRYABLE_ERRORS:
+                if attempt >= self.max_retries:
+                    self.stats["errors"] += 1
+                    raise
+                delay = self._retry_delay(attempt)
+                attempt += 1
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+
+    async def _complete_on_loop(self, model: str, messages: List[dict], max_tokens: Optional[int],
+                                temperature: Optional[float], coalesce: bool) -> str:
+        self.stats["requests"] += 1
+        if not coalesce:
+            return await self._call_upstream(model, messages, max_tokens, temperature)
+
+        key = self.request_key(model, messages, max_tokens, temperature)
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(shared)
+
+        task = asyncio.ensure_future(self._call_upstream(model, messages, max_tokens, temperature))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def _submit(self, messages: List[dict], model: Optional[str], max_tokens: Optional[int],
+                temperature: Optional[float], coalesce: bool):
+        return asyncio.run_coroutine_threadsafe(
+            self._complete_on_loop(model or self.model, messages, max_tokens, temperature, coalesce),
+            self._loop
+        )
+
+    async def complete(self, messages: List[dict], model: Optional[str] = None,
+                       max_tokens: Optional[int] = None, temperature: Optional[float] = None,
+                       coalesce: bool = True) -> str:
+        """Chat completion text, awaitable from any event loop"""
+        return await asyncio.wrap_future(self._submit(messages, model, max_tokens, temperature, coalesce))
+
+    def complete_sync(self, messages: List[dict], model: Optional[str] = None,
+                      max_tokens: Optional[int] = None, temperature: Optional[float] = None,
+                      coalesce: bool = True) -> str:
+        """Blocking variant for synchronous agent tools"""
+        return self._submit(messages, model, max_tokens, temperature, coalesce).result()
+
+    async def _stream_on_loop(self, kwargs: dict, push) -> None:
+        """Run one streamed completion, handing each content delta to ``push``
+
+        Only opening the stream is retried; once tokens have been forwarded
+        a failure ends the stream with the error.
+        """
+        client = self._ensure_client()
+        async with self._semaphore:
+            attempt = 0
+            while True:
+                try:
+                    self.stats["upstream_calls"] += 1
+                    with timed(LLM_SECONDS, "stream_open"):
+                        stream = await client.chat.completions.create(stream=True, **kwargs)
+                    break
+                except RETRYABLE_ERRORS:
+                    if attempt >= self.max_retries:
+                        self.stats["errors"] += 1
+                        raise
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(self._retry_delay(attempt))
+                    attempt += 1
+            try:
+                with timed(LLM_SECONDS, "stream"):
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            push(chunk.choices[0].delta.content)
+            finally:
+                # Closing the response tells the provider to stop generating
+                await stream.close()
+
+    async def stream(self, messages: List[dict], model: Optional[str] = None,
+                     max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield completion text deltas as they arrive, from any event loop
+
+        Closing or cancelling the iteration cancels the upstream request.
+        """
+        self.stats["requests"] += 1
+        self.stats["streams"] += 1
+        loop = asyncio.get_running_loop()
+        deltas: asyncio.Queue = asyncio.Queue()
+
+        def push(item) -> None:
+            try:
+                loop.call_soon_threadsafe(deltas.put_nowait, item)
+            except RuntimeError:
+                pass  # consumer loop already closed
+
+        kwargs = self._request_kwargs(model or self.model, messages, max_tokens, temperature)
+        future = asyncio.run_coroutine_threadsafe(self._stream_on_loop(kwargs, push), self._loop)
+        future.add_done_callback(lambda _: push(_STREAM_END))
+        try:
+            while True:
+                item = await deltas.get()
+                if item is _STREAM_END:
+                    break
+                yield item
+            future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+                self.stats["streams_cancelled"] += 1
+
+    def close(self) -> None:
+        async def shutdown():
+            if self._client is not None:
+                await self._client.close()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLM client"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+            register_gauges("healthcare_llm", lambda: _client.stats)
+        return _client
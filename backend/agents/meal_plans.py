@@ -0,0 +1,659 @@
+"""
+Meal Plan Cache and Precomputation
+
+A meal plan depends only on a user's health state: diet, medical
+conditions, physical limitations, CGM band and recent mood trend. That
+state is reduced to a fingerprint, the LLM prompt is built from the
+fingerprint alone, and plans are cached under it, so every user in the
+same state shares one plan until it expires.
+
+Reading the state costs no LLM call and at most one indexed query: the
+profile comes from the profile cache, the latest glucose reading from
+the in-memory statistics engine (readings older than its 7-day window
+count as "no recent reading") and only the last moods from mood_logs.
+
+``MealPlanner.plan_batch`` plans for many users in one pass: it reads
+their states in bulk, makes one LLM call per distinct state (at most
+``MEAL_PLAN_WORKERS`` at a time), parses each plan's BREAKFAST, LUNCH
+and DINNER sections once and fans the result out to every user in that
+state, counting the LLM calls a per-user refresh would have made.
+
+``MealPlanScheduler`` keeps the cache warm in the background: it
+regenerates plans for active users once a night and precomputes a plan
+as soon as a user's CGM band changes, so the request path is normally a
+cache hit. Plans are shared between worker processes through the
+``meal_plans`` table, so only one of them runs the nightly refresh (a
+non-blocking file lock next to the database records the day it ran) and
+the others pick its plans up on their next miss.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from .db import ConnectionPool, file_lock
+from .glucose_stats import RANGE_HIGH, RANGE_LOW
+from .nutrition import parse_nutrients
+from .tools import DatabaseTool
+from .traits import split_traits, trait_key
+
+MEAL_PLAN_CACHE_SIZE = int(os.environ.get("MEAL_PLAN_CACHE_SIZE", 10000))
+MEAL_PLAN_TTL = float(os.environ.get("MEAL_PLAN_TTL", 24 * 3600))
+MEAL_PLAN_PRECOMPUTE_HOUR = int(os.environ.get("MEAL_PLAN_PRECOMPUTE_HOUR", 3))  # UTC
+MEAL_PLAN_CHECK_INTERVAL = float(os.environ.get("MEAL_PLAN_CHECK_INTERVAL", 60))
+MEAL_PLAN_ACTIVE_HOURS = float(os.environ.get("MEAL_PLAN_ACTIVE_HOURS", 48))
+MEAL_PLAN_WORKERS = int(os.environ.get("MEAL_PLAN_WORKERS", 4))
+# Nightly refreshes keep plans generated within this many seconds
+REFRESH_MIN_AGE = 3600
+# Users whose states are read per pooled connection in plan_batch
+STATE_CHUNK_SIZE = 1000
+
+# The prompt's adaptive rules switch to low-carb meals outside 85-200 mg/dL
+CGM_BANDS = (
+    (85, "low", "below 85 mg/dL"),
+    (201, "in_range", "85-200 mg/dL"),
+    (None, "high", "above 200 mg/dL"),
+)
+POSITIVE_MOODS = frozenset(("happy", "excited", "calm"))
+RECENT_MOODS = 3
+
+MEAL_PLAN_PROMPT = """Generate a personalized 3-meal plan for today.
+
+User Profile:
+- Diet: {diet}
+- Medical Conditions: {conditions}
+- Physical Limitations: {limitations}
+- Latest CGM: {cgm} (Normal: {range_low}-{range_high})
+- Recent Mood Trend: {moods}
+
+IMPORTANT ADAPTIVE RULES:
+{rules}
+
+Format your response EXACTLY as:
+
+🌅 BREAKFAST: [Meal Name]
+- [Item 1]
+- [Item 2]
+- [Item 3]
+📊 Macros: Carbs: Xg | Protein: Yg | Fat: Zg
+💡 Note: [Why this meal is appropriate]
+
+☀️ LUNCH: [Meal Name]
+- [Item 1]
+- [Item 2]
+- [Item 3]
+📊 Macros: Carbs: Xg | Protein: Yg | Fat: Zg
+💡 Note: [Why this meal is appropriate]
+
+🌙 DINNER: [Meal Name]
+- [Item 1]
+- [Item 2]
+- [Item 3]
+📊 Macros: Carbs: Xg | Protein: Yg | Fat: Zg
+💡 Note: [Why this meal is appropriate]
+
+🎯 PLAN RATIONALE:
+[1-2 sentences explaining why this plan is adaptive to their current health status]"""
+
+# Adaptive rules that apply when the user has a condition or limitation (trait_key)
+TRAIT_RULES = {
+    "conditions": {
+        "type 2 diabetes": "All meals must be diabetes-friendly (low GI, high fiber)",
+        "celiac disease": "Must be gluten-free",
+    },
+    "limitations": {
+        "swallowing difficulties": "Recommend soft, easy-to-swallow foods",
+    },
+}
+OUT_OF_RANGE_RULE = "Latest CGM is {cgm}: Prioritize LOW-CARB, HIGH-FIBER meals to stabilize glucose"
+DIET_RULE = "Respect diet preference ({diet})"
+
+MOOD_TREND_TEXT = {
+    "positive": "positive (e.g. happy, calm, excited)",
+    "low": "low (e.g. sad, tired, anxious, stressed)",
+    "mixed": "mixed",
+    None: "No data",
+}
+
+
+MEALS = ("breakfast", "lunch", "dinner")
+_MEAL_HEADER = re.compile(r"^\W*(BREAKFAST|LUNCH|DINNER)[*\s]*:[*\s]*(.*)$", re.IGNORECASE)
+_RATIONALE_HEADER = re.compile(r"^\W*PLAN RATIONALE[*\s]*:[*\s]*(.*)$", re.IGNORECASE)
+_LABELLED = re.compile(r"^\W*(MACROS|NOTE)[*\s]*:[*\s]*(.*)$", re.IGNORECASE)
+
+
+def parse_plan(text: str) -> Optional[dict]:
+    """Meals and rationale of a plan in the prompt's format, or None if a meal is missing
+
+    Each meal is {"name", "items", "macros": {"carbs", "protein", "fat"}
+    in grams or None, "note"}.
+    """
+    meals: Dict[str, dict] = {}
+    meal: Optional[dict] = None
+    rationale: Optional[List[str]] = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if rationale is not None:
+            rationale.append(line)
+        elif meal is not None and line.startswith("-"):
+            meal["items"].append(line.lstrip("-* ").strip())
+        elif _MEAL_HEADER.match(line):
+            name, title = _MEAL_HEADER.match(line).groups()
+            meal = meals[name.lower()] = {"name": title.strip(" *"), "items": [], "macros": None, "note": None}
+        elif _RATIONALE_HEADER.match(line):
+            first = _RATIONALE_HEADER.match(line).group(1).strip(" *")
+            rationale = [first] if first else []
+        elif meal is not None and _LABELLED.match(line):
+            label, value = _LABELLED.match(line).groups()
+            if label.lower() == "note":
+                meal["note"] = value.strip()
+            else:
+                macros = parse_nutrients(value)
+                meal["macros"] = dict(zip(("carbs", "protein", "fat"), macros)) if macros else None
+    if len(meals) < len(MEALS):
+        return None
+    return {**{name: meals[name] for name in MEALS}, "rationale": " ".join(rationale or []) or None}
+
+
+def cgm_band(glucose: Optional[int]) -> Optional[str]:
+    if glucose is None:
+        return None
+    for upper, band, _ in CGM_BANDS:
+        if upper is None or glucose < upper:
+            return band
+
+
+def mood_trend(moods: Iterable[str]) -> Optional[str]:
+    kinds = {mood in POSITIVE_MOODS for mood in moods}
+    if not kinds:
+        return None
+    if len(kinds) > 1:
+        return "mixed"
+    return "positive" if kinds.pop() else "low"
+
+
+class HealthState:
+    """The inputs a meal plan depends on, reduced to shareable values"""
+
+    __slots__ = ("diet", "conditions", "limitations", "cgm_band", "mood_trend")
+
+    def __init__(self, diet: str, conditions: Tuple[str, ...], limitations: Tuple[str, ...],
+                 cgm_band: Optional[str], mood_trend: Optional[str]):
+        self.diet = diet
+        self.conditions = conditions
+        self.limitations = limitations
+        self.cgm_band = cgm_band
+        self.mood_trend = mood_trend
+
+    @property
+    def fingerprint(self) -> tuple:
+        return (self.diet, self.conditions, self.limitations, self.cgm_band, self.mood_trend)
+
+    def cgm_text(self) -> str:
+        for _, band, text in CGM_BANDS:
+            if band == self.cgm_band:
+                return text
+        return "no recent reading"
+
+    def rules(self) -> list:
+        """Adaptive rules that apply to this state, decided here rather than left to the LLM"""
+        rules = []
+        if self.cgm_band in ("low", "high"):
+            rules.append(OUT_OF_RANGE_RULE.format(cgm=self.cgm_text()))
+        for dimension, labels in (("conditions", self.conditions), ("limitations", self.limitations)):
+            keys = {trait_key(label) for label in labels}
+            rules.extend(rule for key, rule in TRAIT_RULES[dimension].items() if key in keys)
+        rules.append(DIET_RULE.format(diet=self.diet))
+        return rules
+
+    def prompt(self) -> str:
+        return MEAL_PLAN_PROMPT.format(
+            rules="\n".join(f"{number}. {rule}" for number, rule in enumerate(self.rules(), 1)),
+            diet=self.diet,
+            conditions=", ".join(self.conditions) or "None",
+            limitations=", ".join(self.limitations) or "None",
+            cgm=self.cgm_text(),
+            range_low=RANGE_LOW,
+            range_high=RANGE_HIGH,
+            moods=MOOD_TREND_TEXT[self.mood_trend],
+        )
+
+
+class MealPlanCache:
+    """LRU of generated plans by health-state fingerprint, with a TTL
+
+    With a pool, plans are also written to the ``meal_plans`` table and a
+    fingerprint missing from memory is looked up there, so a plan made by
+    one worker process (e.g. the nightly refresh) serves all of them. A
+    plan read from the table keeps the expiry it was generated with.
+    """
+
+    def __init__(self, max_size: int = MEAL_PLAN_CACHE_SIZE, ttl: float = MEAL_PLAN_TTL,
+                 pool: Optional[ConnectionPool] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.pool = pool
+        self._entries: "OrderedDict[tuple, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+
+    def _entry(self, fingerprint: tuple) -> Optional[Tuple[str, float]]:
+        """Unexpired (plan, monotonic expiry) from memory, else from the meal_plans table"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None and entry[1] < now:
+                del self._entries[fingerprint]
+                entry = None
+        if entry is not None or self.pool is None:
+            return entry
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT plan, created_at FROM meal_plans WHERE fingerprint = ?",
+                                   (json.dumps(fingerprint),)).fetchone()
+        except Exception as e:
+            print(f"Meal plan lookup failed: {e}")
+            return None
+        if row is None:
+            return None
+        remaining = row[1] + self.ttl - time.time()
+        if remaining <= 0:
+            return None
+        entry = (row[0], now + remaining)
+        with self._lock:
+            self._store(fingerprint, entry)
+            self.loaded += 1
+        return entry
+
+    def _store(self, fingerprint: tuple, entry: Tuple[str, float]) -> None:
+        """Call with the lock held"""
+        self._entries[fingerprint] = entry
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, fingerprint: tuple) -> Optional[str]:
+        entry = self._entry(fingerprint)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if fingerprint in self._entries:
+                self._entries.move_to_end(fingerprint)
+            self.hits += 1
+        return entry[0]
+
+    def age(self, fingerprint: tuple) -> Optional[float]:
+        """Seconds since the cached plan was generated, or None if absent or expired"""
+        entry = self._entry(fingerprint)
+        if entry is None:
+            return None
+        return time.monotonic() - (entry[1] - self.ttl)
+
+    def put(self, fingerprint: tuple, plan: str) -> None:
+        with self._lock:
+            self._store(fingerprint, (plan, time.monotonic() + self.ttl))
+        if self.pool is None:
+            return
+        try:
+            with self.pool.writer() as conn:
+                conn.execute("INSERT OR REPLACE INTO meal_plans (fingerprint, plan, created_at) VALUES (?, ?, ?)",
+                             (json.dumps(fingerprint), plan, time.time()))
+                conn.commit()
+        except Exception as e:
+            print(f"Meal plan write failed: {e}")
+
+    def purge_expired(self) -> int:
+        """Delete expired plans from the meal_plans table; returns how many"""
+        if self.pool is None:
+            return 0
+        try:
+            with self.pool.writer() as conn:
+                purged = conn.execute("DELETE FROM meal_plans WHERE created_at <= ?",
+                                      (time.time() - self.ttl,)).rowcount
+                conn.commit()
+            return purged
+        except Exception as e:
+            print(f"Meal plan purge failed: {e}")
+            return 0
+
+    def clear(self) -> None:
+        """Drop every plan, including the shared ones in the meal_plans table"""
+        with self._lock:
+            self._entries.clear()
+        if self.pool is None:
+            return
+        try:
+            with self.pool.writer() as conn:
+                conn.execute("DELETE FROM meal_plans")
+                conn.commit()
+        except Exception as e:
+            print(f"Meal plan clear failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {"size": size, "hits": self.hits, "misses": self.misses, "loaded": self.loaded,
+                "shared": self.pool is not None, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class MealPlanBatch:
+    """Result of MealPlanner.plan_batch: one plan per distinct health state, shared by its users"""
+
+    def __init__(self):
+        self.users: Dict[int, tuple] = {}        # user_id -> fingerprint
+        self.plans: Dict[tuple, Optional[dict]] = {}  # fingerprint -> parsed plan, None if unavailable
+        self.generated = 0
+        self.failed = 0
+
+    def plan_for(self, user_id: int) -> Optional[dict]:
+        fingerprint = self.users.get(user_id)
+        return None if fingerprint is None else self.plans.get(fingerprint)
+
+    def summary(self) -> dict:
+        """Counts for logs and metrics; a per-user refresh makes one LLM call per user"""
+        return {
+            "users": len(self.users),
+            "states": len(self.plans),
+            "llm_calls": self.generated,
+            "llm_calls_saved": len(self.users) - self.generated,
+            "failed": self.failed,
+            "unparsed": sum(plan is None for plan in self.plans.values()) - self.failed,
+        }
+
+
+class MealPlanner:
+    """Health-state lookups plus cached, LLM-generated meal plans"""
+
+    def __init__(self, db_tool: DatabaseTool, llm=None, cache: Optional[MealPlanCache] = None):
+        self.db_tool = db_tool
+        self._llm = llm
+        self.cache = cache or MealPlanCache()
+        # generate runs on plan_batch's executor threads as well as request threads
+        self.llm_calls = 0
+        self._calls_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from .llm_client import get_llm_client
+            self._llm = get_llm_client()
+        return self._llm
+
+    def state_for(self, user_id: int) -> Optional[HealthState]:
+        """Current health state, or None for an unknown user"""
+        user = self.db_tool.validate_user(user_id)
+        if not user["valid"]:
+            return None
+        user["user_id"] = user_id
+        self.db_tool.sync_glucose_stats()
+        moods = [log["mood"] for log in self.db_tool.get_mood_logs(user_id, limit=RECENT_MOODS)]
+        return self._state(user, moods)
+
+    def _state(self, user: dict, moods: List[str]) -> HealthState:
+        latest = self.db_tool.glucose_stats.snapshot(user["user_id"])["latest"]
+        return HealthState(
+            user["diet_preference"],
+            split_traits(user["medical_conditions"]),
+            split_traits(user["physical_limitations"]),
+            cgm_band(latest),
+            mood_trend(moods),
+        )
+
+    def states_for(self, user_ids: Iterable[int]) -> Dict[int, HealthState]:
+        """state_for over many users: one glucose sync, and recent moods read over
+        one pooled connection per STATE_CHUNK_SIZE users; unknown users are skipped"""
+        self.db_tool.sync_glucose_stats()
+        user_ids = list(user_ids)
+        states = {}
+        for first in range(0, len(user_ids), STATE_CHUNK_SIZE):
+            users = []
+            for user_id in user_ids[first:first + STATE_CHUNK_SIZE]:
+                user = self.db_tool.validate_user(user_id)
+                if user["valid"]:
+                    users.append({**user, "user_id": user_id})
+            with self.db_tool.pool.connection() as conn:
+                for user in users:
+                    moods = [row[0] for row in conn.execute("""
+                        SELECT mood FROM mood_logs WHERE user_id = ?
+                        ORDER BY timestamp DESC, log_id DESC LIMIT ?
+                    """, (user["user_id"], RECENT_MOODS))]
+                    states[user["user_id"]] = self._state(user, moods)
+        return states
+
+    @staticmethod
+    def _messages(state: HealthState) -> list:
+        return [
+            {"role": "system", "content": "You are an expert nutritionist and meal planner."},
+            {"role": "user", "content": state.prompt()}
+        ]
+
+    def _count_llm_call(self) -> None:
+        with self._calls_lock:
+            self.llm_calls += 1
+
+    def generate(self, state: HealthState) -> str:
+        """Ask the LLM for a plan for this state and cache it"""
+        self._count_llm_call()
+        plan = self.llm.complete_sync(messages=self._messages(state), max_tokens=1000)
+        self.cache.put(state.fingerprint, plan)
+        return plan
+
+    async def stream_plan(self, state: HealthState) -> AsyncIterator[str]:
+        """Yield the cached plan at once, or stream a new one as it is generated
+
+        Only a completed plan is cached; closing the iteration early cancels
+        the generation.
+        """
+        plan = await asyncio.to_thread(self.cache.get, state.fingerprint)
+        if plan is not None:
+            yield plan
+            return
+        self._count_llm_call()
+        parts = []
+        async for delta in self.llm.stream(self._messages(state), max_tokens=1000):
+            parts.append(delta)
+            yield delta
+        await asyncio.to_thread(self.cache.put, state.fingerprint, "".join(parts))
+
+    def cached_plan(self, user_id: int) -> Optional[str]:
+        """Cached plan for the user's current state, never calling the LLM"""
+        state = self.state_for(user_id)
+        return None if state is None else self.cache.get(state.fingerprint)
+
+    def get_plan(self, user_id: int) -> Optional[str]:
+        """Plan for the user's current state; None for an unknown user"""
+        state = self.state_for(user_id)
+        if state is None:
+            return None
+        plan = self.cache.get(state.fingerprint)
+        return plan if plan is not None else self.generate(state)
+
+    def plan_batch(self, user_ids: Iterable[int], refresh: bool = False,
+                   workers: int = MEAL_PLAN_WORKERS) -> MealPlanBatch:
+        """Plans for many users with one LLM call per distinct health state
+
+        States with a cached plan reuse it; with ``refresh`` every state is
+        regenerated unless its plan is younger than ``REFRESH_MIN_AGE``
+        (e.g. made by a band-change precompute). Each distinct plan is
+        parsed once. A failed generation leaves its users without a plan.
+        """
+        batch = MealPlanBatch()
+        states: Dict[tuple, HealthState] = {}
+        for user_id, state in self.states_for(user_ids).items():
+            batch.users[user_id] = state.fingerprint
+            states.setdefault(state.fingerprint, state)
+
+        texts: Dict[tuple, Optional[str]] = {}
+        todo = []
+        for fingerprint, state in states.items():
+            age = self.cache.age(fingerprint)
+            if age is None or (refresh and age > REFRESH_MIN_AGE):
+                todo.append(state)
+            else:
+                texts[fingerprint] = self.cache.get(fingerprint)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="meal-plan") as executor:
+            futures = [(state.fingerprint, executor.submit(self.generate, state)) for state in todo]
+            for fingerprint, future in futures:
+                try:
+                    texts[fingerprint] = future.result()
+                    batch.generated += 1
+                except Exception as e:
+                    texts[fingerprint] = None
+                    batch.failed += 1
+                    print(f"Meal plan precompute failed: {e}")
+
+        batch.plans = {fingerprint: parse_plan(text) if text else None for fingerprint, text in texts.items()}
+        return batch
+
+    def precompute(self, user_ids: Iterable[int], refresh: bool = False,
+                   workers: int = MEAL_PLAN_WORKERS) -> int:
+        """Generate plans for the distinct states of these users; returns plans generated"""
+        return self.plan_batch(user_ids, refresh, workers).generated
+
+
+class MealPlanScheduler:
+    """Background thread that keeps the meal plan cache warm"""
+
+    def __init__(self, planner: MealPlanner, check_interval: float = MEAL_PLAN_CHECK_INTERVAL,
+                 precompute_hour: int = MEAL_PLAN_PRECOMPUTE_HOUR,
+                 active_hours: float = MEAL_PLAN_ACTIVE_HOURS, lock_file: Optional[str] = None):
+        self.planner = planner
+        self.lock_file = lock_file or f"{planner.db_tool.db_file}.meal-plan-lock"
+        self.check_interval = check_interval
+        self.precompute_hour = precompute_hour
+        self.active_seconds = active_hours * 3600
+        self.stats = {"runs": 0, "band_changes": 0, "requested": 0, "generated": 0, "llm_calls_saved": 0,
+                      "nightly_runs": 0, "nightly_skipped": 0}
+
+        self._bands: Dict[int, Optional[str]] = {}
+        self._pending: Set[int] = set()
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_nightly: Optional[str] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        # Bands known at startup are the baseline; only later changes trigger work
+        for user_id, (_, glucose) in self.planner.db_tool.glucose_stats.latest_readings().items():
+            self._bands[user_id] = cgm_band(glucose)
+        self._last_nightly = datetime.now(timezone.utc).date().isoformat()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="meal-plan-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def request(self, user_id: int) -> None:
+        """Precompute a plan for this user soon (e.g. after a cache miss)"""
+        with self._pending_lock:
+            self._pending.add(user_id)
+        self.stats["requested"] += 1
+        self._wake.set()
+
+    def band_changes(self) -> Set[int]:
+        """Users whose CGM band changed since the last check"""
+        changed = set()
+        for user_id, (_, glucose) in self.planner.db_tool.glucose_stats.latest_readings().items():
+            band = cgm_band(glucose)
+            if self._bands.get(user_id) != band:
+                self._bands[user_id] = band
+                changed.add(user_id)
+        self.stats["band_changes"] += len(changed)
+        return changed
+
+    def active_users(self, now: Optional[float] = None) -> Set[int]:
+        cutoff = (time.time() if now is None else now) - self.active_seconds
+        return {
+            user_id for user_id, (timestamp, _) in self.planner.db_tool.glucose_stats.latest_readings().items()
+            if timestamp >= cutoff
+        }
+
+    def nightly_due(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        return now.hour >= self.precompute_hour and now.date().isoformat() != self._last_nightly
+
+    def run_once(self) -> int:
+        """One scheduler pass; returns plans generated"""
+        self.stats["runs"] += 1
+        self.planner.db_tool.sync_glucose_stats()
+        with self._pending_lock:
+            users = self._pending
+            self._pending = set()
+        users |= self.band_changes()
+
+        batch = None
+        if self.nightly_due():
+            self._last_nightly = datetime.now(timezone.utc).date().isoformat()
+            batch = self._nightly(users, self._last_nightly)
+        if batch is None:
+            if not users:
+                return 0
+            batch = self.planner.plan_batch(users)
+        self.stats["generated"] += batch.generated
+        self.stats["llm_calls_saved"] += len(batch.users) - batch.generated
+        return batch.generated
+
+    def _nightly(self, users: Set[int], today: str) -> Optional[MealPlanBatch]:
+        """Nightly refresh plus these users, or None if another process runs or ran it today"""
+        with file_lock(self.lock_file, blocking=False) as locked:
+            if locked:
+                with open(self.lock_file) as f:
+                    locked = f.read().strip() != today
+            if not locked:
+                self.stats["nightly_skipped"] += 1
+                return None
+            self.stats["nightly_runs"] += 1
+            batch = self.planner.plan_batch(self.active_users() | users, refresh=True)
+            self.planner.cache.purge_expired()
+            with open(self.lock_file, "w") as f:
+                f.write(today)
+        print(f"Nightly meal plans: {batch.summary()}")
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Meal plan scheduler pass failed: {e}")
+
+
+_planners: Dict[str, MealPlanner] = {}
+_planners_lock = threading.Lock()
+
+
+def get_meal_planner(db_file: Optional[str] = None) -> MealPlanner:
+    """Return the process-wide meal planner for a database file"""
+    db_tool = DatabaseTool(db_file)
+    with _planners_lock:
+        planner = _planners.get(db_tool.db_file)
+        if planner is None:
+            planner = _planners[db_tool.db_file] = MealPlanner(db_tool, cache=MealPlanCache(pool=db_tool.pool))
+        return planner
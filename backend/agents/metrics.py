@@ -0,0 +1,183 @@
+"""
+Latency and Error Metrics
+
+A small in-process metrics registry rendered in the Prometheus text
+exposition format at ``/metrics``: histograms for chat requests per
+intent and per stage, DatabaseTool methods, agent tools and upstream LLM
+calls, a counter for errors the chat endpoint swallows, and gauges read
+from the existing caches' and clients' stats.
+
+Set ``METRICS_ENABLED=0`` to turn instrumentation off. It is decided
+when a function is decorated, so a disabled ``@instrument`` returns the
+function itself and ``timed`` returns a shared no-op context manager.
+"""
+
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NOOP = nullcontext()
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Latency histogram (seconds) with optional labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+def timed(histogram: Histogram, *labels: str):
+    """Context manager observing the duration of its block"""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Timer(histogram, labels)
+
+
+def instrument(histogram: Histogram, label: Optional[str] = None) -> Callable:
+    """Decorator observing each call's duration, labelled with the function name by default"""
+    def decorate(fn: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return fn
+        labels = (label or fn.__name__,)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+
+        return wrapper
+
+    return decorate
+
+
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_gauges(prefix: str, collect: Callable[[], dict]) -> None:
+    """Expose the numeric values of ``collect()`` as gauges named ``{prefix}_{key}``"""
+    _collectors[prefix] = collect
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in (CHAT_SECONDS, CHAT_STAGE_SECONDS, DB_SECONDS, TOOL_SECONDS, LLM_SECONDS, SWALLOWED_ERRORS):
+        lines.extend(metric.render())
+    for prefix, collect in sorted(_collectors.items()):
+        try:
+            values = collect()
+        except Exception as e:
+            print(f"Metrics collector {prefix} failed: {e}")
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+CHAT_SECONDS = Histogram("healthcare_chat_seconds", "POST /agno latency by routed intent", ("intent",))
+CHAT_STAGE_SECONDS = Histogram("healthcare_chat_stage_seconds", "POST /agno latency by stage", ("stage",))
+DB_SECONDS = Histogram("healthcare_db_seconds", "DatabaseTool method latency", ("operation",))
+TOOL_SECONDS = Histogram("healthcare_tool_seconds", "Agent tool latency", ("tool",))
+LLM_SECONDS = Histogram("healthcare_llm_seconds", "Upstream LLM call latency per attempt", ("call",))
+SWALLOWED_ERRORS = Counter("healthcare_swallowed_errors_total",
+                           "Errors caught and answered with a fallback reply", ("site",))
@@ -0,0 +1,314 @@
+"""
+Versioned Schema Migrations
+
+Migrations run once each, in order, and record the schema version in
+``PRAGMA user_version``. Log-table rebuilds copy rows in small batches
+through the shared connection pool so the API keeps reading and writing
+while an existing database is upgraded in place; only the final
+catch-up-and-rename step takes a short exclusive write transaction.
+
+Worker processes serialize on ``<db file>.migrate-lock``. Run manually
+with ``python -m agents.migrations [db_file]``.
+"""
+
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+from . import cgm_rollups, traits
+from .db import DB_FILE, ConnectionPool, file_lock, get_pool
+
+COPY_BATCH_SIZE = 5000
+# Pause between batches so application writers get the write lock
+COPY_BATCH_PAUSE = 0.005
+
+EPOCH_NOW = "(CAST(strftime('%s', 'now') AS INTEGER))"
+
+# Legacy rows hold CURRENT_TIMESTAMP text ("YYYY-MM-DD HH:MM:SS", UTC)
+TO_EPOCH = (
+    "CASE WHEN typeof(timestamp) = 'integer' THEN timestamp "
+    "ELSE COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), " + EPOCH_NOW + ") END"
+)
+
+# table -> (payload column DDL, payload column names)
+LOG_TABLES = {
+    "mood_logs": ("mood TEXT NOT NULL", "mood"),
+    "cgm_logs": ("glucose_reading INTEGER NOT NULL", "glucose_reading"),
+    "food_logs": ("meal_description TEXT NOT NULL, nutrients TEXT", "meal_description, nutrients"),
+}
+
+
+def _v1_baseline(pool: ConnectionPool) -> None:
+    """Original users and log tables"""
+    with pool.writer() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                first_name TEXT NOT NULL,
+                last_name TEXT NOT NULL,
+                city TEXT NOT NULL,
+                diet_preference TEXT NOT NULL,
+                medical_conditions TEXT,
+                physical_limitations TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS mood_logs (
+                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                mood TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cgm_logs (
+                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                glucose_reading INTEGER NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS food_logs (
+                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                meal_description TEXT NOT NULL,
+                nutrients TEXT,
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+        """)
+        conn.commit()
+
+
+def _rebuild_log_table(pool: ConnectionPool, table: str, columns_ddl: str, columns: str) -> None:
+    """Copy a log table into an INTEGER-epoch twin and swap it in
+
+    Resumable: an interrupted run picks up from the highest log_id already
+    copied. Log tables are append-only, so rows written during the copy
+    are picked up by the final catch-up.
+    """
+    new_table = f"{table}_v2"
+    with pool.writer() as conn:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {new_table} (
+                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+                {columns_ddl},
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+        """)
+        conn.commit()
+
+    copy_sql = f"""
+        INSERT INTO {new_table} (log_id, user_id, timestamp, {columns})
+        SELECT log_id, user_id, {TO_EPOCH}, {columns} FROM {table}
+        WHERE log_id > ? ORDER BY log_id LIMIT ?
+    """
+    last_copied_sql = f"SELECT COALESCE(MAX(log_id), 0) FROM {new_table}"
+
+    copied = COPY_BATCH_SIZE
+    while copied == COPY_BATCH_SIZE:
+        with pool.writer() as conn:
+            last = conn.execute(last_copied_sql).fetchone()[0]
+            copied = conn.execute(copy_sql, (last, COPY_BATCH_SIZE)).rowcount
+            conn.commit()
+        time.sleep(COPY_BATCH_PAUSE)
+
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            last = conn.execute(last_copied_sql).fetchone()[0]
+            conn.execute(copy_sql, (last, -1))
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _v2_epoch_timestamps(pool: ConnectionPool) -> None:
+    """Store log timestamps as INTEGER unix epoch seconds"""
+    for table, (columns_ddl, columns) in LOG_TABLES.items():
+        with pool.connection() as conn:
+            declared = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if declared.get("timestamp") != "INTEGER":
+            _rebuild_log_table(pool, table, columns_ddl, columns)
+
+
+# Mood and CGM reads are fully covered; food keeps the index narrow rather
+# than duplicating free-text meal descriptions
+LOG_INDEXES = {
+    "idx_mood_logs_user_ts": "mood_logs (user_id, timestamp DESC, mood)",
+    "idx_cgm_logs_user_ts": "cgm_logs (user_id, timestamp DESC, glucose_reading)",
+    "idx_food_logs_user_ts": "food_logs (user_id, timestamp DESC)",
+}
+
+
+def create_log_indexes(conn) -> None:
+    for name, target in LOG_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def drop_log_indexes(conn) -> None:
+    """Drop log indexes ahead of a bulk load; recreate with create_log_indexes"""
+    for name in LOG_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _v3_user_timestamp_indexes(pool: ConnectionPool) -> None:
+    """Composite (user_id, timestamp DESC) indexes for recent-history reads"""
+    with pool.writer() as conn:
+        create_log_indexes(conn)
+        conn.commit()
+
+
+def _v4_sessions(pool: ConnectionPool) -> None:
+    """Chat sessions for SESSION_STORE=sqlite (see agents.sessions)"""
+    with pool.writer() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                token TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                profile TEXT NOT NULL,
+                history TEXT NOT NULL DEFAULT '[]',
+                pending TEXT,
+                expires_at INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+        conn.commit()
+
+
+def _v5_cgm_rollups(pool: ConnectionPool) -> None:
+    """Hourly/daily CGM aggregates (see agents.cgm_rollups), backfilled in batches
+
+    Readings committed after the table exists fold themselves in, so the
+    backfill stops at the highest log_id seen when it was created.
+    """
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cgm_rollups (
+                    user_id INTEGER NOT NULL,
+                    span INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    min_glucose INTEGER NOT NULL,
+                    max_glucose INTEGER NOT NULL,
+                    in_range INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, span, bucket)
+                ) WITHOUT ROWID
+            """)
+            # Restart from scratch if an earlier run was interrupted
+            conn.execute("DELETE FROM cgm_rollups")
+            last = conn.execute("SELECT COALESCE(MAX(log_id), 0) FROM cgm_logs").fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    done = 0
+    while done < last:
+        with pool.writer() as conn:
+            done = cgm_rollups.backfill(conn, done, min(done + COPY_BATCH_SIZE, last))
+            conn.commit()
+        time.sleep(COPY_BATCH_PAUSE)
+
+
+def _v6_user_traits(pool: ConnectionPool) -> None:
+    """Condition/limitation lookup and junction tables (see agents.traits), backfilled in batches
+
+    Profile writes keep their user's junction rows current once the tables
+    exist, and each batch re-derives its users from the committed text
+    columns, so the two can interleave freely.
+    """
+    with pool.writer() as conn:
+        traits.create_tables(conn)
+        conn.commit()
+
+    last = 0
+    while last is not None:
+        with pool.writer() as conn:
+            last = traits.backfill(conn, last, COPY_BATCH_SIZE)
+            conn.commit()
+        time.sleep(COPY_BATCH_PAUSE)
+
+
+def _v7_log_archives(pool: ConnectionPool) -> None:
+    """Months of log rows moved to archive files (see agents.retention)"""
+    with pool.writer() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS log_archives (
+                kind TEXT NOT NULL,
+                month TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                PRIMARY KEY (kind, month)
+            ) WITHOUT ROWID
+        """)
+        conn.commit()
+
+
+def _v8_meal_plans(pool: ConnectionPool) -> None:
+    """Generated meal plans by health-state fingerprint, shared between workers (see agents.meal_plans)"""
+    with pool.writer() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meal_plans (
+                fingerprint TEXT PRIMARY KEY,
+                plan TEXT NOT NULL,
+                created_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.commit()
+
+
+MIGRATIONS: List[Tuple[int, Callable[[ConnectionPool], None]]] = [
+    (1, _v1_baseline),
+    (2, _v2_epoch_timestamps),
+    (3, _v3_user_timestamp_indexes),
+    (4, _v4_sessions),
+    (5, _v5_cgm_rollups),
+    (6, _v6_user_traits),
+    (7, _v7_log_archives),
+    (8, _v8_meal_plans),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(pool: ConnectionPool) -> int:
+    with pool.connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_file: Optional[str] = None) -> int:
+    """Apply pending migrations and return the resulting schema version
+
+    Worker processes starting together take turns; the later ones find the
+    schema already current.
+    """
+    pool = get_pool(db_file)
+    with file_lock(f"{pool.db_file}.migrate-lock"):
+        current = schema_version(pool)
+        for version, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            migration(pool)
+            with pool.writer() as conn:
+                conn.execute(f"PRAGMA user_version = {version}")
+            current = version
+    return current
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    print(f"Migrating {target} ...")
+    print(f"✅ Schema at version {migrate(target)}")
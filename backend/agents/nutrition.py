@@ -0,0 +1,374 @@
+"""
+Nutrient Estimation
+
+Estimates "Carbs: Xg, Protein: Yg, Fat: Zg" for a free-text meal
+description without asking the LLM whenever possible:
+
+1. A bounded LRU cache keyed on the normalized description (lowercase,
+   punctuation, filler words and plurals stripped), so "I ate Oatmeal
+   with berries & coffee!" and "oatmeal with berry and coffee" share
+   one entry. Size and preparation words are kept: "large burrito" and
+   "fried rice" are not "burrito" and "rice".
+2. A local food-composition index: per-serving macros for common foods,
+   matched longest phrase first over the normalized tokens ("peanut
+   butter" before "butter"), with simple quantities ("2 eggs", "half
+   banana", "large burrito"). A meal is answered locally only when every
+   remaining token is a known food, filler word, quantity or a
+   preparation the table already assumes ("grilled", "baked").
+3. Otherwise the LLM, whose answer is cached once it parses.
+
+Values are typical single servings and meant as rough estimates, the
+same precision the LLM prompt asks for.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+NUTRIENT_CACHE_SIZE = int(os.environ.get("NUTRIENT_CACHE_SIZE", 10000))
+
+# Per-serving macros in grams: (carbs, protein, fat)
+FOOD_COMPOSITION: Dict[str, Tuple[float, float, float]] = {
+    # Grains, breads and cereals
+    "oatmeal": (27, 6, 3),
+    "oat": (27, 5, 3),
+    "porridge": (27, 6, 3),
+    "granola": (38, 6, 12),
+    "cereal": (24, 3, 1),
+    "rice": (45, 4, 0.5),
+    "brown rice": (45, 5, 2),
+    "quinoa": (39, 8, 4),
+    "couscous": (36, 6, 0.5),
+    "pasta": (43, 8, 1),
+    "spaghetti": (43, 8, 1),
+    "noodle": (40, 7, 2),
+    "bread": (15, 3, 1),
+    "toast": (15, 3, 1),
+    "whole wheat toast": (24, 8, 2),
+    "whole wheat bread": (24, 8, 2),
+    "bagel": (48, 10, 1.5),
+    "muffin": (45, 5, 14),
+    "pancake": (22, 4, 5),
+    "waffle": (25, 5, 8),
+    "tortilla": (24, 4, 4),
+    "chapati": (18, 3, 4),
+    "roti": (18, 3, 4),
+    "naan": (45, 9, 5),
+    "idli": (16, 2, 0.2),
+    "dosa": (29, 4, 4),
+    "cracker": (10, 1, 2),
+    # Protein
+    "egg": (0.5, 6, 5),
+    "scrambled egg": (1, 12, 11),
+    "omelette": (1, 13, 12),
+    "chicken": (0, 31, 4),
+    "chicken breast": (0, 31, 4),
+    "turkey": (0, 29, 4),
+    "beef": (0, 26, 15),
+    "steak": (0, 29, 14),
+    "pork": (0, 27, 14),
+    "bacon": (0.5, 6, 7),
+    "sausage": (2, 9, 15),
+    "ham": (1, 10, 4),
+    "fish": (0, 22, 5),
+    "salmon": (0, 25, 13),
+    "tuna": (0, 26, 1),
+    "shrimp": (1, 20, 1.5),
+    "tofu": (3, 16, 9),
+    "tempeh": (8, 18, 9),
+    "paneer": (4, 18, 20),
+    "lentil": (40, 18, 1),
+    "lentil soup": (30, 13, 3),
+    "dal": (30, 12, 4),
+    "chickpea": (45, 15, 4),
+    "hummus": (14, 5, 10),
+    "bean": (40, 15, 1),
+    "black bean": (41, 15, 1),
+    "kidney bean": (40, 15, 1),
+    "protein shake": (8, 25, 3),
+    # Dairy
+    "milk": (12, 8, 8),
+    "yogurt": (17, 9, 4),
+    "greek yogurt": (8, 17, 5),
+    "cheese": (0.5, 7, 9),
+    "cottage cheese": (6, 25, 5),
+    "butter": (0, 0, 11),
+    "ice cream": (31, 5, 14),
+    # Fruit
+    "berry": (15, 1, 0.5),
+    "strawberry": (12, 1, 0.5),
+    "blueberry": (21, 1, 0.5),
+    "banana": (27, 1, 0.4),
+    "apple": (25, 0.5, 0.3),
+    "orange": (15, 1, 0.2),
+    "mango": (25, 1, 0.6),
+    "grape": (27, 1, 0.2),
+    "watermelon": (11, 1, 0.2),
+    "avocado": (12, 3, 21),
+    # Vegetables
+    "vegetable": (10, 3, 0.5),
+    "salad": (7, 2, 7),
+    "spinach": (4, 3, 0.5),
+    "broccoli": (6, 3, 0.5),
+    "carrot": (6, 0.5, 0.1),
+    "tomato": (5, 1, 0.2),
+    "cucumber": (4, 1, 0.2),
+    "mushroom": (3, 3, 0.3),
+    "pea": (21, 8, 0.6),
+    "corn": (27, 4, 2),
+    "potato": (37, 4, 0.2),
+    "sweet potato": (27, 2, 0.2),
+    "french fry": (48, 4, 17),
+    # Nuts, seeds and fats
+    "nut": (6, 5, 14),
+    "almond": (6, 6, 14),
+    "walnut": (4, 4, 18),
+    "peanut butter": (7, 8, 16),
+    "chia seed": (12, 5, 9),
+    "olive oil": (0, 0, 14),
+    # Mixed dishes
+    "stir fry": (10, 2, 7),
+    "curry": (15, 5, 12),
+    "vegetable curry": (20, 5, 12),
+    "stew": (10, 3, 3),
+    "soup": (15, 4, 3),
+    "sambar": (18, 6, 4),
+    "sandwich": (35, 15, 10),
+    "burger": (40, 25, 20),
+    "pizza": (36, 12, 10),
+    "burrito": (60, 22, 18),
+    "taco": (20, 9, 10),
+    "sushi": (38, 9, 3),
+    "smoothie": (20, 3, 1),
+    # Drinks and sweets
+    "coffee": (0, 0.3, 0),
+    "tea": (0, 0, 0),
+    "water": (0, 0, 0),
+    "juice": (26, 1, 0.3),
+    "orange juice": (26, 2, 0.5),
+    "soda": (39, 0, 0),
+    "honey": (17, 0, 0),
+    "cookie": (20, 2, 7),
+    "cake": (50, 4, 15),
+    "chocolate": (25, 2, 13),
+}
+
+# Words that carry no nutrients: filler, meal names, containers. Size and
+# preparation words change the nutrients, so they stay in the cache key
+_FILLER_TEXT = """
+    a an and the of with some on in plus side also just then my for to at
+    i ve m d ll had have ate eat eating eaten drank drink drinking having log
+    today tonight morning evening this it was is were me
+    breakfast lunch dinner snack meal food bowl plate cup glass piece slice serving
+"""
+
+# Preparation words the per-serving values already assume; the index skips
+# them, anything else ("fried") needs a matching phrase or the LLM
+_PLAIN_PREPARATION_TEXT = """
+    grilled baked roasted steamed boiled cooked plain fresh homemade mixed hot cold
+"""
+
+QUANTITY_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "half": 0.5, "double": 2, "couple": 2,
+                  "small": 0.75, "little": 0.5, "large": 1.5, "big": 1.5}
+
+_TOKEN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+_NUTRIENT_TEXT = re.compile(
+    r"carbs?\s*:\s*(\d+(?:\.\d+)?)\s*g.*?protein\s*:\s*(\d+(?:\.\d+)?)\s*g.*?fat\s*:\s*(\d+(?:\.\d+)?)\s*g",
+    re.IGNORECASE | re.DOTALL
+)
+
+NUTRIENT_SYSTEM_PROMPT = ("You are a nutrition expert. Analyze the meal and estimate macronutrients. "
+                          "Respond ONLY with format: 'Carbs: Xg, Protein: Yg, Fat: Zg'")
+
+
+def _singular(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("oes"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+FILLER_WORDS = frozenset(_singular(word) for word in _FILLER_TEXT.split())
+PLAIN_PREPARATION_WORDS = frozenset(_singular(word) for word in _PLAIN_PREPARATION_TEXT.split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/number tokens with naive plural stripping"""
+    return [_singular(token) for token in _TOKEN.findall(text.lower())]
+
+
+def normalize_meal(text: str) -> str:
+    """Cache key: tokens minus filler words, in their original order"""
+    return " ".join(token for token in tokenize(text) if token not in FILLER_WORDS)
+
+
+def format_nutrients(carbs: float, protein: float, fat: float) -> str:
+    return f"Carbs: {round(carbs)}g, Protein: {round(protein)}g, Fat: {round(fat)}g"
+
+
+def parse_nutrients(text: str) -> Optional[Tuple[float, float, float]]:
+    """(carbs, protein, fat) from an LLM answer, or None if it does not parse"""
+    match = _NUTRIENT_TEXT.search(text or "")
+    if match is None:
+        return None
+    return tuple(float(value) for value in match.groups())
+
+
+class FoodIndex:
+    """Longest-phrase-first matcher over the food-composition table"""
+
+    def __init__(self, foods: Dict[str, Tuple[float, float, float]] = FOOD_COMPOSITION):
+        # first token -> [(phrase tokens, macros)] sorted longest phrase first
+        self._by_first: Dict[str, List[Tuple[List[str], Tuple[float, float, float]]]] = {}
+        for name, macros in foods.items():
+            phrase = tokenize(name)
+            self._by_first.setdefault(phrase[0], []).append((phrase, macros))
+        for entries in self._by_first.values():
+            entries.sort(key=lambda entry: -len(entry[0]))
+
+    def estimate(self, text: str) -> Optional[Tuple[float, float, float]]:
+        """Summed macros, or None if any token is not a known food"""
+        tokens = tokenize(text)
+        totals = [0.0, 0.0, 0.0]
+        matched = False
+        quantity = 1.0
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            for phrase, macros in self._by_first.get(token, ()):
+                if tokens[i:i + len(phrase)] == phrase:
+                    for k in range(3):
+                        totals[k] += macros[k] * quantity
+                    matched = True
+                    quantity = 1.0
+                    i += len(phrase)
+                    break
+            else:
+                if token[0].isdigit():
+                    quantity *= float(token)
+                elif token in QUANTITY_WORDS:
+                    quantity *= QUANTITY_WORDS[token]
+                elif token not in FILLER_WORDS and token not in PLAIN_PREPARATION_WORDS:
+                    return None
+                i += 1
+        return tuple(totals) if matched else None
+
+
+class NutrientEstimator:
+    """Cache -> local index -> LLM nutrient estimates with hit-rate counters"""
+
+    def __init__(self, llm=None, cache_size: int = NUTRIENT_CACHE_SIZE, index: Optional[FoodIndex] = None):
+        self._llm = llm
+        self.index = index or FoodIndex()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "cache_hits": 0, "index_hits": 0, "llm_calls": 0,
+                         "llm_unparsed": 0, "llm_errors": 0}
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from .llm_client import get_llm_client
+            self._llm = get_llm_client()
+        return self._llm
+
+    def _lookup(self, meal_description: str) -> Tuple[str, Optional[str]]:
+        key = normalize_meal(meal_description)
+        with self._lock:
+            self.counters["requests"] += 1
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                return key, cached
+
+        macros = self.index.estimate(meal_description)
+        if macros is None:
+            return key, None
+        nutrients = format_nutrients(*macros)
+        with self._lock:
+            self.counters["index_hits"] += 1
+        self._store(key, nutrients)
+        return key, nutrients
+
+    def _store(self, key: str, nutrients: str) -> None:
+        with self._lock:
+            self._cache[key] = nutrients
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _accept(self, key: str, answer: str) -> str:
+        macros = parse_nutrients(answer)
+        if macros is None:
+            # Show what the model said, but do not cache an unparseable answer
+            with self._lock:
+                self.counters["llm_unparsed"] += 1
+            return answer.strip()
+        nutrients = format_nutrients(*macros)
+        self._store(key, nutrients)
+        return nutrients
+
+    @staticmethod
+    def _messages(meal_description: str) -> List[dict]:
+        return [
+            {"role": "system", "content": NUTRIENT_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Analyze this meal: {meal_description}"}
+        ]
+
+    def _count_llm_call(self, failed: bool = False) -> None:
+        with self._lock:
+            self.counters["llm_errors" if failed else "llm_calls"] += 1
+
+    def estimate(self, meal_description: str) -> str:
+        """Blocking estimate; calls the LLM only on a cache and index miss"""
+        key, nutrients = self._lookup(meal_description)
+        if nutrients is not None:
+            return nutrients
+        self._count_llm_call()
+        try:
+            answer = self.llm.complete_sync(self._messages(meal_description), max_tokens=50)
+        except Exception:
+            self._count_llm_call(failed=True)
+            raise
+        return self._accept(key, answer)
+
+    async def estimate_async(self, meal_description: str) -> str:
+        """Async estimate for request handlers"""
+        key, nutrients = self._lookup(meal_description)
+        if nutrients is not None:
+            return nutrients
+        self._count_llm_call()
+        try:
+            answer = await self.llm.complete(self._messages(meal_description), max_tokens=50)
+        except Exception:
+            self._count_llm_call(failed=True)
+            raise
+        return self._accept(key, answer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["cached"] = len(self._cache)
+        served_locally = stats["cache_hits"] + stats["index_hits"]
+        stats["hit_rate"] = served_locally / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+_estimator: Optional[NutrientEstimator] = None
+_estimator_lock = threading.Lock()
+
+
+def get_nutrient_estimator() -> NutrientEstimator:
+    """Return the process-wide nutrient estimator"""
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = NutrientEstimator()
+        return _estimator
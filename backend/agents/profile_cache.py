@@ -0,0 +1,148 @@
+"""
+User Profile Cache
+
+Bounded LRU cache of ``users`` rows with a TTL, so validating a user is a
+dictionary lookup instead of a query. Writes that go through
+DatabaseTool invalidate the affected entry immediately; the TTL bounds
+staleness for writes made by other processes (e.g. data_generator).
+Unknown user IDs are cached as misses too and invalidated the same way.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from .db import ConnectionPool
+
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", 100000))
+PROFILE_CACHE_TTL = float(os.environ.get("PROFILE_CACHE_TTL", 300))
+
+PROFILE_COLUMNS = (
+    "first_name", "last_name", "city", "diet_preference",
+    "medical_conditions", "physical_limitations"
+)
+
+
+class UserProfile:
+    """Compact in-memory copy of one users row"""
+
+    __slots__ = ("user_id",) + PROFILE_COLUMNS
+
+    def __init__(self, user_id: int, first_name: str, last_name: str, city: str,
+                 diet_preference: str, medical_conditions: Optional[str],
+                 physical_limitations: Optional[str]):
+        self.user_id = user_id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.city = city
+        self.diet_preference = diet_preference
+        self.medical_conditions = medical_conditions
+        self.physical_limitations = physical_limitations
+
+    def to_dict(self) -> dict:
+        """Shape returned by DatabaseTool.validate_user"""
+        result = {"valid": True}
+        for column in PROFILE_COLUMNS:
+            result[column] = getattr(self, column)
+        return result
+
+
+_MISSING = object()
+
+
+class ProfileCache:
+    """Thread-safe LRU + TTL cache of UserProfile objects keyed by user_id"""
+
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> (expires_at, UserProfile or None for unknown users)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a load that raced a write is not cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, loader: Callable[[int], Optional[UserProfile]]) -> Optional[UserProfile]:
+        """Return the cached profile, calling ``loader`` on a miss or expiry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        profile = loader(user_id)
+        self.put(user_id, profile, generation)
+        return profile
+
+    def put(self, user_id: int, profile: Optional[UserProfile], generation: Optional[int] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop one user's entry after a profile write"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def warm(self, pool: ConnectionPool) -> int:
+        """Load the whole users table (up to max_size rows); returns rows loaded"""
+        loaded = 0
+        with pool.connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT user_id, {', '.join(PROFILE_COLUMNS)} FROM users
+                ORDER BY user_id LIMIT ?
+            """, (self.max_size,))
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                for row in rows:
+                    self.put(row[0], UserProfile(*row))
+                loaded += len(rows)
+        return loaded
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+_caches: Dict[str, ProfileCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_profile_cache(db_file: str) -> ProfileCache:
+    """Return the process-wide profile cache for a database file"""
+    with _caches_lock:
+        cache = _caches.get(db_file)
+        if cache is None:
+            cache = _caches[db_file] = ProfileCache()
+        return cache
@@ -0,0 +1,157 @@
+"""
+Agent Registry
+
+Builds each agent once and reuses it across requests instead of calling
+a ``get_*_agent()`` factory (new Agent, model client, instructions and
+tool closures) per request. Instances are prepared when built: agno
+parses tool signatures into JSON schemas and opens the model's HTTP
+client on an agent's first run and keeps both on the instance, so only
+a fresh agent pays for them.
+
+An agno ``Agent`` keeps per-run state on the instance (run id, response,
+memory, session), so one instance must not run two requests at a time.
+Each agent kind therefore has a small bounded pool of prebuilt
+instances, checked out for one request like a pooled connection. The
+request's user is injected on checkout as ``agent.context`` (tools read
+it through ``context_user_id``) instead of being captured when the
+agent is built, and memory, session and context are cleared on return
+so nothing leaks to the next user.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from agno.agent import Agent
+
+from .healthcare_agents import (
+    get_cgm_agent,
+    get_food_intake_agent,
+    get_greeting_agent,
+    get_interrupt_agent,
+    get_meal_planner_agent,
+    get_mood_tracker_agent,
+)
+from .metrics import register_gauges
+
+AGENT_POOL_SIZE = int(os.environ.get("AGENT_POOL_SIZE", 8))
+
+# Keyed like the chat router's intents
+AGENT_FACTORIES: Dict[str, Callable[[], Agent]] = {
+    "greeting": get_greeting_agent,
+    "mood": get_mood_tracker_agent,
+    "cgm": get_cgm_agent,
+    "food": get_food_intake_agent,
+    "meal_planner": get_meal_planner_agent,
+    "interrupt": get_interrupt_agent,
+}
+
+
+def prepare_agent(agent: Agent) -> Agent:
+    """Do the first-run setup agno would otherwise do inside a request"""
+    agent.update_model()
+    agent.model.get_client()
+    return agent
+
+
+def reset_agent(agent: Agent) -> None:
+    """Drop everything a run left on the instance"""
+    if agent.memory is not None:
+        agent.memory.clear()
+    agent.context = None
+    agent.user_id = None
+    agent.session_id = None
+    agent.session_state = None
+    agent.agent_session = None
+    agent.run_id = None
+    agent.run_response = None
+
+
+class AgentPool:
+    """Bounded pool of prebuilt instances of one agent"""
+
+    def __init__(self, factory: Callable[[], Agent], size: int = AGENT_POOL_SIZE):
+        self.factory = factory
+        self.size = size
+        self._idle: "queue.LifoQueue[Agent]" = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> int:
+        return self._created
+
+    def acquire(self, timeout: Optional[float] = None) -> Agent:
+        """Take an idle agent, building a new one while under the bound"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return prepare_agent(self.factory())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def release(self, agent: Agent) -> None:
+        reset_agent(agent)
+        self._idle.put_nowait(agent)
+
+
+class AgentRegistry:
+    """One AgentPool per agent name"""
+
+    def __init__(self, factories: Dict[str, Callable[[], Agent]] = AGENT_FACTORIES,
+                 pool_size: int = AGENT_POOL_SIZE):
+        self.pools = {name: AgentPool(factory, pool_size) for name, factory in factories.items()}
+
+    def warm(self) -> None:
+        """Build one instance of every agent up front"""
+        for pool in self.pools.values():
+            pool.release(pool.acquire())
+
+    @contextmanager
+    def agent(self, name: str, user_id: Optional[int] = None, **context) -> Iterator[Agent]:
+        """Borrow an agent with this request's user injected as run context"""
+        pool = self.pools[name]
+        agent = pool.acquire()
+        try:
+            agent.context = {"user_id": user_id, **context}
+            agent.user_id = str(user_id) if user_id is not None else None
+            yield agent
+        finally:
+            pool.release(agent)
+
+    def run(self, name: str, message: str, user_id: Optional[int] = None, **kwargs):
+        """Run one message through a pooled agent (blocking)"""
+        with self.agent(name, user_id) as agent:
+            return agent.run(message, **kwargs)
+
+    def stats(self) -> dict:
+        return {name: pool.created for name, pool in self.pools.items()}
+
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_agent_registry() -> AgentRegistry:
+    """Return the process-wide agent registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AgentRegistry()
+            register_gauges("healthcare_agents_built", _registry.stats)
+        return _registry
@@ -0,0 +1,202 @@
+"""
+Chat Reply Models and Templates
+
+Chat replies are ``Reply`` objects: the agent that answered, the
+structured data behind the answer (profile, logged values, alerts,
+glucose statistics, meal plan sections with items and macros) and the
+display text, rendered from the templates below. Clients and caches can
+use the data directly instead of parsing the text.
+
+Replies that do not depend on the request (prompts for a value, help,
+fallbacks, the sample plan) are built once at import, and meal plan
+replies once per distinct plan text; each ``Reply`` encodes itself once
+and keeps the bytes. Encoding uses orjson when it is installed and the
+standard library otherwise (compact separators, emoji kept as UTF-8).
+"""
+
+import json
+from functools import lru_cache
+from typing import Dict, Optional
+
+from starlette.responses import Response
+
+from .meal_plans import parse_plan
+from .nutrition import parse_nutrients
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class Reply:
+    """One chat reply: display text plus the data it was rendered from"""
+
+    __slots__ = ("agent", "content", "data", "session_token", "_encoded")
+
+    def __init__(self, agent: str, content: str, data: Optional[dict] = None,
+                 session_token: Optional[str] = None):
+        self.agent = agent
+        self.content = content
+        self.data = data
+        self.session_token = session_token
+        self._encoded: Optional[bytes] = None
+
+    def to_dict(self) -> dict:
+        result = {"role": "assistant", "agent": self.agent, "content": self.content}
+        if self.data is not None:
+            result["data"] = self.data
+        if self.session_token is not None:
+            result["session_token"] = self.session_token
+        return result
+
+    def encode(self) -> bytes:
+        if self._encoded is None:
+            self._encoded = dumps(self.to_dict())
+        return self._encoded
+
+
+class ReplyResponse(Response):
+    """JSON response for a Reply (or any JSON-serializable value) without FastAPI's encoder pass"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content.encode() if isinstance(content, Reply) else dumps(content)
+
+
+CAPABILITIES = """How can I assist you today? I can help you with:
+- Logging your mood
+- Recording CGM readings
+- Tracking food intake
+- Generating personalized meal plans
+- Answering general questions"""
+
+GREETING = "Hello! Welcome to the Healthcare Multi-Agent System! 👋\n\nUser ID {user_id} validated successfully!\n\n"
+PROFILE = """Name: {first_name} {last_name}
+City: {city}
+Diet: {diet_preference}
+Medical Conditions: {medical_conditions}
+Physical Limitations: {physical_limitations}
+
+"""
+MEAL_PLAN_HEADER = "🍽️ **Your Personalized Meal Plan**\n\n"
+# The meal planner agent's tool ends its plans with this
+MEAL_PLAN_FOOTER = ("\n\n---\n✅ This plan has been generated based on your current health data "
+                    "and will help you achieve your wellness goals!")
+MOOD_SUMMARY = "\n\n📊 Your 7-day mood summary:\n{summary}"
+CGM_MEAN = "\n\n📊 7-day average: {mean:.1f} mg/dL"
+CGM_TIME_IN_RANGE = "\n🎯 Time in range (24h): {time_in_range:.0%}"
+FOOD_LOGGED = "✅ {message}\n\n🍽️ Meal: {meal}\n📊 Estimated nutrients: {nutrients}\n\nYour food intake has been logged!"
+
+SAMPLE_MEAL_PLAN = """🌅 BREAKFAST: Healthy Oatmeal Bowl
+- Steel-cut oats with berries
+- Greek yogurt
+- Nuts and seeds
+📊 Macros: Carbs: 45g | Protein: 20g | Fat: 12g
+💡 Note: High fiber for stable glucose
+
+☀️ LUNCH: Grilled Chicken Salad
+- Mixed greens with vegetables
+- Grilled chicken breast
+- Olive oil dressing
+📊 Macros: Carbs: 15g | Protein: 35g | Fat: 18g
+💡 Note: Low-carb, high protein
+
+🌙 DINNER: Baked Salmon with Quinoa
+- Baked salmon fillet
+- Quinoa and vegetables
+- Herbs and lemon
+📊 Macros: Carbs: 35g | Protein: 30g | Fat: 15g
+💡 Note: Omega-3 rich, balanced meal
+
+🎯 PLAN RATIONALE: This plan provides balanced nutrition with controlled carbohydrates to help maintain stable blood glucose levels."""
+
+# Request-independent replies, built and encoded once
+STATIC: Dict[str, Reply] = {
+    "ask_user_id": Reply("greeting", "Hello! Please enter your User ID to get started. 👋"),
+    "missing_user": Reply("greeting", "❌ I need your User ID first. Please tell me your User ID."),
+    "invalid_user": Reply("greeting", "❌ Invalid User ID. Please enter a valid User ID."),
+    "ask_mood": Reply("mood", "I'd be happy to help you log your mood! How are you feeling right now? "
+                              "(happy, sad, tired, excited, anxious, etc.)"),
+    "ask_cgm": Reply("cgm", "I can help you log your CGM reading! What's your current glucose reading in mg/dL?"),
+    "ask_food": Reply("food", "I can help you log your food intake! Please describe what you ate "
+                              "(e.g., 'oatmeal with berries and coffee')."),
+    "help": Reply("interrupt", "I'm here to help with your healthcare needs! You can ask me about:\n"
+                               "- Logging your mood\n- Recording CGM readings\n- Tracking food intake\n"
+                               "- Generating meal plans\n- General health questions\n\n"
+                               "Is there anything specific I can help you with?"),
+    "fallback": Reply("fallback", "I'm experiencing some technical difficulties right now, but I'm still here "
+                                  "to help! Please try asking me about:\n- Logging your mood\n"
+                                  "- Recording CGM readings\n- Tracking food intake\n- Generating meal plans"),
+}
+
+
+def greeting(user_id: int, profile: Optional[dict] = None) -> Reply:
+    """Welcome for a validated user, with their profile when it could be read"""
+    if profile is None:
+        return Reply("greeting", GREETING.format(user_id=user_id) + CAPABILITIES, {"user_id": user_id})
+    fields = {name: profile[name] for name in ("first_name", "last_name", "city", "diet_preference",
+                                               "medical_conditions", "physical_limitations")}
+    return Reply("greeting", GREETING.format(user_id=user_id) + PROFILE.format(**fields) + CAPABILITIES,
+                 {"user_id": user_id, "profile": fields})
+
+
+def unknown_user(user_id: int) -> Reply:
+    return Reply("greeting", f"Sorry, User ID {user_id} was not found. Please enter a valid User ID. 👋",
+                 {"user_id": user_id})
+
+
+def mood_logged(mood: str, message: Optional[str] = None, counts: Optional[Dict[str, int]] = None) -> Reply:
+    """Logged mood; ``counts`` adds the recent mood summary"""
+    if message is None:
+        text = f"✅ Your mood ({mood}) has been logged successfully!"
+    else:
+        text = f"✅ {message}\n\nYour mood ({mood}) has been logged successfully!"
+    data = {"mood": mood}
+    if counts is not None:
+        text += MOOD_SUMMARY.format(summary="\n".join(f"• {m}: {c} time(s)" for m, c in counts.items()))
+        data["recent"] = counts
+    return Reply("mood", text, data)
+
+
+def cgm_logged(glucose: int, message: Optional[str] = None, alert: Optional[str] = None,
+               stats: Optional[dict] = None) -> Reply:
+    """Logged reading with its range alert and, when known, the rolling statistics"""
+    text = f"✅ {message or f'CGM reading {glucose} mg/dL logged successfully!'}"
+    if alert:
+        text += f"\n\n{alert}"
+    data = {"glucose": glucose, "alert": alert or None}
+    if stats is not None:
+        windows = stats["windows"]
+        if windows["7d"]["count"]:
+            text += CGM_MEAN.format(mean=windows["7d"]["mean"])
+        if windows["24h"]["time_in_range"] is not None:
+            text += CGM_TIME_IN_RANGE.format(time_in_range=windows["24h"]["time_in_range"])
+        data["stats"] = {"windows": windows, "rate_of_change": stats["rate_of_change"],
+                         "current_event": stats["current_event"]}
+    return Reply("cgm", text, data)
+
+
+def food_logged(meal: str, nutrients: Optional[str], message: str = "Your meal has been logged successfully!") -> Reply:
+    macros = parse_nutrients(nutrients) if nutrients else None
+    return Reply("food", FOOD_LOGGED.format(message=message, meal=meal, nutrients=nutrients), {
+        "meal": meal,
+        "nutrients": nutrients,
+        "macros": dict(zip(("carbs", "protein", "fat"), macros)) if macros else None,
+    })
+
+
+@lru_cache(maxsize=4096)
+def meal_plan(plan: str) -> Reply:
+    """Meal plan reply with its parsed meals, built once per distinct plan text"""
+    return Reply("meal_planner", MEAL_PLAN_HEADER + plan, {"plan": parse_plan(plan)})
+
+
+STATIC["sample_meal_plan"] = meal_plan(SAMPLE_MEAL_PLAN)
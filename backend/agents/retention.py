@@ -0,0 +1,454 @@
+"""
+Log Retention and Cold Archive
+
+``mood_logs``, ``cgm_logs`` and ``food_logs`` keep the last
+``LOG_RETENTION_DAYS`` days of rows (the hot window). Older rows move
+into one archive file per log kind and UTC month under the archive
+directory (``LOG_ARCHIVE_DIR``, by default ``<db file name>_archive``
+next to the database): a small SQLite file with one row per user holding
+that user's logs for the month as zlib-compressed columns, IDs and times
+delta-encoded. The ``log_archives`` table lists the archived months. The
+history APIs (log pages, exports, raw CGM history) read the months a
+request reaches and merge them with the hot rows, so callers cannot tell
+where a row is kept.
+
+Months are archived whole: the cutoff is the start of the UTC month
+holding the first day of the hot window. A retention pass walks each
+log table one batch of users at a time:
+
+1. reads the batch's rows older than the cutoff, without the write lock;
+2. merges them into the month files and commits those;
+3. in one short write transaction deletes them from the log table,
+   recomputes the CGM rollups of each archived (user, month) from the
+   archived and remaining rows, and records the months in log_archives.
+
+A crash between 2 and 3 leaves rows in both places; readers merge by
+log_id and the next pass completes the move. Rows only ever move from
+the log tables to the archive and readers read the log table first, so
+a concurrent pass cannot hide a row from them. The pages freed by the
+deletes are then returned to the file system with
+``PRAGMA incremental_vacuum`` a few thousand pages per write transaction.
+
+``RetentionScheduler`` runs a pass every night at ``LOG_RETENTION_HOUR``
+(UTC) in one worker process. Run it manually with
+``python -m agents.retention [db_file]``.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from . import cgm_rollups, history
+from .db import DB_FILE, ConnectionPool, file_lock, get_pool, retry_busy
+
+LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", 180))  # 0 keeps every row hot
+LOG_RETENTION_HOUR = int(os.environ.get("LOG_RETENTION_HOUR", 4))  # UTC
+LOG_RETENTION_CHECK_INTERVAL = float(os.environ.get("LOG_RETENTION_CHECK_INTERVAL", 300))
+LOG_RETENTION_BATCH_SIZE = int(os.environ.get("LOG_RETENTION_BATCH_SIZE", 10000))
+LOG_ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR")
+VACUUM_STEP_PAGES = int(os.environ.get("VACUUM_STEP_PAGES", 4096))
+
+# Glucose statistics and the meal planner read the last 7 days from cgm_logs
+MIN_RETENTION_DAYS = 8
+# Pause between batches so application writers get the write lock
+BATCH_PAUSE = 0.005
+ARCHIVE_COMPRESSION = 6
+
+# Export position while a whole-table export walks the archive: (ARCHIVE, month, last user_id)
+ARCHIVE = "archive"
+
+# (log_id, user_id, timestamp, payload...) as returned by the history queries
+Row = tuple
+
+
+def archive_dir(db_file: str) -> str:
+    return LOG_ARCHIVE_DIR or f"{os.path.splitext(db_file)[0]}_archive"
+
+
+def month_of(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m")
+
+
+def month_bounds(month: str) -> Tuple[int, int]:
+    """[start, end) of a UTC month in epoch seconds"""
+    year, number = map(int, month.split("-"))
+    start = datetime(year, number, 1, tzinfo=timezone.utc)
+    end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def archive_cutoff(days: int, now: Optional[int] = None) -> int:
+    """Rows older than this are archived: the start of the month holding the first hot day"""
+    now = int(time.time()) if now is None else now
+    return month_bounds(month_of(now - days * 86400))[0]
+
+
+def encode_rows(rows: List[Row]) -> bytes:
+    """Compress one user's rows (sorted by timestamp, log_id) column by column"""
+    log_ids, _, timestamps, *payload = (list(column) for column in zip(*rows))
+    deltas = [[b - a for a, b in zip([0] + column, column)] for column in (log_ids, timestamps)]
+    return zlib.compress(json.dumps([*deltas, *payload], separators=(",", ":")).encode(), ARCHIVE_COMPRESSION)
+
+
+def decode_rows(user_id: int, blob: bytes) -> List[Row]:
+    log_ids, timestamps, *payload = json.loads(zlib.decompress(blob))
+    return [(log_id, user_id, timestamp, *values) for log_id, timestamp, *values
+            in zip(accumulate(log_ids), accumulate(timestamps), *payload)]
+
+
+def sort_rows(rows) -> List[Row]:
+    return sorted(rows, key=lambda row: (row[2], row[0]))
+
+
+class LogArchive:
+    """Month archive files of one database, and the reads the history APIs merge in"""
+
+    def __init__(self, pool: ConnectionPool, directory: Optional[str] = None):
+        self.pool = pool
+        self.directory = directory or archive_dir(pool.db_file)
+
+    def path(self, kind: str, month: str) -> str:
+        return os.path.join(self.directory, kind, f"{month}.sqlite")
+
+    def months(self, kind: str) -> List[str]:
+        """Archived months of a log kind, oldest first"""
+        try:
+            with self.pool.connection() as conn:
+                return [row[0] for row in conn.execute(
+                    "SELECT month FROM log_archives WHERE kind = ? ORDER BY month", (kind,))]
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            return []
+
+    def _open(self, kind: str, month: str, write: bool = False) -> sqlite3.Connection:
+        if not write:
+            return sqlite3.connect(f"file:{self.path(kind, month)}?mode=ro", uri=True)
+        os.makedirs(os.path.dirname(self.path(kind, month)), exist_ok=True)
+        conn = sqlite3.connect(self.path(kind, month))
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive (
+                user_id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL,
+                rows BLOB NOT NULL
+            )
+        """)
+        return conn
+
+    def user_rows(self, kind: str, user_id: int, month: str) -> List[Row]:
+        """A user's archived rows for one month, by (timestamp, log_id)"""
+        conn = self._open(kind, month)
+        try:
+            found = conn.execute("SELECT rows FROM archive WHERE user_id = ?", (user_id,)).fetchone()
+        finally:
+            conn.close()
+        return decode_rows(user_id, found[0]) if found else []
+
+    def before(self, kind: str, user_id: int, cursor: Optional[history.Cursor], limit: int,
+               months: Optional[List[str]] = None) -> List[Row]:
+        """Up to limit archived rows of a user before a (timestamp, log_id) cursor, newest first"""
+        found: List[Row] = []
+        for month in reversed(self.months(kind) if months is None else months):
+            if cursor is not None and month_bounds(month)[0] > cursor[0]:
+                continue
+            rows = self.user_rows(kind, user_id, month)
+            found.extend(reversed([row for row in rows if cursor is None or (row[2], row[0]) < cursor]))
+            if len(found) >= limit:
+                break
+        return found[:limit]
+
+    def after(self, kind: str, user_id: int, cursor: Optional[history.Cursor], limit: int,
+              months: Optional[List[str]] = None) -> List[Row]:
+        """Up to limit archived rows of a user after a (timestamp, log_id) cursor, oldest first"""
+        found: List[Row] = []
+        for month in self.months(kind) if months is None else months:
+            if cursor is not None and month_bounds(month)[1] <= cursor[0]:
+                continue
+            rows = self.user_rows(kind, user_id, month)
+            found.extend(row for row in rows if cursor is None or (row[2], row[0]) > cursor)
+            if len(found) >= limit:
+                break
+        return found[:limit]
+
+    def between(self, kind: str, user_id: int, start: int, end: int,
+                months: Optional[List[str]] = None) -> List[Row]:
+        """Archived rows of a user with start <= timestamp < end, oldest first"""
+        found: List[Row] = []
+        for month in self.months(kind) if months is None else months:
+            month_start, month_end = month_bounds(month)
+            if month_end > start and month_start < end:
+                found.extend(row for row in self.user_rows(kind, user_id, month) if start <= row[2] < end)
+        return found
+
+    def export_start(self, kind: str) -> Optional[tuple]:
+        """Position of the first archived row for a whole-table export, None with nothing archived"""
+        months = self.months(kind)
+        return (ARCHIVE, months[0], 0) if months else None
+
+    def export_batch(self, kind: str, position: tuple, limit: int) -> Tuple[List[Row], Optional[tuple]]:
+        """Archived rows month by month and user by user, about limit at a time, and the next position"""
+        _, first_month, after_user_id = position
+        rows: List[Row] = []
+        for month in self.months(kind):
+            if month < first_month:
+                continue
+            conn = self._open(kind, month)
+            try:
+                cursor = conn.execute("SELECT user_id, rows FROM archive WHERE user_id > ? ORDER BY user_id",
+                                      (after_user_id if month == first_month else 0,))
+                for user_id, blob in cursor:
+                    rows.extend(decode_rows(user_id, blob))
+                    if len(rows) >= limit:
+                        return rows, (ARCHIVE, month, user_id)
+            finally:
+                conn.close()
+        return rows, None
+
+    def store(self, kind: str, month: str, rows_by_user: Dict[int, List[Row]]) -> Tuple[Dict[int, List[Row]], int]:
+        """Merge rows into a month file and commit it
+
+        Returns each user's archived rows for the month after the merge and
+        how many of the given rows were not in the file yet.
+        """
+        conn = self._open(kind, month, write=True)
+        try:
+            merged, added = {}, 0
+            for user_id, rows in rows_by_user.items():
+                found = conn.execute("SELECT rows FROM archive WHERE user_id = ?", (user_id,)).fetchone()
+                combined = {row[0]: row for row in (decode_rows(user_id, found[0]) if found else ())}
+                added += sum(1 for row in rows if row[0] not in combined)
+                combined.update((row[0], row) for row in rows)
+                merged[user_id] = sort_rows(combined.values())
+            conn.executemany("INSERT OR REPLACE INTO archive (user_id, count, rows) VALUES (?, ?, ?)",
+                             [(user_id, len(rows), encode_rows(rows)) for user_id, rows in merged.items()])
+            conn.commit()
+        finally:
+            conn.close()
+        return merged, added
+
+
+class LogRetention:
+    """Moves log rows older than the hot window into the archive and reclaims the space"""
+
+    def __init__(self, pool: ConnectionPool, days: int = LOG_RETENTION_DAYS,
+                 batch_size: int = LOG_RETENTION_BATCH_SIZE, directory: Optional[str] = None):
+        if 0 < days < MIN_RETENTION_DAYS:
+            raise ValueError(f"LOG_RETENTION_DAYS must be 0 (keep everything) or at least {MIN_RETENTION_DAYS}")
+        self.pool = pool
+        self.days = days
+        self.batch_size = batch_size
+        self.archive = LogArchive(pool, directory)
+        self.stats = {"runs": 0, "skipped": 0, "rows_archived": 0, "pages_vacuumed": 0, "last_run_seconds": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.days > 0
+
+    def _next_batch(self, table: str, columns: str, after_user_id: int,
+                    cutoff: int) -> Tuple[List[Row], Optional[int]]:
+        """Rows older than cutoff of the users after after_user_id, about batch_size
+
+        Also returns the last user read, None once the table is exhausted.
+        """
+        rows: List[Row] = []
+        with self.pool.connection() as conn:
+            while len(rows) < self.batch_size:
+                found = conn.execute(f"SELECT user_id FROM {table} WHERE user_id > ? ORDER BY user_id LIMIT 1",
+                                     (after_user_id,)).fetchone()
+                if found is None:
+                    return rows, None
+                after_user_id = found[0]
+                rows.extend(conn.execute(f"""
+                    SELECT log_id, user_id, timestamp, {columns} FROM {table}
+                    WHERE user_id = ? AND timestamp < ?
+                """, (after_user_id, cutoff)))
+        return rows, after_user_id
+
+    def _store(self, kind: str, rows: List[Row]) -> Tuple[Dict[str, int], Dict[Tuple[int, str], List[Row]]]:
+        """Write a batch to its month files; rows added per month, archived rows per (user, month)"""
+        by_month: Dict[str, Dict[int, List[Row]]] = {}
+        days: Dict[int, str] = {}
+        for row in rows:
+            day = row[2] // 86400
+            month = days.get(day) or days.setdefault(day, month_of(row[2]))
+            by_month.setdefault(month, {}).setdefault(row[1], []).append(row)
+        added, archived = {}, {}
+        for month, rows_by_user in by_month.items():
+            merged, added[month] = self.archive.store(kind, month, rows_by_user)
+            archived.update(((user_id, month), user_rows) for user_id, user_rows in merged.items())
+        return added, archived
+
+    @retry_busy
+    def _commit(self, kind: str, table: str, rows: List[Row], added: Dict[str, int],
+                archived: Dict[Tuple[int, str], List[Row]]) -> None:
+        """Delete a stored batch from its log table, re-derive CGM rollups and record the months"""
+        # Outside the write lock; readings that arrived late for these months are added inside
+        rollups = {key: cgm_rollups.aggregate((row[1], row[2], row[3]) for row in user_rows)
+                   for key, user_rows in archived.items()} if kind == "cgm" else {}
+        spans = ", ".join(map(str, cgm_rollups.SPANS.values()))
+        now = int(time.time())
+        with self.pool.writer() as conn:
+            conn.executemany(f"DELETE FROM {table} WHERE log_id = ?", [(row[0],) for row in rows])
+            for (user_id, month), buckets in rollups.items():
+                start, end = month_bounds(month)
+                late = conn.execute("""
+                    SELECT user_id, timestamp, glucose_reading FROM cgm_logs
+                    WHERE user_id = ? AND timestamp >= ? AND timestamp < ?
+                """, (user_id, start, end)).fetchall()
+                if late:
+                    buckets = cgm_rollups.aggregate(
+                        [(row[1], row[2], row[3]) for row in archived[user_id, month]] + late)
+                conn.execute(f"""
+                    DELETE FROM cgm_rollups WHERE user_id = ? AND span IN ({spans}) AND bucket >= ? AND bucket < ?
+                """, (user_id, start, end))
+                conn.executemany(cgm_rollups.UPSERT_SQL, buckets)
+            conn.executemany("""
+                INSERT INTO log_archives (kind, month, rows, bytes, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (kind, month) DO UPDATE SET
+                    rows = rows + excluded.rows, bytes = excluded.bytes, updated_at = excluded.updated_at
+            """, [(kind, month, count, os.path.getsize(self.archive.path(kind, month)), now)
+                  for month, count in added.items()])
+            conn.commit()
+
+    def archive_kind(self, kind: str, cutoff: int) -> int:
+        """Move one log table's rows older than cutoff into the archive; returns rows moved"""
+        table, columns = history.log_kind(kind)
+        columns = ", ".join(column for column, _ in columns)
+        moved, after_user_id = 0, 0
+        while after_user_id is not None:
+            rows, after_user_id = self._next_batch(table, columns, after_user_id, cutoff)
+            if not rows:
+                continue
+            added, archived = self._store(kind, rows)
+            self._commit(kind, table, rows, added, archived)
+            moved += len(rows)
+            time.sleep(BATCH_PAUSE)
+        return moved
+
+    def vacuum(self, max_pages: Optional[int] = None) -> int:
+        """Return free pages to the file system in small steps; returns pages freed
+
+        Needs ``auto_vacuum=INCREMENTAL``, the default for databases created
+        by this version; convert an older file once with ``full_vacuum``.
+        Freed pages are reused by later inserts either way.
+        """
+        with self.pool.connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+        freed = 0
+        while max_pages is None or freed < max_pages:
+            with self.pool.writer() as conn:
+                step = min(conn.execute("PRAGMA freelist_count").fetchone()[0], VACUUM_STEP_PAGES)
+                if max_pages is not None:
+                    step = min(step, max_pages - freed)
+                if not step:
+                    break
+                # execute() steps the pragma once, freeing a single page; executescript runs it to the end
+                conn.executescript(f"PRAGMA incremental_vacuum({step})")
+                freed += step
+            time.sleep(BATCH_PAUSE)
+        # The file shrinks once the WAL is checkpointed; PASSIVE never waits on readers or writers
+        with self.pool.connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return freed
+
+    def full_vacuum(self) -> None:
+        """Rewrite the whole database with auto_vacuum=INCREMENTAL
+
+        Blocks every writer while it runs; needed once for a database created
+        before incremental vacuum was enabled.
+        """
+        with self.pool.writer() as conn:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+
+    def run(self, now: Optional[int] = None) -> dict:
+        """One retention pass over every log table, then an incremental vacuum"""
+        started = time.perf_counter()
+        cutoff = archive_cutoff(self.days, now)
+        moved = {kind: self.archive_kind(kind, cutoff) for kind in history.LOG_KINDS}
+        pages = self.vacuum()
+        self.stats["runs"] += 1
+        self.stats["rows_archived"] += sum(moved.values())
+        self.stats["pages_vacuumed"] += pages
+        self.stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+        return {"cutoff": cutoff, "archived": moved, "pages_vacuumed": pages,
+                "seconds": self.stats["last_run_seconds"]}
+
+    def run_exclusive(self, now: Optional[int] = None) -> Optional[dict]:
+        """run() unless another process is already running a pass; None if it was skipped"""
+        with file_lock(f"{self.pool.db_file}.retention-lock", blocking=False) as locked:
+            if not locked:
+                self.stats["skipped"] += 1
+                return None
+            return self.run(now)
+
+
+class RetentionScheduler:
+    """Background thread that runs a retention pass once a day"""
+
+    def __init__(self, retention: LogRetention, hour: int = LOG_RETENTION_HOUR,
+                 check_interval: float = LOG_RETENTION_CHECK_INTERVAL):
+        self.retention = retention
+        self.hour = hour
+        self.check_interval = check_interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_run: Optional[str] = None
+
+    def start(self) -> None:
+        if self._thread is not None or not self.retention.enabled:
+            return
+        self._last_run = datetime.now(timezone.utc).date().isoformat()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="log-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def due(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        return now.hour >= self.hour and now.date().isoformat() != self._last_run
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.check_interval):
+            if not self.due():
+                continue
+            self._last_run = datetime.now(timezone.utc).date().isoformat()
+            try:
+                result = self.retention.run_exclusive()
+                if result is not None:
+                    print(f"Log retention: {result}")
+            except Exception as e:
+                print(f"Log retention pass failed: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive log rows older than the hot window")
+    parser.add_argument("db_file", nargs="?", default=DB_FILE)
+    parser.add_argument("--days", type=int, default=LOG_RETENTION_DAYS or 180, help="hot window in days")
+    parser.add_argument("--full-vacuum", action="store_true",
+                        help="first rewrite the database with incremental vacuum enabled (blocks writers)")
+    args = parser.parse_args()
+
+    from .migrations import migrate
+    migrate(args.db_file)
+    retention = LogRetention(get_pool(args.db_file), args.days)
+    if args.full_vacuum:
+        print(f"Rewriting {args.db_file} with auto_vacuum=INCREMENTAL ...")
+        retention.full_vacuum()
+    print(f"Archiving logs older than {args.days} days from {args.db_file} into {retention.archive.directory} ...")
+    result = retention.run_exclusive()
+    print(f"✅ {result}" if result is not None else "⏭️  Another process is running a retention pass")
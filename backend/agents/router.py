@@ -0,0 +1,147 @@
+"""
+Intent Router for the Chat Endpoint
+
+Classifies a chat message in a single scan of one precompiled regex that
+matches every routing keyword (as a prefix-factored trie alternation),
+explicit user-ID mentions ("user id 12", "id: 12") and bare numbers at
+once. Keywords match whole words, and longer phrases win over their
+prefixes ("meal plan" is a planning request, not a food log), and
+plurals and other inflections of a keyword ("meals", "readings",
+"suggestions") count as the keyword itself. A bare
+number is read as a glucose value in CGM messages and as a user ID only
+in greetings, so "reading 150" no longer doubles as user 150. An
+explicit user-ID mention only makes the message a greeting when no
+other intent keyword is present.
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+# Intents in priority order: the first intent with a keyword in the message wins
+INTENT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "greeting": ("hello", "hi", "start", "begin", "user id", "id"),
+    "mood": ("mood", "feeling", "happy", "sad", "tired", "excited"),
+    "cgm": ("glucose", "cgm", "blood sugar", "reading"),
+    "food": ("food", "meal", "ate", "eating", "breakfast", "lunch", "dinner"),
+    "meal_planner": ("plan", "meal plan", "menu", "suggest"),
+}
+MOODS = ("happy", "sad", "tired", "excited", "anxious", "angry", "calm", "stressed")
+# Other forms of a keyword, routed like it
+KEYWORD_FORMS: Dict[str, Tuple[str, ...]] = {
+    "mood": ("moods",),
+    "feeling": ("feelings",),
+    "reading": ("readings",),
+    "blood sugar": ("blood sugars",),
+    "cgm": ("cgms",),
+    "food": ("foods",),
+    "meal": ("meals",),
+    "breakfast": ("breakfasts",),
+    "lunch": ("lunches",),
+    "dinner": ("dinners",),
+    "plan": ("plans", "planning", "planned"),
+    "meal plan": ("meal plans", "meal planning"),
+    "menu": ("menus",),
+    "suggest": ("suggests", "suggested", "suggestion", "suggestions"),
+}
+
+INTENT_PRIORITY = {intent: rank for rank, intent in enumerate(INTENT_KEYWORDS)}
+
+# keyword -> (intent or None, mood or None)
+_KEYWORDS: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+for _intent, _words in INTENT_KEYWORDS.items():
+    for _word in _words:
+        for _form in (_word, *KEYWORD_FORMS.get(_word, ())):
+            _KEYWORDS[_form] = (_intent, None)
+for _mood in MOODS:
+    _KEYWORDS[_mood] = (_KEYWORDS.get(_mood, (None, None))[0], _mood)
+
+
+def _trie_pattern(words) -> str:
+    """Prefix-factored alternation, so the regex engine walks a trie"""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if "" in node else body
+
+    return build(trie)
+
+
+# Every branch starts at a word boundary so most positions fail immediately
+_PATTERN = re.compile(
+    r"\b(?:"
+    r"(?:user\s*)?id\b\W{0,3}(?:is\s+|number\s+)?(?P<user_id>\d+)"
+    r"|(?P<keyword>" + _trie_pattern(_KEYWORDS) + r")\b"
+    r"|(?P<number>\d+)"
+    r")"
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+class Route:
+    """What a chat message asks for and the values extracted from it"""
+
+    __slots__ = ("intent", "mood", "glucose", "user_id")
+
+    def __init__(self, intent: str, mood: Optional[str] = None, glucose: Optional[int] = None,
+                 user_id: Optional[int] = None):
+        self.intent = intent
+        self.mood = mood
+        self.glucose = glucose
+        self.user_id = user_id
+
+    def __repr__(self) -> str:
+        return (f"Route(intent={self.intent!r}, mood={self.mood!r}, "
+                f"glucose={self.glucose!r}, user_id={self.user_id!r})")
+
+
+def route_message(message: str, follow_up: Optional[str] = None) -> Route:
+    """Classify a message (any case) and extract mood, glucose and user ID
+
+    ``follow_up`` is the intent assumed for a message without any intent
+    keyword, i.e. a reply to the question the previous turn asked.
+    """
+    intent = None
+    mood = None
+    user_id = None
+    first_number = None
+
+    for user_id_text, keyword, number in _PATTERN.findall(message.lower()):
+        if keyword:
+            if keyword not in _KEYWORDS:
+                keyword = _WHITESPACE.sub(" ", keyword)
+            keyword_intent, keyword_mood = _KEYWORDS[keyword]
+            if keyword_intent and (intent is None or INTENT_PRIORITY[keyword_intent] < INTENT_PRIORITY[intent]):
+                intent = keyword_intent
+            if keyword_mood and mood is None:
+                mood = keyword_mood
+        elif user_id_text:
+            if user_id is None:
+                user_id = int(user_id_text)
+        elif first_number is None:
+            first_number = int(number)
+
+    # "my id is 12" alone is a greeting; "id 12, glucose 140" is a CGM log
+    if intent is None and user_id is not None:
+        intent = "greeting"
+    # Moods outside the mood keyword list ("i feel anxious") still mean mood
+    if intent is None and mood is not None:
+        intent = "mood"
+
+    route = Route(intent or follow_up or "interrupt", mood=mood, user_id=user_id)
+    if route.intent == "cgm":
+        route.glucose = first_number
+    elif route.intent == "greeting" and user_id is None:
+        route.user_id = first_number
+    return route
@@ -0,0 +1,212 @@
+"""
+Chat Sessions
+
+A greeting with a valid user ID opens a session: an opaque token mapped
+to the validated user, their profile as returned by
+``DatabaseTool.validate_user`` and the recent conversation (intents and
+messages of the last turns). Later turns send the token instead of a
+user ID, so the user is neither re-parsed from the message ("I ate 2
+eggs" is not user 2) nor re-validated. When a reply asked for a value
+("What's your current glucose reading?") the session remembers the
+pending intent, so a bare answer ("142", "oatmeal") is routed to it.
+
+Sessions live in a bounded LRU with a sliding TTL; expired ones are
+dropped from memory as new sessions come in. The profile is the one the
+greeting validated and is refreshed from the profile cache (which
+``DatabaseTool.update_user`` invalidates) when the user greets again. With
+``SESSION_STORE=sqlite`` (the default with more than one worker) they
+are also written to the ``sessions`` table so they survive restarts and
+are shared between worker processes; a token missing from memory is then
+looked up there. With more than one worker there is no per-process
+cache: another worker may have advanced the session, so every turn reads
+it from the table (one primary-key lookup) and writes it back.
+
+Sessions are an API feature: the dashboard's CopilotKit chat does not
+carry ``session_token`` and identifies the user by ID on every message.
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from .db import WORKERS, ConnectionPool, get_pool
+
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 1800))
+SESSION_MAX = int(os.environ.get("SESSION_MAX", 100000))
+SESSION_HISTORY = int(os.environ.get("SESSION_HISTORY", 10))
+# Worker processes only share sessions through the database
+SESSION_STORE = os.environ.get("SESSION_STORE", "sqlite" if WORKERS > 1 else "memory").lower()
+# Expired rows are deleted from the sessions table every this many new sessions
+PURGE_EVERY = 1000
+
+
+class Session:
+    """One user's conversation with the chat endpoint"""
+
+    __slots__ = ("token", "user_id", "profile", "history", "pending", "expires_at")
+
+    def __init__(self, token: str, user_id: int, profile: dict, history: List[list],
+                 pending: Optional[str], expires_at: float, history_size: int = SESSION_HISTORY):
+        self.token = token
+        self.user_id = user_id
+        self.profile = profile
+        self.history = deque(history, maxlen=history_size)
+        # Intent whose question the last reply asked, if any
+        self.pending = pending
+        self.expires_at = expires_at
+
+
+class SessionStore:
+    """Thread-safe LRU of sessions with a sliding TTL and optional SQLite persistence"""
+
+    def __init__(self, pool: Optional[ConnectionPool] = None, ttl: float = SESSION_TTL,
+                 max_sessions: int = SESSION_MAX, history_size: int = SESSION_HISTORY,
+                 shared: bool = False):
+        self.pool = pool
+        # Other processes update the same sessions: always read the table
+        self.shared = shared and pool is not None
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.history_size = history_size
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"created": 0, "hits": 0, "misses": 0, "expired": 0, "evictions": 0, "loaded": 0}
+
+    @property
+    def persistent(self) -> bool:
+        return self.pool is not None
+
+    def _insert(self, session: Session) -> None:
+        with self._lock:
+            self._sessions[session.token] = session
+            self._sessions.move_to_end(session.token)
+            self._drop_expired(time.time())
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _drop_expired(self, now: float) -> int:
+        """Drop expired sessions from memory; call with the lock held
+
+        Every lookup moves its session to the end and extends it by the TTL,
+        so the LRU is in expiry order and the expired ones are at the front.
+        """
+        dropped = 0
+        while self._sessions:
+            token, session = next(iter(self._sessions.items()))
+            if session.expires_at > now:
+                break
+            del self._sessions[token]
+            dropped += 1
+        self.counters["expired"] += dropped
+        return dropped
+
+    def create(self, user_id: int, profile: dict) -> Session:
+        """Open a session for a validated user"""
+        session = Session(secrets.token_urlsafe(24), user_id, profile, [], None,
+                          time.time() + self.ttl, self.history_size)
+        self._insert(session)
+        self.counters["created"] += 1
+        if self.persistent:
+            self._persist(session)
+            if self.counters["created"] % PURGE_EVERY == 0:
+                self.purge_expired()
+        return session
+
+    def get_cached(self, token: Optional[str]) -> Optional[Session]:
+        """In-memory lookup only; extends the session's expiry
+
+        Always a miss for a shared store, whose memory copy may be stale.
+        """
+        if not token or self.shared:
+            return None
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                self.counters["misses"] += 1
+                return None
+            if session.expires_at <= now:
+                del self._sessions[token]
+                self.counters["expired"] += 1
+                return None
+            self._sessions.move_to_end(token)
+            session.expires_at = now + self.ttl
+            self.counters["hits"] += 1
+            return session
+
+    def load(self, token: str) -> Optional[Session]:
+        """Read an unexpired session from the sessions table into memory"""
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute("""
+                    SELECT user_id, profile, history, pending FROM sessions
+                    WHERE token = ? AND expires_at > ?
+                """, (token, int(time.time()))).fetchone()
+        except Exception as e:
+            print(f"Session lookup failed: {e}")
+            return None
+        if row is None:
+            return None
+        session = Session(token, row[0], json.loads(row[1]), json.loads(row[2]), row[3],
+                          time.time() + self.ttl, self.history_size)
+        self._insert(session)
+        self.counters["loaded"] += 1
+        return session
+
+    def record(self, session: Session, intent: str, message: str) -> None:
+        """Append one turn to the session's history (in memory) and clear the pending intent"""
+        session.history.append([intent, message])
+        session.pending = None
+
+    def _persist(self, session: Session) -> None:
+        try:
+            with self.pool.writer() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO sessions (token, user_id, profile, history, pending, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (session.token, session.user_id, json.dumps(session.profile),
+                      json.dumps(list(session.history)), session.pending, int(session.expires_at)))
+                conn.commit()
+        except Exception as e:
+            print(f"Session write failed: {e}")
+
+    def save(self, session: Session) -> None:
+        """Write the session through to the sessions table (no-op in memory mode)"""
+        if self.persistent:
+            self._persist(session)
+
+    def purge_expired(self) -> int:
+        """Drop expired sessions from memory and the sessions table; returns how many"""
+        now = time.time()
+        with self._lock:
+            purged = self._drop_expired(now)
+        if self.persistent:
+            try:
+                with self.pool.writer() as conn:
+                    purged += conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (int(now),)).rowcount
+                    conn.commit()
+            except Exception as e:
+                print(f"Session purge failed: {e}")
+        return purged
+
+    def stats(self) -> dict:
+        return {"size": len(self._sessions), "persistent": self.persistent, **self.counters}
+
+
+_stores: Dict[str, SessionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_session_store(db_file: str) -> SessionStore:
+    """Return the process-wide session store for a database file"""
+    with _stores_lock:
+        store = _stores.get(db_file)
+        if store is None:
+            pool = get_pool(db_file) if SESSION_STORE == "sqlite" else None
+            store = _stores[db_file] = SessionStore(pool, shared=WORKERS > 1)
+        return store
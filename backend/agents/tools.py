@@ -2,142 +2,339 @@
 Custom Tools for Healthcare Agents
 """
 
-import sqlite3
-import os
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
 
-DB_FILE = os.environ.get("DB_FILE", "/app/data/user_data.db")
+from . import cgm_rollups, history, retention, traits
+from .db import DB_FILE, get_pool, retry_busy
+from .glucose_stats import get_glucose_stats
+from .metrics import DB_SECONDS, instrument
+from .profile_cache import PROFILE_COLUMNS, UserProfile, get_profile_cache
+
+def format_timestamp(value) -> str:
+    """Render an epoch timestamp as SQLite's CURRENT_TIMESTAMP text (UTC)"""
+    if isinstance(value, int):
+        return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return value
 
 class DatabaseTool:
     """Tool for database operations"""
     
-    def __init__(self):
-        self.db_file = DB_FILE
+    def __init__(self, db_file: Optional[str] = None):
+        self.db_file = db_file or DB_FILE
+        self.pool = get_pool(self.db_file)
+        self.glucose_stats = get_glucose_stats(self.db_file)
+        self.profiles = get_profile_cache(self.db_file)
+        self.traits = traits.get_trait_index(self.db_file)
+        self.archive = retention.LogArchive(self.pool)
     
+    @instrument(DB_SECONDS)
     def validate_user(self, user_id: int) -> dict:
         """Validate user ID and return user data"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        profile = self.profiles.get(user_id, self._load_profile)
+        if profile is None:
+            return {"valid": False}
+        return profile.to_dict()
+    
+    def _load_profile(self, user_id: int) -> Optional[UserProfile]:
+        with self.pool.connection() as conn:
+            result = conn.execute("""
+                SELECT first_name, last_name, city, diet_preference, 
+                       medical_conditions, physical_limitations 
+                FROM users WHERE user_id = ?
+            """, (user_id,)).fetchone()
         
-        cursor.execute("""
-            SELECT first_name, last_name, city, diet_preference, 
-                   medical_conditions, physical_limitations 
-            FROM users WHERE user_id = ?
-        """, (user_id,))
+        return UserProfile(user_id, *result) if result else None
+    
+    @instrument(DB_SECONDS)
+    @retry_busy
+    def update_user(self, user_id: int, **fields) -> dict:
+        """Update profile columns, re-index conditions/limitations and invalidate the cached profile"""
+        unknown = set(fields) - set(PROFILE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown profile fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return {"success": False, "message": "No profile fields to update"}
         
-        result = cursor.fetchone()
-        conn.close()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self.pool.writer() as conn:
+            updated = conn.execute(
+                f"UPDATE users SET {assignments} WHERE user_id = ?",
+                (*fields.values(), user_id)
+            ).rowcount
+            if updated:
+                row = conn.execute(
+                    "SELECT medical_conditions, physical_limitations FROM users WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                traits.sync_users(conn, [(user_id, *row)])
+            conn.commit()
+        self.profiles.invalidate(user_id)
         
-        if result:
-            return {
-                "valid": True,
-                "first_name": result[0],
-                "last_name": result[1],
-                "city": result[2],
-                "diet_preference": result[3],
-                "medical_conditions": result[4],
-                "physical_limitations": result[5]
-            }
-        return {"valid": False}
+        if not updated:
+            return {"success": False, "message": f"User {user_id} not found"}
+        self.traits.update(user_id, self.validate_user(user_id))
+        return {"success": True, "message": "Profile updated successfully"}
+    
+    @instrument(DB_SECONDS)
+    def find_users(self, after: int = 0, limit: Optional[int] = None, **labels) -> dict:
+        """Users matching every given diet, city, condition and limitation, by user_id"""
+        return self.traits.find(after, limit, **labels)
     
+    @instrument(DB_SECONDS)
+    def warm_profiles(self) -> int:
+        """Load every user profile into the cache"""
+        return self.profiles.warm(self.pool)
+    
+    @instrument(DB_SECONDS)
+    @retry_busy
     def log_mood(self, user_id: int, mood: str) -> dict:
         """Log user mood"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO mood_logs (user_id, mood) VALUES (?, ?)
-        """, (user_id, mood))
-        
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            conn.execute("""
+                INSERT INTO mood_logs (user_id, mood) VALUES (?, ?)
+            """, (user_id, mood))
+            conn.commit()
         
         return {"success": True, "message": f"Mood '{mood}' logged successfully"}
     
+    @instrument(DB_SECONDS)
     def log_cgm(self, user_id: int, glucose_reading: int) -> dict:
-        """Log CGM reading"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        # Validate range
-        if glucose_reading < 80 or glucose_reading > 300:
-            alert = "⚠️ ALERT: Glucose reading outside normal range (80-300 mg/dL)"
-        else:
-            alert = None
-        
-        cursor.execute("""
-            INSERT INTO cgm_logs (user_id, glucose_reading) VALUES (?, ?)
-        """, (user_id, glucose_reading))
-        
-        conn.commit()
-        conn.close()
+        """Log CGM reading and update the user's rolling statistics"""
+        timestamp = int(time.time())
+        log_id = self._insert_cgm(user_id, timestamp, glucose_reading)
+        alerts = self.glucose_stats.add_committed(log_id, user_id, timestamp, glucose_reading)
         
         return {
             "success": True, 
             "message": f"CGM reading {glucose_reading} mg/dL logged",
-            "alert": alert
+            "alert": "\n".join(alerts) if alerts else None,
+            "stats": self.glucose_stats.snapshot(user_id, timestamp)
         }
     
+    @retry_busy
+    def _insert_cgm(self, user_id: int, timestamp: int, glucose_reading: int) -> int:
+        with self.pool.writer() as conn:
+            log_id = conn.execute("""
+                INSERT INTO cgm_logs (user_id, timestamp, glucose_reading) VALUES (?, ?, ?)
+            """, (user_id, timestamp, glucose_reading)).lastrowid
+            cgm_rollups.apply_readings(conn, [(user_id, timestamp, glucose_reading)])
+            conn.commit()
+        return log_id
+    
+    def cgm_committed(self, rows: list) -> None:
+        """Fold readings committed by the CGM ingest queue into the statistics"""
+        if self.glucose_stats.syncing:
+            self.glucose_stats.sync(self.pool)
+        else:
+            self.glucose_stats.add_readings(rows)
+    
+    def sync_glucose_stats(self) -> None:
+        """Pick up readings other worker processes committed (no-op with one worker)"""
+        if self.glucose_stats.syncing:
+            self.glucose_stats.sync(self.pool)
+    
+    @instrument(DB_SECONDS)
+    @retry_busy
     def log_food(self, user_id: int, meal_description: str, nutrients: Optional[str] = None) -> dict:
         """Log food intake"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO food_logs (user_id, meal_description, nutrients) 
-            VALUES (?, ?, ?)
-        """, (user_id, meal_description, nutrients))
-        
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            conn.execute("""
+                INSERT INTO food_logs (user_id, meal_description, nutrients) 
+                VALUES (?, ?, ?)
+            """, (user_id, meal_description, nutrients))
+            conn.commit()
         
         return {"success": True, "message": "Food intake logged successfully"}
     
+    @instrument(DB_SECONDS)
     def get_mood_logs(self, user_id: int, limit: int = 7) -> list:
         """Get recent mood logs"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT timestamp, mood FROM mood_logs 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC LIMIT ?
-        """, (user_id, limit))
-        
-        results = cursor.fetchall()
-        conn.close()
+        with self.pool.connection() as conn:
+            results = conn.execute("""
+                SELECT timestamp, mood FROM mood_logs 
+                WHERE user_id = ? 
+                ORDER BY timestamp DESC, log_id DESC LIMIT ?
+            """, (user_id, limit)).fetchall()
         
-        return [{"timestamp": r[0], "mood": r[1]} for r in results]
+        return [{"timestamp": format_timestamp(r[0]), "mood": r[1]} for r in results]
     
+    @instrument(DB_SECONDS)
     def get_cgm_logs(self, user_id: int, limit: int = 7) -> list:
         """Get recent CGM logs"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        with self.pool.connection() as conn:
+            results = conn.execute("""
+                SELECT timestamp, glucose_reading FROM cgm_logs 
+                WHERE user_id = ? 
+                ORDER BY timestamp DESC, log_id DESC LIMIT ?
+            """, (user_id, limit)).fetchall()
         
-        cursor.execute("""
-            SELECT timestamp, glucose_reading FROM cgm_logs 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC LIMIT ?
-        """, (user_id, limit))
-        
-        results = cursor.fetchall()
-        conn.close()
+        return [{"timestamp": format_timestamp(r[0]), "glucose": r[1]} for r in results]
+    
+    @instrument(DB_SECONDS)
+    def get_cgm_history(self, user_id: int, start: int, end: int, resolution: str = "auto",
+                        max_points: int = cgm_rollups.HISTORY_MAX_POINTS) -> dict:
+        """CGM history between two epoch times, downsampled to hourly/daily rollups for long ranges"""
+        with self.pool.connection() as conn:
+            resolution, rows = cgm_rollups.history(conn, user_id, start, end, resolution, max_points)
+        if resolution == "raw":
+            # Rollups stay in the database; raw readings may have been archived
+            months = self.archive.months("cgm")
+            if months and start < retention.month_bounds(months[-1])[1]:
+                archived = [(r[2], r[3], r[0]) for r in self.archive.between("cgm", user_id, start, end, months)]
+                rows = sorted({r[2]: r for r in archived + rows}.values(), key=lambda r: (r[0], r[2]))
         
-        return [{"timestamp": r[0], "glucose": r[1]} for r in results]
+        if resolution == "raw":
+            points = [{"timestamp": format_timestamp(r[0]), "glucose": r[1]} for r in rows]
+        else:
+            points = [{
+                "timestamp": format_timestamp(r[0]),
+                "count": r[1],
+                "mean": round(r[2] / r[1], 1),
+                "min": r[3],
+                "max": r[4],
+                "time_in_range": round(r[5] / r[1], 3),
+            } for r in rows]
+        return {
+            "user_id": user_id,
+            "start": format_timestamp(start),
+            "end": format_timestamp(end),
+            "resolution": resolution,
+            "points": points,
+        }
     
+    @instrument(DB_SECONDS)
     def get_food_logs(self, user_id: int, limit: int = 7) -> list:
         """Get recent food logs"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        with self.pool.connection() as conn:
+            results = conn.execute("""
+                SELECT timestamp, meal_description, nutrients FROM food_logs 
+                WHERE user_id = ? 
+                ORDER BY timestamp DESC, log_id DESC LIMIT ?
+            """, (user_id, limit)).fetchall()
         
-        cursor.execute("""
-            SELECT timestamp, meal_description, nutrients FROM food_logs 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC LIMIT ?
-        """, (user_id, limit))
+        return [{"timestamp": format_timestamp(r[0]), "meal": r[1], "nutrients": r[2]} for r in results]
+    
+    @instrument(DB_SECONDS)
+    def get_log_page(self, kind: str, user_id: int, cursor: Optional[str] = None,
+                     limit: int = history.PAGE_SIZE) -> dict:
+        """One newest-first page of a user's mood, cgm or food logs and the cursor for the next"""
+        after = history.decode_cursor(cursor) if cursor else None
+        limit = max(1, min(limit, history.MAX_PAGE_SIZE))
+        params = [user_id, *(after or ()), limit + 1]
+        with self.pool.connection() as conn:
+            rows = conn.execute(history.page_query(kind, after), params).fetchall()
+        # Older rows may be archived; read after the log table so a concurrent move cannot skip one
+        months = self.archive.months(kind)
+        if months and (len(rows) <= limit or rows[limit][2] < retention.month_bounds(months[-1])[1]):
+            archived = self.archive.before(kind, user_id, after, limit + 1, months)
+            rows = history.merge_rows(rows, archived, limit + 1, newest_first=True)
         
-        results = cursor.fetchall()
-        conn.close()
+        names = history.fields(kind)
+        items = [dict(zip(names, (r[0], r[1], format_timestamp(r[2]), *r[3:]))) for r in rows[:limit]]
+        last = rows[limit - 1] if len(rows) > limit else None
+        return {
+            "items": items,
+            "next_cursor": history.encode_cursor(last[2], last[0]) if last else None,
+        }
+    
+    @instrument(DB_SECONDS)
+    def export_log_batch(self, kind: str, user_id: Optional[int] = None, after: Optional[tuple] = None,
+                         limit: int = history.EXPORT_BATCH_SIZE) -> tuple:
+        """Next export batch after a (timestamp, log_id) position
         
-        return [{"timestamp": r[0], "meal": r[1], "nutrients": r[2]} for r in results]
\ No newline at end of file
+        Returns the rows (timestamps rendered) and the position to continue
+        from, or None once the logs are exhausted. A whole-table export
+        continues into the archived months after the log table.
+        """
+        if after is not None and after[0] == retention.ARCHIVE:
+            rows, following = self.archive.export_batch(kind, after, limit)
+            # Rows an interrupted retention pass left in the log table were exported from there
+            with self.pool.connection() as conn:
+                hot = {r[0] for r in conn.execute(
+                    f"SELECT log_id FROM {history.log_kind(kind)[0]} WHERE log_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps([r[0] for r in rows]),))}
+            return [(r[0], r[1], format_timestamp(r[2]), *r[3:]) for r in rows if r[0] not in hot], following
+        
+        sql, params = history.export_query(kind, user_id, after)
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+        if user_id is not None:
+            months = self.archive.months(kind)
+            if months and (after is None or after[0] < retention.month_bounds(months[-1])[1]):
+                rows = history.merge_rows(rows, self.archive.after(kind, user_id, after, limit, months), limit)
+        
+        following = (rows[-1][2], rows[-1][0]) if len(rows) == limit else None
+        if following is None and user_id is None:
+            following = self.archive.export_start(kind)
+        return [(r[0], r[1], format_timestamp(r[2]), *r[3:]) for r in rows], following
+
+
+class AsyncDatabaseTool:
+    """Async facade over DatabaseTool that keeps SQLite off the event loop"""
+    
+    def __init__(self, db_tool: Optional[DatabaseTool] = None, max_workers: Optional[int] = None):
+        self.db_tool = db_tool or DatabaseTool()
+        # One worker per pooled connection so callers never queue twice
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or self.db_tool.pool.size,
+            thread_name_prefix="db"
+        )
+    
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+    
+    async def validate_user(self, user_id: int) -> dict:
+        return await self._run(self.db_tool.validate_user, user_id)
+    
+    async def log_mood(self, user_id: int, mood: str) -> dict:
+        return await self._run(self.db_tool.log_mood, user_id, mood)
+    
+    async def log_cgm(self, user_id: int, glucose_reading: int) -> dict:
+        return await self._run(self.db_tool.log_cgm, user_id, glucose_reading)
+    
+    async def log_food(self, user_id: int, meal_description: str, nutrients: Optional[str] = None) -> dict:
+        return await self._run(self.db_tool.log_food, user_id, meal_description, nutrients)
+    
+    async def get_mood_logs(self, user_id: int, limit: int = 7) -> list:
+        return await self._run(self.db_tool.get_mood_logs, user_id, limit)
+    
+    async def get_cgm_logs(self, user_id: int, limit: int = 7) -> list:
+        return await self._run(self.db_tool.get_cgm_logs, user_id, limit)
+    
+    async def get_food_logs(self, user_id: int, limit: int = 7) -> list:
+        return await self._run(self.db_tool.get_food_logs, user_id, limit)
+    
+    async def get_log_page(self, kind: str, user_id: int, cursor: Optional[str] = None,
+                           limit: int = history.PAGE_SIZE) -> dict:
+        return await self._run(self.db_tool.get_log_page, kind, user_id, cursor, limit)
+    
+    async def export_log_batch(self, kind: str, user_id: Optional[int] = None, after: Optional[tuple] = None,
+                               limit: int = history.EXPORT_BATCH_SIZE) -> tuple:
+        return await self._run(self.db_tool.export_log_batch, kind, user_id, after, limit)
+    
+    async def get_cgm_history(self, user_id: int, start: int, end: int, resolution: str = "auto",
+                              max_points: int = cgm_rollups.HISTORY_MAX_POINTS) -> dict:
+        return await self._run(self.db_tool.get_cgm_history, user_id, start, end, resolution, max_points)
+    
+    async def update_user(self, user_id: int, **fields) -> dict:
+        return await self._run(self.db_tool.update_user, user_id, **fields)
+    
+    async def find_users(self, after: int = 0, limit: Optional[int] = None, **labels) -> dict:
+        return await self._run(self.db_tool.find_users, after, limit, **labels)
+    
+    async def warm_profiles(self) -> int:
+        return await self._run(self.db_tool.warm_profiles)
+    
+    async def rebuild_glucose_stats(self) -> int:
+        return await self._run(self.db_tool.glucose_stats.rebuild, self.db_tool.pool)
+    
+    def shutdown(self) -> None:
+        """Stop the executor and close pooled connections"""
+        self.executor.shutdown(wait=True)
+        self.db_tool.pool.close()
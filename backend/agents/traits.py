@@ -0,0 +1,278 @@
+"""
+Normalized User Traits and Bitset Indexes
+
+``users.medical_conditions`` and ``users.physical_limitations`` hold
+comma-joined labels ("Type 2 Diabetes, Hypertension"), so finding the
+users with a condition meant a ``LIKE '%...%'`` scan of every row. Each
+label now also has a row in a lookup table (``conditions``,
+``limitations``; case-insensitive names) and each user a row per label
+in a junction table (``user_conditions``, ``user_limitations``), indexed
+both ways. The text columns stay the source of truth for profiles;
+every write that changes them re-derives the user's junction rows in
+the same transaction.
+
+``TraitIndex`` keeps one bitmap per diet, city, condition and limitation
+in memory, a Python int with bit ``user_id`` set for each member. A
+cohort such as "celiac vegans with swallowing difficulties" is the AND
+of three bitmaps, a handful of word operations per 64 users with no
+query at all. The index is loaded on first use, refreshed after
+``TRAIT_INDEX_TTL`` seconds (writes by other worker processes) and
+patched in place by profile writes in this process.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .db import ConnectionPool, get_pool
+
+TRAIT_INDEX_TTL = float(os.environ.get("TRAIT_INDEX_TTL", 300))
+TRAIT_BATCH_SIZE = 50000
+
+# dimension -> (users column, lookup table, lookup id column, junction table)
+TRAITS = {
+    "condition": ("medical_conditions", "conditions", "condition_id", "user_conditions"),
+    "limitation": ("physical_limitations", "limitations", "limitation_id", "user_limitations"),
+}
+# Single-valued profile columns indexed alongside
+COLUMNS = {"diet": "diet_preference", "city": "city"}
+DIMENSIONS = (*COLUMNS, *TRAITS)
+
+# (user_id, conditions text, limitations text)
+UserTraits = Tuple[int, Optional[str], Optional[str]]
+
+
+def trait_key(name: str) -> str:
+    """Case- and spacing-insensitive form of a label"""
+    return " ".join(name.split()).lower()
+
+
+def split_traits(value: Optional[str]) -> Tuple[str, ...]:
+    """Distinct labels of a comma-joined column, sorted; "None" means no labels"""
+    names: Dict[str, str] = {}
+    for item in (value or "").split(","):
+        name = " ".join(item.split())
+        if name and name.lower() != "none":
+            names.setdefault(name.lower(), name)
+    return tuple(names[key] for key in sorted(names))
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    for _, table, id_column, junction in TRAITS.values():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {id_column} INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE COLLATE NOCASE
+            )
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {junction} (
+                user_id INTEGER NOT NULL,
+                {id_column} INTEGER NOT NULL,
+                PRIMARY KEY (user_id, {id_column})
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{junction}_trait ON {junction} ({id_column}, user_id)")
+
+
+def _trait_ids(conn: sqlite3.Connection, table: str, id_column: str, names: Iterable[str]) -> Dict[str, int]:
+    """Lookup IDs by trait_key, adding labels not seen before"""
+    conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", [(name,) for name in names])
+    return {trait_key(name): trait_id for trait_id, name in conn.execute(f"SELECT {id_column}, name FROM {table}")}
+
+
+def index_users(conn: sqlite3.Connection, rows: Sequence[UserTraits]) -> None:
+    """Replace the junction rows of these users inside the caller's write transaction"""
+    for offset, (_, table, id_column, junction) in enumerate(TRAITS.values(), 1):
+        labels = {row[0]: split_traits(row[offset]) for row in rows}
+        ids = _trait_ids(conn, table, id_column, {name for names in labels.values() for name in names})
+        conn.executemany(f"DELETE FROM {junction} WHERE user_id = ?", [(user_id,) for user_id in labels])
+        conn.executemany(f"INSERT INTO {junction} (user_id, {id_column}) VALUES (?, ?)",
+                         [(user_id, ids[trait_key(name)]) for user_id, names in labels.items() for name in names])
+
+
+def sync_users(conn: sqlite3.Connection, rows: Sequence[UserTraits]) -> None:
+    """index_users for application writes
+
+    Skipped while the tables do not exist yet: the migration that creates
+    them re-derives every user from the text columns.
+    """
+    try:
+        index_users(conn, rows)
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+
+
+def backfill(conn: sqlite3.Connection, after_user_id: int = 0, limit: int = TRAIT_BATCH_SIZE) -> Optional[int]:
+    """Index the next batch of users after after_user_id; returns the last one, None when done"""
+    columns = ", ".join(column for column, *_ in TRAITS.values())
+    rows = conn.execute(f"""
+        SELECT user_id, {columns} FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?
+    """, (after_user_id, limit)).fetchall()
+    index_users(conn, rows)
+    return rows[-1][0] if rows else None
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """Re-derive every junction row, e.g. after a bulk load of users"""
+    for *_, junction in TRAITS.values():
+        conn.execute(f"DELETE FROM {junction}")
+    last = 0
+    while last is not None:
+        last = backfill(conn, last)
+
+
+def to_bitmap(user_ids) -> int:
+    import numpy as np
+
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    if not len(user_ids):
+        return 0
+    bits = np.zeros(int(user_ids.max()) + 1, dtype=bool)
+    bits[user_ids] = True
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def from_bitmap(bitmap: int, after: int = -1, limit: Optional[int] = None) -> List[int]:
+    """Set bits of a bitmap above ``after``, ascending, at most ``limit`` of them
+
+    With a limit, bits are unpacked in growing windows from ``after`` on and
+    the scan stops once enough are found, so a page costs about ``limit``
+    set bits instead of the whole bitmap.
+    """
+    import numpy as np
+
+    if not bitmap:
+        return []
+    raw = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    first = max(after + 1, 0) // 8
+    if limit is None:
+        user_ids = np.flatnonzero(np.unpackbits(raw[first:], bitorder="little")) + first * 8
+        return user_ids[user_ids > after].tolist()
+    user_ids: List[int] = []
+    window = 512
+    while first < len(raw) and len(user_ids) < limit:
+        found = np.flatnonzero(np.unpackbits(raw[first:first + window], bitorder="little")) + first * 8
+        user_ids.extend(found[found > after][:limit - len(user_ids)].tolist())
+        first += window
+        window *= 2
+    return user_ids
+
+
+class TraitIndex:
+    """Per-label bitmaps of user IDs for diets, cities, conditions and limitations"""
+
+    def __init__(self, pool: ConnectionPool, ttl: float = TRAIT_INDEX_TTL):
+        self.pool = pool
+        self.ttl = ttl
+        self._everyone = 0
+        # dimension -> trait_key -> bitmap
+        self._bitmaps: Dict[str, Dict[str, int]] = {}
+        self._names: Dict[str, Dict[str, str]] = {}
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"loads": 0, "queries": 0, "updates": 0}
+
+    def _load(self) -> None:
+        bitmaps: Dict[str, Dict[str, int]] = {}
+        names: Dict[str, Dict[str, str]] = {}
+        members: Dict[str, Dict[str, list]] = {dimension: {} for dimension in COLUMNS}
+        everyone = []
+        with self.pool.connection() as conn:
+            cursor = conn.execute(f"SELECT user_id, {', '.join(COLUMNS.values())} FROM users")
+            while True:
+                rows = cursor.fetchmany(TRAIT_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    everyone.append(row[0])
+                    for offset, dimension in enumerate(COLUMNS, 1):
+                        members[dimension].setdefault(row[offset], []).append(row[0])
+            for dimension, (_, table, id_column, junction) in TRAITS.items():
+                bitmaps[dimension], names[dimension] = {}, {}
+                for trait_id, name in conn.execute(f"SELECT {id_column}, name FROM {table}").fetchall():
+                    user_ids = [row[0] for row in conn.execute(
+                        f"SELECT user_id FROM {junction} WHERE {id_column} = ?", (trait_id,))]
+                    bitmaps[dimension][trait_key(name)] = to_bitmap(user_ids)
+                    names[dimension][trait_key(name)] = name
+        for dimension, groups in members.items():
+            bitmaps[dimension], names[dimension] = {}, {}
+            for label, user_ids in groups.items():
+                key = trait_key(label)
+                bitmaps[dimension][key] = bitmaps[dimension].get(key, 0) | to_bitmap(user_ids)
+                names[dimension].setdefault(key, label)
+        self._everyone = to_bitmap(everyone)
+        self._bitmaps, self._names = bitmaps, names
+        self._expires = time.monotonic() + self.ttl
+        self.counters["loads"] += 1
+
+    def _current(self) -> None:
+        if self._expires <= time.monotonic():
+            self._load()
+
+    def select(self, **labels) -> int:
+        """Bitmap of the users having every given label
+
+        Keyword per dimension, a label or a list of labels that must all
+        apply, e.g. ``select(diet="vegan", condition=["Celiac Disease"])``.
+        """
+        unknown = [dimension for dimension in labels if dimension not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension {unknown[0]!r}; expected one of {', '.join(DIMENSIONS)}")
+        with self._lock:
+            self._current()
+            self.counters["queries"] += 1
+            bitmap = self._everyone
+            for dimension, wanted in labels.items():
+                for label in [wanted] if isinstance(wanted, str) else wanted:
+                    bitmap &= self._bitmaps[dimension].get(trait_key(label), 0)
+            return bitmap
+
+    def find(self, after: int = 0, limit: Optional[int] = None, **labels) -> dict:
+        """Matching user count, then up to limit matching IDs above after and where the next page starts"""
+        bitmap = self.select(**labels)
+        user_ids = from_bitmap(bitmap, after, None if limit is None else limit + 1)
+        more = limit is not None and len(user_ids) > limit
+        if more:
+            user_ids = user_ids[:limit]
+        return {"count": bitmap.bit_count(), "user_ids": user_ids, "next_after": user_ids[-1] if more else None}
+
+    def update(self, user_id: int, profile: dict) -> None:
+        """Move a user to the bitmaps of their new profile (validate_user dict); no-op before the first load"""
+        with self._lock:
+            if not self._bitmaps:
+                return
+            bit = 1 << user_id
+            current = {dimension: {trait_key(profile[column]): profile[column]}
+                       for dimension, column in COLUMNS.items()}
+            for dimension, (column, *_) in TRAITS.items():
+                current[dimension] = {trait_key(name): name for name in split_traits(profile[column])}
+            for dimension, labels in current.items():
+                bitmaps, names = self._bitmaps[dimension], self._names[dimension]
+                for key in set(bitmaps) | labels.keys():
+                    bitmaps[key] = bitmaps.get(key, 0) & ~bit | (bit if key in labels else 0)
+                for key, name in labels.items():
+                    names.setdefault(key, name)
+            self._everyone |= bit
+            self.counters["updates"] += 1
+
+    def stats(self) -> dict:
+        return {"users": self._everyone.bit_count(),
+                "bitmaps": sum(len(bitmaps) for bitmaps in self._bitmaps.values()), **self.counters}
+
+
+_indexes: Dict[str, TraitIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_trait_index(db_file: Optional[str] = None) -> TraitIndex:
+    """Return the process-wide trait index for a database file"""
+    pool = get_pool(db_file)
+    with _indexes_lock:
+        index = _indexes.get(pool.db_file)
+        if index is None:
+            index = _indexes[pool.db_file] = TraitIndex(pool)
+        return index
@@ -0,0 +1,5 @@
+"""
+Backend Benchmarks
+
+Run from the backend directory, e.g. ``python -m benchmarks.bench_db_pool``.
+"""
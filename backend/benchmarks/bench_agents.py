@@ -0,0 +1,106 @@
+"""
+Benchmark: per-request agent construction vs the agent registry
+
+Times getting each agent ready to run (tool schemas parsed, model
+client open) by calling its ``get_*_agent()`` factory, what a
+per-request design pays, against borrowing a prebuilt instance from the
+registry, and measures the memory allocated per request. A concurrent
+phase then checks the registry never hands one instance to two threads
+at once and that every borrower sees its own user context; it exits 1
+on a violation.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+
+from agents.registry import AGENT_FACTORIES, AgentRegistry, prepare_agent
+
+
+def per_request(name: str, iterations: int) -> float:
+    factory = AGENT_FACTORIES[name]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        prepare_agent(factory())
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def reuse(registry: AgentRegistry, name: str, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        with registry.agent(name, user_id=i) as agent:
+            # Per-run work agno repeats on every run either way
+            agent.update_model()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def allocated_kb(fn) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0) / 1024
+
+
+def concurrent_check(registry: AgentRegistry, threads: int, iterations: int) -> int:
+    in_use = set()
+    lock = threading.Lock()
+    violations = []
+
+    def worker(worker_id: int):
+        for i in range(iterations):
+            user_id = worker_id * iterations + i + 1
+            name = list(AGENT_FACTORIES)[i % len(AGENT_FACTORIES)]
+            with registry.agent(name, user_id=user_id) as agent:
+                with lock:
+                    if id(agent) in in_use:
+                        violations.append(f"{name} instance shared between threads")
+                    in_use.add(id(agent))
+                time.sleep(0)
+                if agent.context["user_id"] != user_id:
+                    violations.append(f"{name} saw user {agent.context['user_id']}, expected {user_id}")
+                with lock:
+                    in_use.discard(id(agent))
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    for violation in violations[:5]:
+        print(f"VIOLATION: {violation}")
+    return len(violations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    registry = AgentRegistry()
+    registry.warm()
+    print(f"{'agent':<14}{'construct µs':>14}{'reuse µs':>10}{'speedup':>9}{'alloc KB':>10}{'reuse KB':>10}")
+    for name in AGENT_FACTORIES:
+        per_request(name, 5)
+        built = per_request(name, args.iterations)
+        reused = reuse(registry, name, args.iterations)
+        built_kb = allocated_kb(lambda: prepare_agent(AGENT_FACTORIES[name]()))
+        reused_kb = allocated_kb(lambda: reuse(registry, name, 1))
+        print(f"{name:<14}{built:>14.1f}{reused:>10.1f}{built / reused:>8.0f}x{built_kb:>10.1f}{reused_kb:>10.1f}")
+
+    violations = concurrent_check(registry, args.threads, args.iterations)
+    print(f"concurrent     : {args.threads} threads x {args.iterations} checkouts, "
+          f"instances built {sum(registry.stats().values())}, violations {violations}")
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark: vectorized cohort reports vs a per-user loop
+
+Generates a population (1M users by default, one day of logs each) and
+builds three reports: CGM time in range by city, diet and condition,
+mood distribution of Type 2 Diabetes users and food macros by diet.
+Times ``PopulationAnalytics`` cold (column scans included) and warm
+(cached per-user totals, regrouped), against the loop the agents use
+today: per user, read the profile and the user's logs and fold them into
+dicts. The loop runs over ``--loop-users`` users and is extrapolated to
+the population. Both are first run over a small population and must
+produce identical reports; exits 1 if they do not.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+REPORTS = [("cgm", ["city", "diet", "condition"], {}),
+           ("mood", [], {"condition": "Type 2 Diabetes"}),
+           ("food", ["diet"], {})]
+
+
+def loop_reports(tool, user_ids, since: int) -> dict:
+    """The three reports built one user at a time"""
+    from agents.analytics import summarize
+    from agents.glucose_stats import RANGE_HIGH, RANGE_LOW
+    from agents.nutrition import parse_nutrients
+
+    cgm = defaultdict(lambda: defaultdict(float))
+    moods = defaultdict(float)
+    food = defaultdict(lambda: defaultdict(float))
+    for user_id in user_ids:
+        profile = tool.validate_user(user_id)
+        conditions = [c.strip() for c in (profile["medical_conditions"] or "None").split(",")]
+        with tool.pool.connection() as conn:
+            readings = conn.execute("SELECT glucose_reading FROM cgm_logs WHERE user_id = ? AND timestamp >= ?",
+                                    (user_id, since)).fetchall()
+            mood_rows = conn.execute("SELECT mood FROM mood_logs WHERE user_id = ? AND timestamp >= ?",
+                                     (user_id, since)).fetchall() if "Type 2 Diabetes" in conditions else []
+            meals = conn.execute("SELECT nutrients FROM food_logs WHERE user_id = ? AND timestamp >= ?",
+                                 (user_id, since)).fetchall()
+        for condition in conditions:
+            sums = cgm[(profile["city"], profile["diet_preference"], condition)]
+            sums["users"] += 1
+            sums["active"] += bool(readings)
+            for (glucose,) in readings:
+                sums["readings"] += 1
+                sums["total"] += glucose
+                sums["in_range"] += RANGE_LOW <= glucose <= RANGE_HIGH
+        if "Type 2 Diabetes" in conditions:
+            moods["users"] += 1
+            moods["active"] += bool(mood_rows)
+            for (mood,) in mood_rows:
+                moods["logged"] += 1
+                moods[f"mood:{mood.strip().lower()}"] += 1
+        sums = food[profile["diet_preference"]]
+        sums["users"] += 1
+        sums["active"] += bool(meals)
+        for (nutrients,) in meals:
+            sums["meals"] += 1
+            macros = parse_nutrients(nutrients)
+            if macros:
+                sums["parsed"] += 1
+                for name, value in zip(("carbs", "protein", "fat"), macros):
+                    sums[name] += value
+    return {
+        "cgm": sorted(tuple({"city": k[0], "diet": k[1], "condition": k[2], **summarize("cgm", int(v["users"]), v)}
+                            .items()) for k, v in cgm.items()),
+        "mood": [summarize("mood", int(moods["users"]), moods)] if moods else [],
+        "food": sorted(tuple({"diet": k, **summarize("food", int(v["users"]), v)}.items()) for k, v in food.items()),
+    }
+
+
+def vectorized_reports(engine, days: int) -> dict:
+    reports = {metric: engine.report(metric, by, filters, days)["groups"] for metric, by, filters in REPORTS}
+    reports["cgm"] = sorted(tuple(group.items()) for group in reports["cgm"])
+    reports["food"] = sorted(tuple(group.items()) for group in reports["food"])
+    return reports
+
+
+def build(db_file: str, users: int, workers: int):
+    from data_generator import generate_synthetic_data
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_synthetic_data(db_file, num_users=users, days=1, readings_per_day=4, workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--loop-users", type=int, default=20000, help="users the per-user loop runs over")
+    parser.add_argument("--check-users", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="data generator processes")
+    args = parser.parse_args()
+    days = 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from agents.analytics import PopulationAnalytics, window_start
+        from agents.db import get_pool
+        from agents.tools import DatabaseTool
+
+        check_db = os.path.join(tmp, "check.db")
+        build(check_db, args.check_users, 1)
+        since = window_start(days)
+        identical = (loop_reports(DatabaseTool(check_db), range(1, args.check_users + 1), since)
+                     == vectorized_reports(PopulationAnalytics(get_pool(check_db)), days))
+
+        db_file = os.path.join(tmp, "analytics.db")
+        start = time.perf_counter()
+        build(db_file, args.users, args.workers)
+        print(f"generated {args.users:,} users in {time.perf_counter() - start:.0f}s")
+
+        engine = PopulationAnalytics(get_pool(db_file))
+        start = time.perf_counter()
+        vectorized_reports(engine, days)
+        cold_s = time.perf_counter() - start
+        start = time.perf_counter()
+        vectorized_reports(engine, days)
+        warm_s = time.perf_counter() - start
+
+        sample = min(args.loop_users, args.users)
+        tool = DatabaseTool(db_file)
+        start = time.perf_counter()
+        loop_reports(tool, range(1, sample + 1), window_start(days))
+        loop_s = (time.perf_counter() - start) * args.users / sample
+
+    print(f"per-user loop         : {loop_s:8.2f} s"
+          f"{f'  (extrapolated from {sample:,} users)' if sample < args.users else ''}")
+    print(f"vectorized, cold      : {cold_s:8.2f} s  {loop_s / cold_s:6.1f}x")
+    print(f"vectorized, cached    : {warm_s:8.3f} s  {loop_s / warm_s:6.0f}x")
+    print(f"identical reports on {args.check_users:,} users: {'yes' if identical else 'NO'}")
+    if not identical:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
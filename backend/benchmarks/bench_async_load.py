@@ -0,0 +1,139 @@
+"""
+Load test: /agno latency vs concurrent clients
+
+Drives the FastAPI app in-process (one event loop, like a single uvicorn
+worker) with a growing number of concurrent clients. Each client sends a
+mix of CGM writes and general questions; writes carry an artificial
+stall (``--write-delay-ms``) standing in for a slow fsync. The run is
+repeated with the database calls executed inline on the event loop
+(the old behaviour) and through AsyncDatabaseTool, reporting p50/p99 per
+concurrency level, plus event-loop lag measured by a 1ms heartbeat task
+(in-process clients cannot observe a blocked loop from their own timers).
+With the executor, loop lag and p99 for requests that never touch the
+database stay flat regardless of how many writes are in flight.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from data_generator import NUM_USERS, generate_synthetic_data
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_slow_tool(db_file: str, delay: float):
+    from agents.tools import DatabaseTool
+
+    class SlowWriteDatabaseTool(DatabaseTool):
+        def log_cgm(self, user_id: int, glucose_reading: int) -> dict:
+            time.sleep(delay)
+            return super().log_cgm(user_id, glucose_reading)
+
+    return SlowWriteDatabaseTool(db_file)
+
+
+class InlineDatabaseTool:
+    """Awaitable wrapper that runs DatabaseTool calls on the event loop"""
+
+    def __init__(self, db_tool):
+        self.db_tool = db_tool
+
+    def __getattr__(self, name):
+        func = getattr(self.db_tool, name)
+
+        async def call(*args, **kwargs):
+            return func(*args, **kwargs)
+
+        return call
+
+    def shutdown(self) -> None:
+        pass
+
+
+async def client(http: httpx.AsyncClient, requests: int, rng: random.Random, samples: dict):
+    for _ in range(requests):
+        user_id = rng.randint(1, NUM_USERS)
+        if rng.random() < 0.5:
+            kind, body = "write", {"message": f"glucose reading {rng.randint(60, 280)}", "user_id": user_id}
+        else:
+            kind, body = "no_db", {"message": "what can you do?"}
+        start = time.perf_counter()
+        response = await http.post("/agno", json=body)
+        response.raise_for_status()
+        samples[kind].append((time.perf_counter() - start) * 1000)
+
+
+async def heartbeat(stop: asyncio.Event, samples: dict, interval: float = 0.001):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples["loop_lag"].append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run_level(app, clients: int, requests: int) -> dict:
+    samples = {"write": [], "no_db": [], "loop_lag": []}
+    stop = asyncio.Event()
+    probe = asyncio.create_task(heartbeat(stop, samples))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await asyncio.gather(*[
+            client(http, requests, random.Random(seed), samples) for seed in range(clients)
+        ])
+    stop.set()
+    await probe
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--write-delay-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "load.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(db_file)
+        os.environ["DB_FILE"] = db_file
+
+        import main as backend
+        from agents.tools import AsyncDatabaseTool
+
+        slow_tool = make_slow_tool(db_file, args.write_delay_ms / 1000)
+        modes = {
+            "inline": InlineDatabaseTool(slow_tool),
+            "executor": AsyncDatabaseTool(slow_tool),
+        }
+
+        print(f"{'mode':<9} {'clients':>7} {'req/s':>8} "
+              f"{'write p50':>10} {'write p99':>10} {'no-db p50':>10} {'no-db p99':>10} {'lag p99':>10}")
+        for mode, tool in modes.items():
+            backend.async_db = tool
+            for clients in [int(level) for level in args.levels.split(",")]:
+                start = time.perf_counter()
+                samples = asyncio.run(run_level(backend.app, clients, args.requests))
+                elapsed = time.perf_counter() - start
+                total = len(samples["write"]) + len(samples["no_db"])
+                print(f"{mode:<9} {clients:>7} {total / elapsed:>8.0f} "
+                      f"{statistics.median(samples['write']):>8.2f}ms {percentile(samples['write'], 99):>8.2f}ms "
+                      f"{statistics.median(samples['no_db']):>8.2f}ms {percentile(samples['no_db'], 99):>8.2f}ms "
+                      f"{percentile(samples['loop_lag'], 99):>8.2f}ms")
+            tool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
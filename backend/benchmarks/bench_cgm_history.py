@@ -0,0 +1,127 @@
+"""
+Benchmark: CGM history queries, raw readings vs hourly/daily rollups
+
+Generates months of 5-minute CGM readings and times
+``DatabaseTool.get_cgm_history`` over growing ranges with
+``resolution=raw`` (every reading, what a chart had to read before) and
+``resolution=auto`` (rollups for long ranges), reporting rows read and
+latency. Also checks the rollups stay exact: after single readings,
+ingest-queue batches and a from-scratch migration backfill, every
+bucket must equal the aggregate recomputed from cgm_logs; exits 1 if not.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+RANGES = [("1 day", 1), ("7 days", 7), ("30 days", 30), ("90 days", 90), ("180 days", 180)]
+
+
+def timed_ms(fn, repeat: int) -> tuple:
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def rollups_match(pool) -> bool:
+    """Every stored bucket equals the aggregate recomputed from cgm_logs"""
+    from agents import cgm_rollups
+
+    with pool.connection() as conn:
+        stored = set(conn.execute("SELECT * FROM cgm_rollups").fetchall())
+        conn.execute("CREATE TEMP TABLE expected AS SELECT * FROM cgm_rollups WHERE 0")
+        try:
+            conn.execute(f"""
+                INSERT INTO expected
+                SELECT user_id, span, timestamp - timestamp % span, COUNT(*), SUM(glucose_reading),
+                       MIN(glucose_reading), MAX(glucose_reading),
+                       SUM(glucose_reading BETWEEN {cgm_rollups.RANGE_LOW} AND {cgm_rollups.RANGE_HIGH})
+                FROM cgm_logs, (SELECT {cgm_rollups.SPANS['hour']} AS span
+                                UNION ALL SELECT {cgm_rollups.SPANS['day']})
+                GROUP BY user_id, span, timestamp - timestamp % span
+            """)
+            expected = set(conn.execute("SELECT * FROM expected").fetchall())
+        finally:
+            conn.execute("DROP TABLE expected")
+            conn.commit()
+    return stored == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--readings-per-day", type=int, default=288)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "history.db")
+        os.environ["DB_FILE"] = db_file
+        from data_generator import generate_synthetic_data
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(db_file, num_users=args.users, days=args.days,
+                                    readings_per_day=args.readings_per_day, moods_per_day=0, meals_per_day=0)
+        print(f"generated {args.users * args.days * args.readings_per_day:,} readings "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        from agents import migrations
+        from agents.db import get_pool
+        from agents.ingest import CGMIngestQueue
+        from agents.tools import DatabaseTool
+
+        tool = DatabaseTool(db_file)
+        pool = tool.pool
+        with pool.connection() as conn:
+            end = conn.execute("SELECT MAX(timestamp) FROM cgm_logs").fetchone()[0] + 1
+
+        print(f"{'range':<10}{'raw rows':>10}{'raw ms':>10}{'resolution':>12}{'rows':>7}{'ms':>9}{'speedup':>9}")
+        for label, days in RANGES:
+            if days > args.days:
+                continue
+            begin = end - days * 86400
+            raw, raw_ms = timed_ms(lambda: tool.get_cgm_history(1, begin, end, "raw"), args.repeat)
+            auto, auto_ms = timed_ms(lambda: tool.get_cgm_history(1, begin, end), args.repeat)
+            print(f"{label:<10}{len(raw['points']):>10,}{raw_ms:>10.2f}{auto['resolution']:>12}"
+                  f"{len(auto['points']):>7,}{auto_ms:>9.2f}{raw_ms / auto_ms:>8.1f}x")
+
+        checks = {"after bulk load": rollups_match(pool)}
+
+        rng = random.Random(3)
+        for _ in range(200):
+            tool.log_cgm(rng.randint(1, args.users), rng.randint(40, 350))
+        checks["after log_cgm"] = rollups_match(pool)
+
+        queue = CGMIngestQueue(pool)
+        queue.start()
+        for _ in range(20):
+            queue.submit([(rng.randint(1, args.users), end - rng.randint(0, args.days * 86400), rng.randint(40, 350))
+                          for _ in range(500)]).result()
+        queue.stop()
+        checks["after ingest queue"] = rollups_match(pool)
+
+        with pool.writer() as conn:
+            conn.execute("DROP TABLE cgm_rollups")
+            conn.execute("PRAGMA user_version = 4")
+            conn.commit()
+        start = time.perf_counter()
+        migrations.migrate(db_file)
+        backfill_s = time.perf_counter() - start
+        checks[f"after migration backfill ({backfill_s:.1f}s)"] = rollups_match(get_pool(db_file))
+        pool.close()
+
+    for label, ok in checks.items():
+        print(f"rollups exact {label:<36}: {'yes' if ok else 'NO'}")
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
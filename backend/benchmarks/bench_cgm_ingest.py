@@ -0,0 +1,115 @@
+"""
+Benchmark: CGM ingestion throughput
+
+Compares one-INSERT-per-commit logging (DatabaseTool.log_cgm) with the
+group-commit ingest queue, both driven directly from producer threads
+and end-to-end through ``POST /cgm/batch`` (including request parsing
+and validation). Reports readings/sec and transactions used.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+
+import httpx
+
+from data_generator import NUM_USERS, generate_synthetic_data
+
+
+def make_readings(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    now = int(time.time())
+    return [(rng.randint(1, NUM_USERS), now - i * 60, rng.randint(60, 280)) for i in range(count)]
+
+
+def bench_single(db_file: str, count: int) -> float:
+    from agents.tools import DatabaseTool
+
+    tool = DatabaseTool(db_file)
+    start = time.perf_counter()
+    for user_id, _, glucose in make_readings(count, 1):
+        tool.log_cgm(user_id, glucose)
+    return count / (time.perf_counter() - start)
+
+
+def bench_queue(db_file: str, producers: int, batches: int, batch_size: int) -> tuple:
+    from agents.db import get_pool
+    from agents.ingest import CGMIngestQueue
+
+    queue = CGMIngestQueue(get_pool(db_file))
+    queue.start()
+
+    def produce(seed: int):
+        futures = [queue.submit(make_readings(batch_size, seed * 1000 + b)) for b in range(batches)]
+        for future in futures:
+            future.result()
+
+    threads = [threading.Thread(target=produce, args=(p,)) for p in range(producers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    queue.stop()
+    return producers * batches * batch_size / elapsed, queue.stats["transactions"]
+
+
+async def bench_http(db_file: str, clients: int, batches: int, batch_size: int) -> tuple:
+    import main as backend
+    from agents.db import get_pool
+    from agents.ingest import CGMIngestQueue
+
+    backend.cgm_ingest = CGMIngestQueue(get_pool(db_file))
+    backend.cgm_ingest.start()
+    payloads = [
+        [{"user_id": u, "timestamp": ts, "glucose": g} for u, ts, g in make_readings(batch_size, b)]
+        for b in range(batches)
+    ]
+
+    async def client(http: httpx.AsyncClient):
+        for payload in payloads:
+            response = await http.post("/cgm/batch", json=payload)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        start = time.perf_counter()
+        await asyncio.gather(*[client(http) for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+    await asyncio.to_thread(backend.cgm_ingest.stop)
+    return clients * batches * batch_size / elapsed, backend.cgm_ingest.stats["transactions"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--single", type=int, default=5000, help="readings for the per-row baseline")
+    parser.add_argument("--producers", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {name: os.path.join(tmp, f"{name}.db") for name in ("single", "queue", "http")}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for path in paths.values():
+                generate_synthetic_data(path)
+
+        single = bench_single(paths["single"], args.single)
+        queued, queue_txns = bench_queue(paths["queue"], args.producers, args.batches, args.batch_size)
+        http, http_txns = asyncio.run(bench_http(paths["http"], args.producers, args.batches, args.batch_size))
+
+    total = args.producers * args.batches
+    print(f"log_cgm per reading : {single:10.0f} readings/sec")
+    print(f"ingest queue        : {queued:10.0f} readings/sec ({total} submissions, {queue_txns} transactions)")
+    print(f"POST /cgm/batch     : {http:10.0f} readings/sec ({total} requests, {http_txns} transactions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: connect-per-call vs pooled DatabaseTool
+
+Replays a chat-turn style mix (validate user, log a CGM reading, read
+recent readings) against a freshly generated database and reports ops/sec
+for the original open/close-per-call access pattern and for the pooled
+connection layer.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from data_generator import NUM_USERS, generate_synthetic_data
+from agents.tools import DatabaseTool
+
+
+class ConnectPerCallTool:
+    """Baseline reproducing the original one-connection-per-call access"""
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+
+    def validate_user(self, user_id: int) -> bool:
+        conn = sqlite3.connect(self.db_file)
+        row = conn.execute(
+            "SELECT first_name FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        conn.close()
+        return row is not None
+
+    def log_cgm(self, user_id: int, glucose_reading: int) -> None:
+        conn = sqlite3.connect(self.db_file)
+        conn.execute(
+            "INSERT INTO cgm_logs (user_id, glucose_reading) VALUES (?, ?)",
+            (user_id, glucose_reading)
+        )
+        conn.commit()
+        conn.close()
+
+    def get_cgm_logs(self, user_id: int, limit: int = 7) -> list:
+        conn = sqlite3.connect(self.db_file)
+        rows = conn.execute(
+            "SELECT timestamp, glucose_reading FROM cgm_logs "
+            "WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+        conn.close()
+        return rows
+
+
+def run_mix(tool, iterations: int, seed: int = 7) -> float:
+    """Run the workload mix and return operations per second"""
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        user_id = rng.randint(1, NUM_USERS)
+        tool.validate_user(user_id)
+        tool.log_cgm(user_id, rng.randint(70, 250))
+        tool.get_cgm_logs(user_id, limit=7)
+    elapsed = time.perf_counter() - start
+    return iterations * 3 / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_db = os.path.join(tmp, "baseline.db")
+        pooled_db = os.path.join(tmp, "pooled.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(baseline_db)
+            generate_synthetic_data(pooled_db)
+
+        before = run_mix(ConnectPerCallTool(baseline_db), args.iterations)
+        pooled = DatabaseTool(pooled_db)
+        after = run_mix(pooled, args.iterations)
+        pooled.pool.close()
+
+    print(f"connect-per-call : {before:10.0f} ops/sec")
+    print(f"pooled           : {after:10.0f} ops/sec")
+    print(f"speedup          : {after / before:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
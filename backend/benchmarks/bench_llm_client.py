@@ -0,0 +1,84 @@
+"""
+Benchmark: per-call OpenAI clients vs the shared LLM client
+
+Runs against the local mock LLM server. Compares the old pattern
+(construct ``OpenAI(...)`` inside every tool call) with the shared
+LLMClient for sequential calls, then fires a burst of concurrent
+requests where many are identical to show coalescing and the
+concurrency limit.
+"""
+
+import argparse
+import asyncio
+import time
+
+import openai
+
+from agents.llm_client import LLMClient
+from benchmarks.mock_llm_server import start_in_thread
+
+NUTRIENT_MESSAGES = [
+    {"role": "system", "content": "You are a nutrition expert. Analyze the meal and estimate macronutrients."},
+    {"role": "user", "content": "Analyze this meal: oatmeal with berries and coffee"},
+]
+
+
+def per_call_client(base_url: str, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        client = openai.OpenAI(api_key="mock", base_url=base_url)
+        client.chat.completions.create(model="mock", messages=NUTRIENT_MESSAGES, max_tokens=50)
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def shared_client(client: LLMClient, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        client.complete_sync(NUTRIENT_MESSAGES, max_tokens=50, coalesce=False)
+    return (time.perf_counter() - start) / calls * 1000
+
+
+async def burst(client: LLMClient, requests: int, distinct: int) -> float:
+    meals = [f"meal variant {i % distinct}" for i in range(requests)]
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client.complete([NUTRIENT_MESSAGES[0], {"role": "user", "content": f"Analyze this meal: {meal}"}],
+                        max_tokens=50)
+        for meal in meals
+    ])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=20)
+    args = parser.parse_args()
+
+    server = start_in_thread(args.port, args.latency_ms)
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+    client = LLMClient(base_url=base_url, api_key="mock", max_concurrency=16)
+    try:
+        per_call_client(base_url, 5)
+        shared_client(client, 5)
+        before = per_call_client(base_url, args.calls)
+        after = shared_client(client, args.calls)
+        print(f"mock latency         : {args.latency_ms:.0f} ms")
+        print(f"new client per call  : {before:7.2f} ms/call ({before - args.latency_ms:6.2f} ms overhead)")
+        print(f"shared client        : {after:7.2f} ms/call ({after - args.latency_ms:6.2f} ms overhead)")
+
+        calls_before = client.stats["upstream_calls"]
+        elapsed = asyncio.run(burst(client, args.burst, args.distinct))
+        upstream = client.stats["upstream_calls"] - calls_before
+        print(f"burst                : {args.burst} requests ({args.distinct} distinct) in {elapsed * 1000:.0f} ms, "
+              f"{upstream} upstream calls, {client.stats['coalesced']} coalesced")
+    finally:
+        client.close()
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Load test: realistic conversation mixes against a served backend
+
+Starts the mock OpenAI-compatible LLM server and the FastAPI app (uvicorn,
+one worker) as subprocesses over a database generated by
+``data_generator.py``, then replays conversations at each concurrency
+level: every conversation greets with a user ID and continues with turns
+drawn from a weighted mix of mood, CGM, food, meal-plan and streamed
+meal-plan messages. Reports throughput, p50/p95/p99 latency per turn
+kind (time to first token for streams) and the server-side DB, LLM and
+per-stage time taken from ``/metrics``. ``--json`` writes the results
+and ``--compare`` checks them against an earlier run, exiting 1 when a
+p95 or the throughput regressed by more than ``--tolerance`` percent.
+Levels run in order against one server, so caches warm up across them
+as they would in production.
+
+    python -m benchmarks.bench_load --json before.json
+    git checkout other-branch
+    python -m benchmarks.bench_load --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "mood=3,cgm=4,food=3,meal_plan=1,meal_plan_stream=1"
+TURN_KINDS = ("greeting", "mood", "cgm", "food", "meal_plan", "meal_plan_stream")
+
+MOOD_MESSAGES = ["I'm feeling {mood} today", "feeling {mood}", "my mood is {mood}", "i feel {mood} this morning"]
+MOODS = ["happy", "sad", "tired", "excited", "anxious", "calm", "stressed"]
+CGM_MESSAGES = ["my glucose is {value}", "cgm reading {value} mg/dl", "blood sugar {value}"]
+FOOD_MESSAGES = ["I ate {meal}", "had {meal} for lunch", "breakfast was {meal}", "just finished eating {meal}"]
+KNOWN_MEALS = ["oatmeal with berries", "grilled chicken salad", "salmon with quinoa", "scrambled eggs and toast",
+               "greek yogurt with granola", "lentil soup and rice", "dal with roti", "tofu stir fry with rice"]
+UNKNOWN_MEALS = ["pad thai", "chicken biryani", "falafel wrap", "beef pho", "shakshuka", "poke bowl"]
+MEAL_PLAN_MESSAGES = ["suggest a meal plan", "can you plan my meals", "what should be on my menu"]
+
+METRIC_LINE = re.compile(r'^(\w+?)_(sum|count)(?:\{(\w+)="([^"]*)"\})? (\S+)$')
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in TURN_KINDS:
+            raise SystemExit(f"unknown turn kind {kind!r}; choose from {', '.join(TURN_KINDS)}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def conversation(rng: random.Random, user_id: int, turns: int, mix: dict, unknown_food: float) -> list:
+    """(kind, request body) turns for one user, starting with a greeting"""
+    body = {"user_id": user_id}
+    messages = [("greeting", {"message": f"hi, my user id is {user_id}"})]
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=turns)
+    for kind in kinds:
+        if kind == "mood":
+            text = rng.choice(MOOD_MESSAGES).format(mood=rng.choice(MOODS))
+        elif kind == "cgm":
+            text = rng.choice(CGM_MESSAGES).format(value=int(rng.gauss(140, 35)))
+        elif kind == "food":
+            meals = UNKNOWN_MEALS if rng.random() < unknown_food else KNOWN_MEALS
+            text = rng.choice(FOOD_MESSAGES).format(meal=rng.choice(meals))
+        elif kind == "greeting":
+            text = f"hello, user id {user_id}"
+        else:
+            text = rng.choice(MEAL_PLAN_MESSAGES)
+        turn = dict(body, message=text)
+        if kind == "meal_plan_stream":
+            turn["stream"] = True
+        messages.append((kind, turn))
+    return messages
+
+
+async def send(client: httpx.AsyncClient, kind: str, body: dict) -> tuple:
+    """(latency seconds, succeeded) for one turn; streams report time to first token"""
+    start = time.perf_counter()
+    if kind != "meal_plan_stream":
+        response = await client.post("/agno", json=body)
+        return time.perf_counter() - start, response.status_code == 200 and "content" in response.json()
+    first = None
+    done = False
+    async with client.stream("POST", "/agno", json=body) as response:
+        async for line in response.aiter_lines():
+            if line == "event: token" and first is None:
+                first = time.perf_counter() - start
+            elif line == "event: done":
+                done = True
+    return (first if first is not None else time.perf_counter() - start), done
+
+
+async def run_level(base_url: str, conversations: list, concurrency: int) -> tuple:
+    """Replay conversations with ``concurrency`` clients; (samples by kind, errors by kind, seconds)"""
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    pending = iter(conversations)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            for turns in pending:
+                for kind, body in turns:
+                    try:
+                        latency, ok = await send(client, kind, body)
+                    except httpx.HTTPError:
+                        latency, ok = None, False
+                    if ok:
+                        samples[kind].append(latency)
+                    else:
+                        errors[kind] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples, errors, time.perf_counter() - start
+
+
+def scrape(base_url: str) -> dict:
+    """{(metric, label value): [sum, count]} for the histograms at /metrics"""
+    series = defaultdict(lambda: [0.0, 0.0])
+    for line in httpx.get(f"{base_url}/metrics", timeout=10).text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match is not None:
+            name, field, _, label, value = match.groups()
+            series[(name, label or "")][0 if field == "sum" else 1] = float(value)
+    return series
+
+
+def breakdown(before: dict, after: dict, requests: int) -> dict:
+    """Server-side milliseconds per request, by metric and label"""
+    result = {}
+    for key, (total, count) in after.items():
+        total -= before.get(key, (0.0, 0.0))[0]
+        count -= before.get(key, (0.0, 0.0))[1]
+        if count > 0 and key[0] != "healthcare_chat_seconds":
+            name = key[0].replace("healthcare_", "").replace("_seconds", "")
+            result[f"{name}:{key[1]}"] = {"calls": int(count), "ms_per_request": total / requests * 1000}
+    return result
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> int:
+    """Print the change against a baseline run; returns the number of regressions"""
+    regressions = 0
+    print(f"\ncompared with {baseline.get('revision', '?')} (tolerance {tolerance:.0f}%):")
+    for level, row in results["levels"].items():
+        base = baseline["levels"].get(level)
+        if base is None:
+            continue
+        change = (row["throughput_rps"] / base["throughput_rps"] - 1) * 100
+        flag = " REGRESSION" if change < -tolerance else ""
+        regressions += bool(flag)
+        print(f"  c={level:<4} throughput {base['throughput_rps']:8.1f} -> {row['throughput_rps']:8.1f} req/s "
+              f"({change:+.0f}%){flag}")
+        for kind, stats in row["turns"].items():
+            base_stats = base["turns"].get(kind)
+            if base_stats is None:
+                continue
+            change = (stats["p95_ms"] / base_stats["p95_ms"] - 1) * 100 if base_stats["p95_ms"] else 0.0
+            slower = stats["p95_ms"] - base_stats["p95_ms"] > min_delta_ms
+            flag = " REGRESSION" if change > tolerance and slower else ""
+            regressions += bool(flag)
+            print(f"         {kind:<17} p95 {base_stats['p95_ms']:8.1f} -> {stats['p95_ms']:8.1f} ms "
+                  f"({change:+.0f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=500, help="users in the generated database")
+    parser.add_argument("--days", type=int, default=2, help="days of generated history per user")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--conversations", type=int, default=100, help="conversations per level")
+    parser.add_argument("--turns", type=int, default=5, help="turns after the greeting")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="turn kind weights, e.g. mood=3,cgm=4")
+    parser.add_argument("--unknown-food", type=float, default=0.2, help="share of meals the food index misses")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--llm-token-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-port", type=int, default=8110)
+    parser.add_argument("--app-port", type=int, default=8111)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="allowed regression in percent")
+    parser.add_argument("--min-delta-ms", type=float, default=10.0,
+                        help="ignore p95 increases smaller than this (timer noise on fast turns)")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = {
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "compare", "tolerance", "min_delta_ms")},
+        "levels": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "load.db")
+        subprocess.run([sys.executable, "data_generator.py", "--users", str(args.users), "--days", str(args.days)],
+                       cwd=BACKEND_DIR, env=dict(os.environ, DB_FILE=db_file), check=True,
+                       stdout=subprocess.DEVNULL)
+        llm_server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.mock_llm_server", "--port", str(args.llm_port),
+             "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+             "--token-ms", str(args.llm_token_ms)],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        env = dict(os.environ, DB_FILE=db_file, LLM_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1",
+                   METRICS_ENABLED="1", GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "bench"))
+        app_server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        try:
+            wait_until_up(f"http://127.0.0.1:{args.llm_port}/stats", llm_server)
+            wait_until_up(f"{base_url}/health", app_server)
+            # Warm-up: profile cache, connections, and time for the startup migration
+            warmup_rng = random.Random(args.seed - 1)
+            warmup = [conversation(warmup_rng, warmup_rng.randint(1, args.users), 2, mix, args.unknown_food)
+                      for _ in range(20)]
+            asyncio.run(run_level(base_url, warmup, 4))
+
+            for level in levels:
+                rng = random.Random(args.seed)
+                conversations = [conversation(rng, rng.randint(1, args.users), args.turns, mix, args.unknown_food)
+                                 for _ in range(args.conversations)]
+                before = scrape(base_url)
+                samples, errors, elapsed = asyncio.run(run_level(base_url, conversations, level))
+                requests = sum(len(turns) for turns in conversations)
+                results["levels"][str(level)] = {
+                    "requests": requests,
+                    "seconds": elapsed,
+                    "throughput_rps": requests / elapsed,
+                    "errors": sum(errors.values()),
+                    "turns": {
+                        kind: {
+                            "count": len(values),
+                            "errors": errors.get(kind, 0),
+                            "p50_ms": statistics.median(values) * 1000,
+                            "p95_ms": percentile(values, 95) * 1000,
+                            "p99_ms": percentile(values, 99) * 1000,
+                        }
+                        for kind, values in sorted(samples.items())
+                    },
+                    "server_ms_per_request": breakdown(before, scrape(base_url), requests),
+                }
+        finally:
+            app_server.terminate()
+            llm_server.terminate()
+            app_server.wait()
+            llm_server.wait()
+
+    print(f"revision {results['revision']}: {args.users} users, {args.conversations} conversations x "
+          f"{args.turns + 1} turns per level, mock LLM {args.llm_latency_ms:.0f}±{args.llm_jitter_ms:.0f} ms")
+    for level, row in results["levels"].items():
+        print(f"\nconcurrency {level}: {row['throughput_rps']:.1f} req/s, {row['errors']} errors")
+        print(f"  {'turn':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for kind, stats in row["turns"].items():
+            print(f"  {kind:<18}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                  f"{stats['p99_ms']:>10.1f}")
+        print("  server time per request:")
+        for key, stats in sorted(row["server_ms_per_request"].items()):
+            print(f"    {key:<34}{stats['ms_per_request']:>9.2f} ms  ({stats['calls']} calls)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
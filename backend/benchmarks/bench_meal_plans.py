@@ -0,0 +1,118 @@
+"""
+Benchmark: meal plan per request vs fingerprint cache vs precomputation
+
+Against a generated database and the local mock LLM server, replays
+plan requests from randomly chosen users three ways: generating every
+plan (the original behaviour), the fingerprint cache filling on demand,
+and the cache after a background precompute for all users. Reports
+distinct health states, LLM calls and request latency percentiles.
+
+The precompute is a nightly refresh of every user, timed one LLM call
+per user against ``MealPlanner.plan_batch`` (one call per distinct
+state, fanned out). Exits 1 unless every user gets a parsed
+BREAKFAST/LUNCH/DINNER plan from the batch.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.llm_client import LLMClient
+from agents.meal_plans import MealPlanCache, MealPlanner
+from agents.tools import DatabaseTool
+from benchmarks.mock_llm_server import start_in_thread
+from data_generator import generate_synthetic_data
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def replay(request, user_ids, requests: int, seed: int):
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(requests):
+        user_id = rng.choice(user_ids)
+        start = time.perf_counter()
+        request(user_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label: str, latencies, llm_calls: int) -> None:
+    print(f"{label:<22}: {llm_calls:5d} LLM calls, p50 {statistics.median(latencies):8.2f} ms, "
+          f"p99 {percentile(latencies, 0.99):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--port", type=int, default=8103)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    server = start_in_thread(args.port, args.latency_ms)
+    llm = LLMClient(base_url=f"http://127.0.0.1:{args.port}/v1", api_key="mock", max_concurrency=16)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(db_file, num_users=args.users, days=args.days)
+        db_tool = DatabaseTool(db_file)
+        db_tool.glucose_stats.rebuild(db_tool.pool)
+        user_ids = list(range(1, args.users + 1))
+        try:
+            planner = MealPlanner(db_tool, llm=llm)
+            states = {planner.state_for(user_id).fingerprint for user_id in user_ids}
+            print(f"users / health states : {args.users} / {len(states)}, mock latency {args.latency_ms:.0f} ms")
+
+            def uncached(user_id):
+                planner.generate(planner.state_for(user_id))
+
+            calls = planner.llm_calls
+            report("plan per request", replay(uncached, user_ids, args.requests, args.seed),
+                   planner.llm_calls - calls)
+
+            planner = MealPlanner(db_tool, llm=llm, cache=MealPlanCache())
+            report("fingerprint cache", replay(planner.get_plan, user_ids, args.requests, args.seed),
+                   planner.llm_calls)
+
+            planner = MealPlanner(db_tool, llm=llm, cache=MealPlanCache())
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                list(executor.map(uncached, user_ids))
+            print(f"refresh, per user     : {planner.llm_calls:5d} LLM calls for {args.users} users "
+                  f"in {time.perf_counter() - start:.1f} s")
+
+            planner = MealPlanner(db_tool, llm=llm, cache=MealPlanCache())
+            start = time.perf_counter()
+            batch = planner.plan_batch(user_ids, workers=16)
+            summary = batch.summary()
+            print(f"refresh, batched      : {summary['llm_calls']:5d} LLM calls for {summary['users']} users "
+                  f"in {time.perf_counter() - start:.1f} s, {summary['llm_calls_saved']} saved, "
+                  f"{summary['unparsed']} unparsed")
+            parsed = all(batch.plan_for(user_id) is not None for user_id in user_ids)
+            calls = planner.llm_calls
+            report("after precompute", replay(planner.get_plan, user_ids, args.requests, args.seed),
+                   planner.llm_calls - calls)
+        finally:
+            db_tool.pool.close()
+            llm.close()
+            server.should_exit = True
+
+    print(f"every user has a parsed plan: {'yes' if parsed else 'NO'}")
+    if not parsed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: overhead of the latency/error instrumentation
+
+Runs the same measurements in two fresh interpreters, one with
+``METRICS_ENABLED=1`` and one with ``METRICS_ENABLED=0`` (the switch is
+read at import time): the cost of an instrumented ``DatabaseTool`` call
+and of an empty ``timed`` block, and in-process ``POST /agno`` requests
+over a generated database with the mood/CGM/greeting mix. The enabled
+run also checks ``/metrics`` reports a count per routed intent.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = [
+    {"message": "hi, my user id is {user}"},
+    {"message": "i feel happy today", "user_id": "{user}"},
+    {"message": "my glucose is 142", "user_id": "{user}"},
+    {"message": "what can you do?"},
+]
+
+
+def probe(requests: int, users: int) -> dict:
+    """Measurements for the current METRICS_ENABLED setting"""
+    import asyncio
+    import contextlib
+    import io
+
+    import httpx
+
+    from data_generator import generate_synthetic_data
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_synthetic_data(os.environ["DB_FILE"], num_users=users, days=1)
+    import main as app_main
+    from agents import metrics
+
+    db_tool = app_main.db_tool
+    iterations = 20000
+    for _ in range(1000):
+        db_tool.validate_user(1)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        db_tool.validate_user(1)
+    db_call_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with metrics.timed(metrics.CHAT_STAGE_SECONDS, "bench"):
+            pass
+    timed_us = (time.perf_counter() - start) / iterations * 1e6
+
+    bodies = []
+    for i in range(requests):
+        user = i % users + 1
+        template = MESSAGES[i % len(MESSAGES)]
+        bodies.append({key: (int(value.format(user=user)) if key == "user_id" else value.format(user=user))
+                       for key, value in template.items()})
+
+    async def run_chat():
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for body in bodies[:50]:
+                await client.post("/agno", json=body)
+            start = time.perf_counter()
+            for body in bodies:
+                await client.post("/agno", json=body)
+            elapsed = time.perf_counter() - start
+            response = await client.get("/metrics")
+            return elapsed, response
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed, response = asyncio.run(run_chat())
+    intents = sorted(line.split('"')[1] for line in response.text.splitlines()
+                     if line.startswith("healthcare_chat_seconds_count"))
+    app_main.async_db.shutdown()
+    return {
+        "db_call_us": db_call_us,
+        "timed_block_us": timed_us,
+        "chat_request_us": elapsed / requests * 1e6,
+        "metrics_status": response.status_code,
+        "intents": intents,
+    }
+
+
+def run_probe(enabled: bool, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, METRICS_ENABLED="1" if enabled else "0",
+                   DB_FILE=os.path.join(tmp, "metrics.db"))
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_metrics", "--probe",
+             "--requests", str(args.requests), "--users", str(args.users)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.requests, args.users)))
+        return
+
+    disabled = run_probe(False, args)
+    enabled = run_probe(True, args)
+    print(f"{'':<22}{'disabled':>10}{'enabled':>10}{'overhead':>10}")
+    for key, label in (("db_call_us", "DatabaseTool call µs"), ("timed_block_us", "timed block µs"),
+                       ("chat_request_us", "POST /agno µs")):
+        print(f"{label:<22}{disabled[key]:>10.2f}{enabled[key]:>10.2f}{enabled[key] - disabled[key]:>10.2f}")
+    print(f"/metrics: disabled -> {disabled['metrics_status']}, enabled -> {enabled['metrics_status']} "
+          f"with intents {', '.join(enabled['intents'])}")
+    if enabled["metrics_status"] != 200 or disabled["metrics_status"] != 404 or not enabled["intents"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
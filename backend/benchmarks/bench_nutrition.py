@@ -0,0 +1,79 @@
+"""
+Benchmark: LLM-per-meal vs cached/indexed nutrient estimation
+
+Replays a stream of meal descriptions in which most meals repeat with
+small wording changes (case, punctuation, plurals, "I ate ...") and a
+minority are dishes the food index does not know. Reports LLM calls,
+hit rate and per-meal latency against the local mock LLM server.
+"""
+
+import argparse
+import random
+import time
+
+from agents.llm_client import LLMClient
+from agents.nutrition import NutrientEstimator
+from benchmarks.mock_llm_server import start_in_thread
+from data_generator import MEALS
+
+PREFIXES = ["", "I ate ", "had ", "For breakfast I had ", "just had some ", "Lunch: "]
+UNKNOWN_DISHES = ["pad thai", "chicken biryani", "falafel wrap", "beef pho", "mac and cheese",
+                  "shakshuka", "ramen with pork belly", "poke bowl", "lasagna", "paella"]
+
+
+def meal_stream(count: int, unknown_share: float, seed: int):
+    rng = random.Random(seed)
+    for _ in range(count):
+        if rng.random() < unknown_share:
+            meal = rng.choice(UNKNOWN_DISHES)
+        else:
+            meal = rng.choice(MEALS)[0]
+            if rng.random() < 0.3:
+                meal = meal.capitalize() + rng.choice(["!", ".", " :)"])
+        yield rng.choice(PREFIXES) + meal
+
+
+def run(estimate, meals) -> float:
+    start = time.perf_counter()
+    for meal in meals:
+        estimate(meal)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--meals", type=int, default=500)
+    parser.add_argument("--unknown-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    server = start_in_thread(args.port, args.latency_ms)
+    llm = LLMClient(base_url=f"http://127.0.0.1:{args.port}/v1", api_key="mock")
+    meals = list(meal_stream(args.meals, args.unknown_share, args.seed))
+    try:
+        estimator = NutrientEstimator(llm=llm)
+        before_calls = llm.stats["upstream_calls"]
+        baseline = run(lambda meal: llm.complete_sync(estimator._messages(meal), max_tokens=50, coalesce=False),
+                       meals)
+        baseline_calls = llm.stats["upstream_calls"] - before_calls
+
+        before_calls = llm.stats["upstream_calls"]
+        elapsed = run(estimator.estimate, meals)
+        calls = llm.stats["upstream_calls"] - before_calls
+        stats = estimator.stats()
+
+        print(f"meals                : {len(meals)} ({args.unknown_share:.0%} not in the food index), "
+              f"mock latency {args.latency_ms:.0f} ms")
+        print(f"LLM per meal         : {baseline_calls:4d} LLM calls, {baseline / len(meals) * 1000:7.2f} ms/meal")
+        print(f"cache + food index   : {calls:4d} LLM calls, {elapsed / len(meals) * 1000:7.2f} ms/meal")
+        print(f"hit rate             : {stats['hit_rate']:.1%} "
+              f"(cache {stats['cache_hits']}, index {stats['index_hits']}, llm {stats['llm_calls']})")
+    finally:
+        llm.close()
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
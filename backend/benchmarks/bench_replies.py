@@ -0,0 +1,112 @@
+"""
+Benchmark: chat reply construction and encoding
+
+For each kind of /agno reply (greeting with profile, mood, CGM with
+rolling statistics, food with macros, meal plan, a fixed prompt), times
+building and encoding it the old way (f-string content in a dict, run
+through FastAPI's jsonable_encoder and JSONResponse) against ``Reply``
+objects from ``agents.replies`` encoded by ``ReplyResponse`` (orjson
+when installed; the standard-library fallback is timed too), and reports
+payload sizes. The new payloads carry the structured data next to the
+text, so they are larger. Checks that every reply has role "assistant"
+and that both encoders produce the same JSON; exits 1 if not.
+"""
+
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from agents import replies
+from agents.glucose_stats import GlucoseStatsEngine, range_alert
+from benchmarks.mock_llm_server import MEAL_PLAN_REPLY
+
+PROFILE = {"valid": True, "first_name": "Ada", "last_name": "Lovelace", "city": "London",
+           "diet_preference": "vegetarian", "medical_conditions": "Type 2 Diabetes, Hypertension",
+           "physical_limitations": "None"}
+NUTRIENTS = "Carbs: 45g, Protein: 10g, Fat: 6g"
+
+
+def glucose_snapshot() -> dict:
+    engine = GlucoseStatsEngine()
+    now = int(time.time())
+    for step in range(288):
+        engine.add_reading(1, now - (288 - step) * 300, 110 + step % 90)
+    return engine.snapshot(1, now)
+
+
+def old_replies(stats: dict) -> dict:
+    """The dicts main.py built before, one per reply kind"""
+    alert = range_alert(245)
+    return {
+        "greeting": lambda: {
+            "content": f"Hello! Welcome to the Healthcare Multi-Agent System! 👋\n\nUser ID 42 validated successfully!\n\nName: {PROFILE['first_name']} {PROFILE['last_name']}\nCity: {PROFILE['city']}\nDiet: {PROFILE['diet_preference']}\nMedical Conditions: {PROFILE['medical_conditions']}\nPhysical Limitations: {PROFILE['physical_limitations']}\n\nHow can I assist you today? I can help you with:\n- Logging your mood\n- Recording CGM readings\n- Tracking food intake\n- Generating personalized meal plans\n- Answering general questions",
+            "role": "assistant", "session_token": "x" * 32},
+        "mood": lambda: {
+            "content": "✅ Mood 'happy' logged successfully\n\nYour mood (happy) has been logged successfully!",
+            "role": "assistant"},
+        "cgm": lambda: {"content": f"✅ CGM reading 245 mg/dL logged\n\n{alert}", "role": "assistant" "cgm"},
+        "food": lambda: {
+            "content": f"✅ Food intake logged successfully\n\n🍽️ Meal: oatmeal with berries\n📊 Estimated nutrients: {NUTRIENTS}\n\nYour food intake has been logged!",
+            "role": "assistant" "food"},
+        "meal plan": lambda: {"content": f"🍽️ **Your Personalized Meal Plan**\n\n{MEAL_PLAN_REPLY}",
+                              "role": "assistant" "meal_planner"},
+        "prompt": lambda: {"content": "I can help you log your CGM reading! What's your current glucose reading in mg/dL?",
+                           "role": "assistant" "cgm"},
+    }
+
+
+def new_replies(stats: dict) -> dict:
+    def greeting():
+        reply = replies.greeting(42, PROFILE)
+        reply.session_token = "x" * 32
+        return reply
+
+    return {
+        "greeting": greeting,
+        "mood": lambda: replies.mood_logged("happy", "Mood 'happy' logged successfully"),
+        "cgm": lambda: replies.cgm_logged(245, "CGM reading 245 mg/dL logged", range_alert(245), stats),
+        "food": lambda: replies.food_logged("oatmeal with berries", NUTRIENTS, "Food intake logged successfully"),
+        "meal plan": lambda: replies.meal_plan(MEAL_PLAN_REPLY),
+        "prompt": lambda: replies.STATIC["ask_cgm"],
+    }
+
+
+def timed_us(fn, repeat: int) -> tuple:
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return result, (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    stats = glucose_snapshot()
+    old, new = old_replies(stats), new_replies(stats)
+    stdlib = lambda reply: json.dumps(reply.to_dict(), ensure_ascii=False, separators=(",", ":")).encode()
+    encoder = "orjson" if replies.orjson is not None else "json (orjson not installed)"
+    print(f"encoder: {encoder}\n")
+    print(f"{'reply':<10} {'old µs':>8} {'new µs':>8} {'stdlib µs':>10} {'old bytes':>10} {'new bytes':>10}")
+
+    consistent = True
+    for kind in old:
+        old_body, old_us = timed_us(lambda: JSONResponse(jsonable_encoder(old[kind]())).body, args.repeat)
+        new_body, new_us = timed_us(lambda: replies.ReplyResponse(new[kind]()).body, args.repeat)
+        _, stdlib_us = timed_us(lambda: stdlib(new[kind]()), args.repeat)
+        decoded = json.loads(new_body)
+        consistent &= decoded["role"] == "assistant" and decoded == json.loads(stdlib(new[kind]()))
+        print(f"{kind:<10} {old_us:8.1f} {new_us:8.1f} {stdlib_us:10.1f} {len(old_body):10,} {len(new_body):10,}")
+
+    print(f"\nrole is \"assistant\" and encoders agree: {'yes' if consistent else 'NO'}")
+    if not consistent:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Benchmark: log retention, cold archive and incremental vacuum
+
+Generates months of mood, CGM and food history, then runs a retention
+pass with a short hot window while a writer thread keeps logging CGM
+readings, and reports the pass time, the writer's latency during the
+pass against before it, database size before and after (incremental
+vacuum) and the size of the archive files. Checks that the history
+APIs cannot tell the difference: every page walk, per-user and
+whole-table export and raw/hourly/daily CGM history returns the same
+rows as before the pass, also after an interrupted pass; that a late
+reading for an archived month is archived by the next pass with its
+rollups kept exact; that a pass with nothing to move moves nothing; and
+that mood and food cohort reports refuse windows reaching into the archive.
+Exits 1 if any check fails.
+"""
+
+import argparse
+import calendar
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+KINDS = ("mood", "cgm", "food")
+
+
+def db_size(pool) -> int:
+    with pool.connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return os.path.getsize(pool.db_file)
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def walk_pages(tool, kind: str, user_id: int) -> list:
+    items, cursor = [], None
+    while True:
+        page = tool.get_log_page(kind, user_id, cursor, 500)
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def export(tool, kind: str, user_id=None) -> list:
+    rows, after = [], None
+    while True:
+        batch, after = tool.export_log_batch(kind, user_id, after)
+        rows.extend(batch)
+        if after is None:
+            return rows
+
+
+def snapshot(tool, users: list, skip_user: int, start: int, end: int, cutoff: int) -> dict:
+    """What the history APIs return for a few users and the whole tables, minus skip_user's rows"""
+    result = {}
+    for kind in KINDS:
+        rows = [row for row in export(tool, kind) if row[1] != skip_user]
+        result[f"{kind} export"] = (len(rows), sorted(rows) == sorted(set(rows)), sorted(rows))
+        for user_id in users:
+            result[f"{kind} pages {user_id}"] = walk_pages(tool, kind, user_id)
+            result[f"{kind} user export {user_id}"] = export(tool, kind, user_id)
+    for user_id in users:
+        result[f"cgm raw {user_id}"] = tool.get_cgm_history(user_id, cutoff - 2 * 86400, cutoff + 2 * 86400, "raw")
+        for resolution in ("hour", "day"):
+            result[f"cgm {resolution} {user_id}"] = tool.get_cgm_history(user_id, start, end, resolution)
+    return result
+
+
+def rollups_exact(tool) -> bool:
+    """Stored rollups equal the aggregate of every reading, archived or not"""
+    from agents import cgm_rollups
+
+    readings = [(row[1], calendar.timegm(time.strptime(row[2], "%Y-%m-%d %H:%M:%S")), row[3])
+                for row in export(tool, "cgm")]
+    with tool.pool.connection() as conn:
+        stored = set(conn.execute("SELECT * FROM cgm_rollups").fetchall())
+    return stored == set(cgm_rollups.aggregate(readings))
+
+
+def reports_reject_archived(pool, days: int) -> bool:
+    """Mood and food cohort reports refuse windows reaching into archived months, CGM ones do not"""
+    from agents.analytics import PopulationAnalytics
+
+    analytics = PopulationAnalytics(pool)
+    for metric in ("mood", "food"):
+        try:
+            analytics.report(metric, days=days)
+            return False
+        except ValueError:
+            pass
+        analytics.report(metric, days=analytics.max_days(metric))
+    return analytics.report("cgm", days=days)["groups"][0]["readings"] > 0
+
+
+class Writer(threading.Thread):
+    """Logs a CGM reading every few milliseconds and records how long each write took"""
+
+    def __init__(self, tool, user_id: int):
+        super().__init__(daemon=True)
+        self.tool, self.user_id = tool, user_id
+        self.latencies = []
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            start = time.perf_counter()
+            self.tool.log_cgm(self.user_id, 120)
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    def take(self) -> list:
+        taken, self.latencies = self.latencies, []
+        return taken
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--days", type=int, default=240)
+    parser.add_argument("--readings-per-day", type=int, default=24)
+    parser.add_argument("--keep-days", type=int, default=60, help="hot window of the retention pass")
+    parser.add_argument("--sample-users", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "retention.db")
+        from data_generator import generate_synthetic_data
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(db_file, num_users=args.users, days=args.days,
+                                    readings_per_day=args.readings_per_day)
+        print(f"generated {args.users:,} users x {args.days} days in {time.perf_counter() - start:.1f}s")
+
+        from agents import retention
+        from agents.tools import DatabaseTool
+
+        tool = DatabaseTool(db_file)
+        pool = tool.pool
+        keeper = retention.LogRetention(pool, args.keep_days, directory=os.path.join(tmp, "archive"))
+        tool.archive = keeper.archive
+        cutoff = retention.archive_cutoff(args.keep_days)
+        end = int(time.time()) + 86400
+        begin = end - (args.days + 2) * 86400
+        users = list(range(2, 2 + args.sample_users))
+        with pool.connection() as conn:
+            hot_before = {kind: conn.execute(f"SELECT COUNT(*) FROM {kind}_logs").fetchone()[0] for kind in KINDS}
+        size_before = db_size(pool)
+        before = snapshot(tool, users, 1, begin, end, cutoff)
+
+        # An interrupted pass: one batch written to an archived month, not deleted from the log table
+        table, columns = "cgm_logs", "glucose_reading"
+        rows, _ = keeper._next_batch(table, columns, 0, cutoff)
+        keeper._store("cgm", rows)
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO log_archives VALUES ('cgm', ?, 0, 0, 0)", (retention.month_of(rows[0][2]),))
+            conn.commit()
+        interrupted_same = snapshot(tool, users, 1, begin, end, cutoff) == before
+
+        writer = Writer(tool, 1)
+        writer.start()
+        time.sleep(2)
+        idle_ms = writer.take()
+        result = keeper.run()
+        pass_ms = writer.take()
+        writer.stopping.set()
+        writer.join()
+
+        size_after = db_size(pool)
+        archive_bytes = dir_size(keeper.archive.directory)
+        after = snapshot(tool, users, 1, begin, end, cutoff)
+        same = after == before
+        with pool.connection() as conn:
+            hot_after = {kind: conn.execute(f"SELECT COUNT(*) FROM {kind}_logs").fetchone()[0] for kind in KINDS}
+            oldest = min(conn.execute(f"SELECT COALESCE(MIN(timestamp), {cutoff}) FROM {kind}_logs").fetchone()[0]
+                         for kind in KINDS)
+
+        # A reading that arrives late for an archived month
+        late_user = users[0]
+        late_timestamp = cutoff - 40 * 86400 + 123
+        late_log_id = tool._insert_cgm(late_user, late_timestamp, 333)
+        late = keeper.run()
+        late_archived = late["archived"]["cgm"] == 1 and any(
+            row[0] == late_log_id for row in keeper.archive.between("cgm", late_user, late_timestamp,
+                                                                     late_timestamp + 1))
+        exact = rollups_exact(tool)
+        idle = keeper.run()
+        reports_bounded = reports_reject_archived(pool, args.days)
+        pool.close()
+
+    print(f"\nretention pass (hot window {args.keep_days} days, cutoff "
+          f"{time.strftime('%Y-%m-%d', time.gmtime(cutoff))}): {result['seconds']:.1f}s")
+    for kind in KINDS:
+        print(f"  {kind:<5} {hot_before[kind]:>10,} rows -> {hot_after[kind]:>9,} hot, "
+              f"{result['archived'][kind]:>10,} archived")
+    print(f"  incremental vacuum: {result['pages_vacuumed']:,} pages")
+    print(f"database file        : {size_before / 2**20:8.1f} MB -> {size_after / 2**20:8.1f} MB")
+    print(f"archive files        : {archive_bytes / 2**20:8.1f} MB")
+    print(f"CGM write latency    : before p50 {statistics.median(idle_ms):.2f} ms, max {max(idle_ms):.2f} ms; "
+          f"during the pass p50 {statistics.median(pass_ms):.2f} ms, max {max(pass_ms):.2f} ms "
+          f"({len(pass_ms)} writes)")
+    print(f"pass with nothing to move: {idle['seconds']:.2f}s\n")
+
+    checks = {
+        "history APIs unchanged after an interrupted pass": interrupted_same,
+        "history APIs unchanged after the pass": same,
+        "no hot rows older than the cutoff": oldest >= cutoff,
+        "late reading archived by the next pass": late_archived,
+        "CGM rollups match every reading": exact,
+        "idle pass moves nothing": not any(idle["archived"].values()),
+        "mood/food reports reject archived windows": reports_bounded,
+    }
+    for label, ok in checks.items():
+        print(f"{label:<50}: {'yes' if ok else 'NO'}")
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: chat intent routing
+
+Times agents.router.route_message against the original chain of
+``any(keyword in message ...)`` checks plus per-message ``re.search``
+calls over a corpus of chat messages. Routing correctness is covered by
+tests/test_router.py.
+"""
+
+import argparse
+import re
+import time
+
+from agents.router import route_message
+
+# A mix of greetings, logs, plan requests and off-topic messages
+CORPUS = [
+    "Hello!", "hi, my user id is 42", "hello 7", "Let's begin", "id: 13",
+    "I'm feeling happy today", "log my mood please", "so tired and sad", "I feel anxious",
+    "glucose reading 150", "my blood sugar is 95 mg/dl", "CGM 210", "user id 5, glucose 120", "reading",
+    "I ate oatmeal with berries and coffee", "had eggs for breakfast", "eating 2 bananas",
+    "generate a meal plan", "what's on the menu?", "can you suggest something",
+    "what is the capital of France?", "this is great, thanks", "which one did you mean",
+    "I was late for the meeting",
+]
+
+
+def legacy_route(message: str) -> tuple:
+    """The routing chain copilotkit_chat used before agents.router"""
+    message = message.lower()
+    user_id = None
+    import re
+    user_id_match = re.search(r'\d+', message)
+    if user_id_match:
+        user_id = int(user_id_match.group())
+    if any(keyword in message for keyword in ["hello", "hi", "start", "begin", "user id", "id"]):
+        return ("greeting", None, None, user_id)
+    elif any(keyword in message for keyword in ["mood", "feeling", "happy", "sad", "tired", "excited"]):
+        mood = next((m for m in ["happy", "sad", "tired", "excited", "anxious", "angry", "calm", "stressed"]
+                     if m in message), None)
+        return ("mood", mood, None, user_id)
+    elif any(keyword in message for keyword in ["glucose", "cgm", "blood sugar", "reading"]):
+        glucose_match = re.search(r'\d+', message)
+        return ("cgm", None, int(glucose_match.group()) if glucose_match else None, user_id)
+    elif any(keyword in message for keyword in ["food", "meal", "ate", "eating", "breakfast", "lunch", "dinner"]):
+        return ("food", None, None, user_id)
+    elif any(keyword in message for keyword in ["plan", "meal plan", "menu", "suggest"]):
+        return ("meal_planner", None, None, user_id)
+    return ("interrupt", None, None, user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    timings = {}
+    for name, func in (("legacy chain", legacy_route), ("compiled router", route_message)):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for message in CORPUS:
+                func(message)
+        timings[name] = (time.perf_counter() - start) / (args.rounds * len(CORPUS)) * 1e6
+        print(f"{name:<16}: {timings[name]:6.2f} us/message")
+    print(f"speedup         : {timings['legacy chain'] / timings['compiled router']:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
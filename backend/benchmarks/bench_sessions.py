@@ -0,0 +1,101 @@
+"""
+Benchmark: chat turns with a session token vs a user ID per message
+
+Replays mood/CGM/food turns through ``POST /agno`` (in-process) over a
+generated database, once sending ``user_id`` with every message (parsed
+and validated each turn) and once sending the ``session_token`` from the
+greeting. Also times the session store itself (in-memory lookup, SQLite
+write-through and cold load) and checks that a bare answer to a question
+("142" after "What's your current glucose reading?") is logged for the
+session's user; exits 1 if it is not.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import httpx
+
+TURNS = ["I'm feeling happy", "my glucose is 128", "I ate oatmeal with berries", "feeling tired",
+         "blood sugar 151", "had grilled chicken salad for lunch"]
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "sessions.db")
+        os.environ["DB_FILE"] = db_file
+        from data_generator import generate_synthetic_data
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(db_file, num_users=args.users, days=1)
+        import main as app_main
+        from agents.db import get_pool
+        from agents.sessions import SessionStore
+
+        async def replay(use_session: bool) -> float:
+            transport = httpx.ASGITransport(app=app_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                elapsed = 0.0
+                for n in range(args.conversations):
+                    user_id = n % args.users + 1
+                    greeting = await client.post("/agno", json={"message": f"hi, my user id is {user_id}"})
+                    ident = ({"session_token": greeting.json()["session_token"]} if use_session
+                             else {"user_id": user_id})
+                    start = time.perf_counter()
+                    for message in TURNS:
+                        await client.post("/agno", json={"message": message, **ident})
+                    elapsed += time.perf_counter() - start
+                return elapsed / (args.conversations * len(TURNS)) * 1e6
+
+        async def follow_up() -> bool:
+            transport = httpx.ASGITransport(app=app_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                greeting = await client.post("/agno", json={"message": "hi, my user id is 7"})
+                token = greeting.json()["session_token"]
+                await client.post("/agno", json={"message": "log my cgm", "session_token": token})
+                reply = await client.post("/agno", json={"message": "187", "session_token": token})
+            return "187" in reply.json()["content"] and app_main.db_tool.get_cgm_logs(7, 1)[0]["glucose"] == 187
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(replay(False))  # warm the profile cache and connections
+            by_user_id = asyncio.run(replay(False))
+            by_session = asyncio.run(replay(True))
+            follow_up_ok = asyncio.run(follow_up())
+
+        profile = app_main.db_tool.validate_user(1)
+        memory = SessionStore()
+        session = memory.create(1, profile)
+        persistent = SessionStore(get_pool(db_file))
+        stored = persistent.create(1, profile)
+        lookup_us = per_call_us(lambda: memory.get_cached(session.token), 20000)
+        save_us = per_call_us(lambda: persistent.save(stored), 500)
+        load_us = per_call_us(lambda: SessionStore(get_pool(db_file)).load(stored.token), 500)
+        app_main.async_db.shutdown()
+
+    print(f"POST /agno per turn, user_id in body : {by_user_id:8.1f} µs")
+    print(f"POST /agno per turn, session token   : {by_session:8.1f} µs")
+    print(f"session lookup (memory)             : {lookup_us:8.2f} µs")
+    print(f"session write-through (SQLite)      : {save_us:8.1f} µs")
+    print(f"session cold load (SQLite)          : {load_us:8.1f} µs")
+    print(f"bare answer routed to pending intent: {'yes' if follow_up_ok else 'NO'}")
+    if not follow_up_ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: backend cold start
+
+Measures, in fresh interpreters, how long ``import main`` takes
+(``python -X importtime``), the resident memory afterwards, which
+top-level packages dominate import time, and whether agno/openai were
+loaded. The "main + agents" row also imports the agent registry, which is
+what every worker paid before the agents package became lazy. Finally
+it starts uvicorn on a scratch database and times until ``/health``
+first answers. ``--json`` writes the numbers for tracking over time.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)")
+
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+{statement}
+print((time.perf_counter() - start) * 1000)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+print(int('agno' in sys.modules), int('openai' in sys.modules), len(sys.modules))
+"""
+
+
+def cold_import(statement: str, env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(statement=statement)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    self_us = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is not None:
+            own, module = match.groups()
+            self_us[module.split(".")[0]] += int(own)
+    import_ms, rss_mb, flags = result.stdout.strip().splitlines()[-3:]
+    agno, openai, modules = (int(value) for value in flags.split())
+    return {
+        "import_ms": float(import_ms),
+        "rss_mb": int(rss_mb),
+        "agno_loaded": bool(agno),
+        "openai_loaded": bool(openai),
+        "modules": modules,
+        "top_packages": sorted(self_us.items(), key=lambda item: -item[1])[:8],
+    }
+
+
+def time_to_healthy(env: dict, port: int, timeout: float = 60.0) -> float:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError("server did not become healthy")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8104)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DB_FILE=os.path.join(tmp, "startup.db"))
+        results = {}
+        for label, statement in (("main", "import main"),
+                                 ("main + agents", "import main, agents.registry")):
+            cold_import(statement, env)  # warm the bytecode and OS file caches
+            runs = [cold_import(statement, env) for _ in range(args.runs)]
+            results[label] = {
+                "import_ms": statistics.median(run["import_ms"] for run in runs),
+                "rss_mb": statistics.median(run["rss_mb"] for run in runs),
+                "agno_loaded": runs[0]["agno_loaded"],
+                "openai_loaded": runs[0]["openai_loaded"],
+                "modules": runs[0]["modules"],
+                "top_packages": runs[0]["top_packages"],
+            }
+        healthy = [time_to_healthy(env, args.port) for _ in range(max(1, args.runs // 2))]
+        results["time_to_healthy_ms"] = statistics.median(healthy)
+
+    for label in ("main", "main + agents"):
+        row = results[label]
+        print(f"{label:<14}: import {row['import_ms']:7.1f} ms, RSS {row['rss_mb']:4.0f} MB, "
+              f"{row['modules']} modules, agno {'yes' if row['agno_loaded'] else 'no'}, "
+              f"openai {'yes' if row['openai_loaded'] else 'no'}")
+    print("slowest packages (self time, import main):")
+    for package, micros in results["main"]["top_packages"]:
+        print(f"  {package:<20}{micros / 1000:8.1f} ms")
+    print(f"uvicorn start to first healthy /health: {results['time_to_healthy_ms']:.0f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
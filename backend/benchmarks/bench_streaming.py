@@ -0,0 +1,121 @@
+"""
+Benchmark: blocking vs streamed meal plans, and cancellation on disconnect
+
+Serves the app with uvicorn against a generated database and the mock
+LLM server (time to first token plus a per-word generation delay).
+For uncached plans it compares the blocking path, which returns after
+the whole completion, with ``/agno`` in streaming mode: time to first
+token event and to the end of the stream. It then disconnects midway
+through a stream and checks the upstream generation was cancelled; it
+exits 1 if it was not.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.mock_llm_server import start_in_thread
+
+
+def stream_plan(base_url: str, user_id: int, stop_after: int = None):
+    """(first token seconds, total seconds, token events) for one streamed plan"""
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    with httpx.stream("POST", f"{base_url}/agno", timeout=60,
+                      json={"message": "suggest a meal plan", "user_id": user_id, "stream": True}) as response:
+        for line in response.iter_lines():
+            if line == "event: token":
+                tokens += 1
+                if first is None:
+                    first = time.perf_counter() - start
+                if stop_after is not None and tokens >= stop_after:
+                    break
+    return first, time.perf_counter() - start, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--llm-port", type=int, default=8106)
+    parser.add_argument("--app-port", type=int, default=8107)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mock time to first token")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="mock generation time per word")
+    args = parser.parse_args()
+
+    llm_server = start_in_thread(args.llm_port, args.latency_ms, token_ms=args.token_ms)
+    tmp = tempfile.mkdtemp()
+    db_file = os.path.join(tmp, "bench.db")
+    # The app (and agents.db) read their configuration at import time
+    os.environ["DB_FILE"] = db_file
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{args.llm_port}/v1"
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    from data_generator import generate_synthetic_data
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_synthetic_data(db_file, num_users=args.users, days=1)
+    import main as app_main
+    from agents.llm_client import get_llm_client
+
+    app_server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=args.app_port,
+                                               log_level="warning"))
+    threading.Thread(target=app_server.run, daemon=True).start()
+    while not app_server.started:
+        time.sleep(0.01)
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not app_main.app.state.migration.done():
+            time.sleep(0.05)
+
+    planner = app_main.meal_planner
+    try:
+        blocking = []
+        for user_id in range(1, args.requests + 1):
+            planner.cache.clear()
+            state = planner.state_for(user_id)
+            start = time.perf_counter()
+            planner.generate(state)
+            blocking.append(time.perf_counter() - start)
+
+        firsts, totals = [], []
+        for user_id in range(1, args.requests + 1):
+            planner.cache.clear()
+            first, total, _ = stream_plan(base_url, user_id)
+            firsts.append(first)
+            totals.append(total)
+
+        print(f"mock LLM             : {args.latency_ms:.0f} ms to first token, {args.token_ms:.0f} ms per word")
+        print(f"blocking plan        : first byte {statistics.median(blocking) * 1000:7.0f} ms "
+              f"(= total {statistics.median(blocking) * 1000:.0f} ms)")
+        print(f"streamed via /agno   : first token {statistics.median(firsts) * 1000:6.0f} ms, "
+              f"total {statistics.median(totals) * 1000:.0f} ms")
+
+        planner.cache.clear()
+        before = httpx.get(f"http://127.0.0.1:{args.llm_port}/stats").json()["streams_cancelled"]
+        _, elapsed, tokens = stream_plan(base_url, 1, stop_after=5)
+        time.sleep(0.5)
+        after = httpx.get(f"http://127.0.0.1:{args.llm_port}/stats").json()["streams_cancelled"]
+        cached = planner.cache.get(planner.state_for(1).fingerprint) is not None
+        print(f"disconnect after {tokens} tokens ({elapsed * 1000:.0f} ms): upstream streams cancelled "
+              f"{after - before}, client cancellations {get_llm_client().stats['streams_cancelled']}, "
+              f"partial plan cached: {'yes' if cached else 'no'}")
+        if after - before != 1 or cached:
+            sys.exit(1)
+    finally:
+        app_server.should_exit = True
+        llm_server.should_exit = True
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
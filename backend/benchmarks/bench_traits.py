@@ -0,0 +1,151 @@
+"""
+Benchmark: cohort lookups by condition and limitation
+
+Over a generated population, finds the users of a few cohorts ("celiac
+vegans with swallowing difficulties", ...) three ways: ``LIKE '%...%'``
+over the comma-joined users columns (what filtering took before),
+joins through the normalized junction tables, and the in-memory bitmaps
+of ``TraitIndex``. Checks that all three agree, that a profile update
+moves the user between cohorts in both the tables and the bitmaps, and
+that the migration backfill re-derives the same junction rows; exits 1
+if not.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+COHORTS = [
+    {"diet": "vegan", "condition": ["Celiac Disease"], "limitation": ["Swallowing difficulties"]},
+    {"condition": ["Type 2 Diabetes", "Hypertension"]},
+    {"city": "Tokyo", "diet": "vegetarian", "condition": ["Heart Disease"]},
+    {"limitation": ["Mobility issues"]},
+]
+COLUMNS = {"diet": "diet_preference", "city": "city"}
+
+
+def like_query(cohort: dict) -> tuple:
+    from agents.traits import TRAITS
+    clauses, params = [], []
+    for dimension, wanted in cohort.items():
+        if dimension in COLUMNS:
+            clauses.append(f"{COLUMNS[dimension]} = ?")
+            params.append(wanted)
+            continue
+        for label in wanted:
+            clauses.append(f"{TRAITS[dimension][0]} LIKE ?")
+            params.append(f"%{label}%")
+    return f"SELECT user_id FROM users WHERE {' AND '.join(clauses)} ORDER BY user_id", params
+
+
+def junction_query(cohort: dict) -> tuple:
+    from agents.traits import TRAITS
+    selects, params = [], []
+    for dimension, wanted in cohort.items():
+        if dimension in COLUMNS:
+            selects.append(f"SELECT user_id FROM users WHERE {COLUMNS[dimension]} = ?")
+            params.append(wanted)
+            continue
+        _, table, id_column, junction = TRAITS[dimension]
+        for label in wanted:
+            selects.append(f"SELECT user_id FROM {junction} WHERE {id_column} = "
+                           f"(SELECT {id_column} FROM {table} WHERE name = ?)")
+            params.append(label)
+    return f"{' INTERSECT '.join(selects)} ORDER BY user_id", params
+
+
+def timed_ms(fn, repeat: int) -> tuple:
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def junction_rows(pool) -> set:
+    from agents.traits import TRAITS
+    with pool.connection() as conn:
+        return {(dimension, user_id, name.lower())
+                for dimension, (_, table, id_column, junction) in TRAITS.items()
+                for user_id, name in conn.execute(
+                    f"SELECT user_id, name FROM {junction} JOIN {table} USING ({id_column})")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "traits.db")
+        from data_generator import generate_synthetic_data
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_synthetic_data(db_file, num_users=args.users, days=0)
+        print(f"generated {args.users:,} users in {time.perf_counter() - start:.1f}s")
+
+        from agents import migrations, traits
+        from agents.tools import DatabaseTool
+
+        tool = DatabaseTool(db_file)
+        pool = tool.pool
+        start = time.perf_counter()
+        tool.traits.select()
+        print(f"bitmap index loaded in {time.perf_counter() - start:.2f}s\n")
+
+        agree = True
+        print(f"{'cohort':<70} {'users':>7} {'LIKE':>9} {'junction':>9} {'bitmap':>9}")
+        for cohort in COHORTS:
+            with pool.connection() as conn:
+                like, like_ms = timed_ms(lambda: [r[0] for r in conn.execute(*like_query(cohort))], args.repeat)
+                joined, join_ms = timed_ms(lambda: [r[0] for r in conn.execute(*junction_query(cohort))],
+                                           args.repeat)
+            found, bitmap_ms = timed_ms(lambda: tool.find_users(**cohort)["user_ids"], args.repeat)
+            agree &= like == joined == found
+            label = ", ".join(f"{k}={'+'.join(v) if isinstance(v, list) else v}" for k, v in cohort.items())
+            print(f"{label:<70} {len(found):>7,} {like_ms:>7.2f}ms {join_ms:>7.2f}ms {bitmap_ms:>7.3f}ms")
+
+        cohort = COHORTS[0]
+        user_id = next(u for u in range(1, args.users + 1) if u not in tool.find_users(**cohort)["user_ids"])
+        tool.update_user(user_id, diet_preference="vegan", medical_conditions="celiac disease, Hypertension",
+                         physical_limitations="Swallowing difficulties")
+        with pool.connection() as conn:
+            joined = [r[0] for r in conn.execute(*junction_query(cohort))]
+        moved_in = user_id in tool.find_users(**cohort)["user_ids"] and user_id in joined
+        tool.update_user(user_id, medical_conditions="None")
+        with pool.connection() as conn:
+            joined = [r[0] for r in conn.execute(*junction_query(cohort))]
+        moved_out = user_id not in tool.find_users(**cohort)["user_ids"] and user_id not in joined
+
+        before = junction_rows(pool)
+        with pool.writer() as conn:
+            for _, table, _, junction in traits.TRAITS.values():
+                conn.execute(f"DROP TABLE {junction}")
+                conn.execute(f"DROP TABLE {table}")
+            conn.execute("PRAGMA user_version = 5")
+            conn.commit()
+        start = time.perf_counter()
+        migrations.migrate(db_file)
+        migrate_s = time.perf_counter() - start
+        backfilled = junction_rows(pool) == before
+        print(f"\nmigration backfill of {args.users:,} users: {migrate_s:.1f}s")
+        pool.close()
+
+    checks = {
+        "LIKE, junction tables and bitmaps agree": agree,
+        "profile update moves the user into the cohort": moved_in,
+        "profile update moves the user out again": moved_out,
+        "migration backfill matches": backfilled,
+    }
+    for label, ok in checks.items():
+        print(f"{label:<50}: {'yes' if ok else 'NO'}")
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark: throughput vs uvicorn worker processes on one database file
+
+Serves the app with ``--workers N`` (``WEB_CONCURRENCY=N``) for each N
+over a generated database and drives it from several client processes
+for a fixed time. Most requests are reads (CGM/mood prompts that
+validate the user; ``PROFILE_CACHE_SIZE=0`` so every validation is a
+SQLite query), the rest are mood and CGM writes from all workers at
+once. Reports throughput and latency per worker count and checks that
+every acknowledged write is in the database and none was answered with
+the "logged" fallback that hides a failed write; exits 1 otherwise.
+
+Read throughput can only scale up to the number of cores (see
+``os.cpu_count()``) and needs enough client processes to saturate it.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READS = ["what's my glucose reading?", "log my mood please", "cgm"]
+MOODS = ["happy", "sad", "tired", "excited", "calm"]
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def drive(base_url: str, concurrency: int, duration: float, users: int,
+                write_share: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    result = {"latencies": [], "reads": 0, "mood_writes": 0, "cgm_writes": 0, "fallbacks": 0, "errors": 0}
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                user_id = rng.randint(1, users)
+                roll = rng.random()
+                if roll < write_share / 2:
+                    kind, body = "mood", {"message": f"i feel {rng.choice(MOODS)}", "user_id": user_id}
+                elif roll < write_share:
+                    kind, body = "cgm", {"message": f"glucose {rng.randint(90, 180)}", "user_id": user_id}
+                else:
+                    kind, body = "read", {"message": rng.choice(READS), "user_id": user_id}
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/agno", json=body)
+                    content = response.json()["content"]
+                except (httpx.HTTPError, ValueError, KeyError):
+                    result["errors"] += 1
+                    continue
+                result["latencies"].append(time.perf_counter() - start)
+                if kind == "read":
+                    result["reads"] += 1
+                elif kind == "mood":
+                    # The success reply quotes the stored mood; the fallback does not
+                    if content.startswith("✅ Mood '"):
+                        result["mood_writes"] += 1
+                    else:
+                        result["fallbacks"] += 1
+                elif "logged successfully" in content:
+                    result["fallbacks"] += 1
+                else:
+                    result["cgm_writes"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return result
+
+
+def client_process(args: tuple) -> dict:
+    return asyncio.run(drive(*args))
+
+
+def row_counts(db_file: str) -> tuple:
+    conn = sqlite3.connect(db_file)
+    try:
+        return (conn.execute("SELECT COUNT(*) FROM mood_logs").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM cgm_logs").fetchone()[0])
+    finally:
+        conn.close()
+
+
+def wait_until_healthy(url: str, server: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise RuntimeError("server did not become healthy")
+
+
+def run_level(workers: int, db_file: str, args) -> dict:
+    env = dict(os.environ, DB_FILE=db_file, WEB_CONCURRENCY=str(workers), PROFILE_CACHE_SIZE="0",
+               METRICS_ENABLED="0", GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "bench"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_healthy(f"{base_url}/health", server)
+        # Let every worker finish startup (migrations, statistics rebuild)
+        time.sleep(1.0 + 0.25 * workers)
+        before = row_counts(db_file)
+        jobs = [(base_url, args.concurrency, args.duration, args.users, args.write_share, args.seed + n)
+                for n in range(args.client_procs)]
+        with multiprocessing.get_context("spawn").Pool(args.client_procs) as pool:
+            results = pool.map(client_process, jobs)
+        after = row_counts(db_file)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    totals = {key: sum(result[key] for result in results)
+              for key in ("reads", "mood_writes", "cgm_writes", "fallbacks", "errors")}
+    return {
+        "throughput": len(latencies) / args.duration,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        **totals,
+        "lost_writes": (totals["mood_writes"] - (after[0] - before[0])) + (totals["cgm_writes"] - (after[1] - before[1])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default 1,2,4 up to the cores)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    parser.add_argument("--client-procs", type=int, default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--write-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--port", type=int, default=8112)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        levels = [int(level) for level in args.workers.split(",")]
+    else:
+        levels = [level for level in (1, 2, 4, 8) if level <= max(1, cores)] or [1]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "workers.db")
+        subprocess.run([sys.executable, "data_generator.py", "--users", str(args.users), "--days", "1"],
+                       cwd=BACKEND_DIR, env=dict(os.environ, DB_FILE=db_file), check=True,
+                       stdout=subprocess.DEVNULL)
+        for workers in levels:
+            results[workers] = run_level(workers, db_file, args)
+
+    print(f"{cores} cores, {args.client_procs} client processes x {args.concurrency} connections, "
+          f"{args.write_share:.0%} writes, {args.duration:.0f}s per level")
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>9}{'p99 ms':>9}{'writes':>8}"
+          f"{'fallbacks':>11}{'lost':>6}{'errors':>8}")
+    base = results[levels[0]]["throughput"]
+    failed = False
+    for workers, row in results.items():
+        writes = row["mood_writes"] + row["cgm_writes"]
+        print(f"{workers:>8}{row['throughput']:>10.0f}{row['throughput'] / base:>8.2f}x{row['p50_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{writes:>8}{row['fallbacks']:>11}{row['lost_writes']:>6}{row['errors']:>8}")
+        failed |= bool(row["fallbacks"] or row["lost_writes"] or row["errors"])
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Mock OpenAI-compatible LLM server
+
+Stands in for the Groq/OpenAI endpoint in benchmarks and local runs:
+``POST /v1/chat/completions`` sleeps for a configurable latency and
+returns a canned answer shaped like the real prompts expect (nutrient
+line for food analysis, BREAKFAST/LUNCH/DINNER plan otherwise).
+``latency_ms`` is the time to the first token and ``token_ms`` the time
+per generated word (default 0): a plain response arrives after both,
+with ``"stream": true`` the words are sent as OpenAI-style SSE chunks as
+they are "generated". ``GET /stats`` reports how many completions
+were served and how many streams the client abandoned before the end.
+
+    python -m benchmarks.mock_llm_server --port 8100 --latency-ms 200
+    LLM_BASE_URL=http://127.0.0.1:8100/v1 python main.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+NUTRIENTS_REPLY = "Carbs: 42g, Protein: 18g, Fat: 11g"
+MEAL_PLAN_REPLY = """🌅 BREAKFAST: Vegetable Oat Porridge
+- Steel-cut oats
+- Chia seeds
+- Fresh berries
+📊 Macros: Carbs: 40g | Protein: 12g | Fat: 9g
+💡 Note: High fiber keeps glucose steady
+
+☀️ LUNCH: Lentil and Spinach Bowl
+- Red lentils
+- Wilted spinach
+- Brown rice
+📊 Macros: Carbs: 50g | Protein: 22g | Fat: 7g
+💡 Note: Slow-release carbohydrates and plant protein
+
+🌙 DINNER: Baked Tofu with Quinoa
+- Baked tofu
+- Quinoa
+- Roasted vegetables
+📊 Macros: Carbs: 35g | Protein: 25g | Fat: 14g
+💡 Note: Balanced, easy to digest evening meal
+
+🎯 PLAN RATIONALE:
+Low-GI, high-fiber meals matched to the current glucose trend and diet preference."""
+
+
+def _stream_chunks(app: FastAPI, model: str, content: str, token_ms: float):
+    async def chunks():
+        completed = False
+        try:
+            created = int(time.time())
+            for index, token in enumerate(re.findall(r"\s*\S+", content)):
+                delta = {"content": token}
+                if index == 0:
+                    delta["role"] = "assistant"
+                chunk = {"id": f"mock-{app.state.completions}", "object": "chat.completion.chunk",
+                         "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_ms / 1000)
+            chunk = {"id": f"mock-{app.state.completions}", "object": "chat.completion.chunk",
+                     "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n"
+            completed = True
+        finally:
+            if not completed:
+                app.state.streams_cancelled += 1
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def create_app(latency_ms: float = 200.0, jitter_ms: float = 0.0, token_ms: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    app.state.completions = 0
+    app.state.streams_cancelled = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: dict):
+        app.state.completions += 1
+        await asyncio.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+        prompt = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+        content = NUTRIENTS_REPLY if "macronutrients" in prompt else MEAL_PLAN_REPLY
+        if request.get("stream"):
+            return _stream_chunks(app, request.get("model", "mock"), content, token_ms)
+        await asyncio.sleep(len(content.split()) * token_ms / 1000)
+        return {
+            "id": f"mock-{app.state.completions}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"completions": app.state.completions, "streams_cancelled": app.state.streams_cancelled}
+
+    return app
+
+
+def start_in_thread(port: int, latency_ms: float = 200.0, jitter_ms: float = 0.0,
+                    token_ms: float = 0.0) -> uvicorn.Server:
+    """Run the mock server on a background thread; stop with server.should_exit = True"""
+    config = uvicorn.Config(create_app(latency_ms, jitter_ms, token_ms), host="127.0.0.1", port=port,
+                            log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=0.0, help="generation time per word")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms, args.token_ms), host="127.0.0.1", port=args.port)
@@ -1,24 +1,52 @@
 """
 Synthetic Healthcare Data Generator
-Generates 100 user profiles with medical conditions and dietary preferences
+Generates user profiles with medical conditions and dietary preferences,
+plus mood, CGM and food log history
+
+Scales from the 100-user demo to millions of users: per-user fields and
+log series are drawn in bulk with NumPy, names come from a Faker-seeded
+pool instead of one Faker call per row, chunks of users can be generated
+in worker processes, and rows are bulk-loaded with chunked executemany
+into index-free log tables whose indexes are rebuilt once at the end.
+Throughput is bounded by SQLite's single-writer insert rate, a few
+hundred thousand rows per second per writer.
+
+Usage:
+    python data_generator.py --users 1000000 --days 365 --readings-per-day 24 --workers 8
 """
 
-import sqlite3
+import argparse
+import multiprocessing
 import os
-import random
+import shutil
+import sqlite3
+import time
+
+import numpy as np
 from faker import Faker
 
+from agents import cgm_rollups, retention, traits
+from agents.migrations import create_log_indexes, drop_log_indexes, migrate
+
 # Configuration
 DB_FILE = os.environ.get("DB_FILE", "./data/user_data.db")
-NUM_USERS = 100
+NUM_USERS = int(os.environ.get("NUM_USERS", 100))
+HISTORY_DAYS = int(os.environ.get("HISTORY_DAYS", 7))
+READINGS_PER_DAY = int(os.environ.get("READINGS_PER_DAY", 96))
+MOODS_PER_DAY = 1
+MEALS_PER_DAY = 3
+
+# Each worker task is sized to roughly this many log rows
+ROWS_PER_CHUNK = 500000
+NAME_POOL_SIZE = 500
 
 # Data distributions
 CITIES = ["New York", "London", "Tokyo", "Bangalore", "Sydney", "Toronto", "Berlin", "Singapore"]
 DIETS = ["vegetarian", "non-vegetarian", "vegan"]
 MEDICAL_CONDITIONS = [
-    "Type 2 Diabetes", 
-    "Hypertension", 
-    "Celiac Disease", 
+    "Type 2 Diabetes",
+    "Hypertension",
+    "Celiac Disease",
     "Heart Disease",
     "High Cholesterol",
     "None"
@@ -30,122 +58,254 @@ PHYSICAL_LIMITATIONS = [
     "Visual impairment",
     "Hearing impairment"
 ]
+MOODS = ["happy", "sad", "tired", "excited", "anxious", "angry", "calm", "stressed"]
+MEALS = [
+    ("oatmeal with berries and coffee", "Carbs: 45g, Protein: 10g, Fat: 6g"),
+    ("greek yogurt with nuts", "Carbs: 18g, Protein: 20g, Fat: 14g"),
+    ("grilled chicken salad", "Carbs: 15g, Protein: 35g, Fat: 18g"),
+    ("lentil soup with brown rice", "Carbs: 55g, Protein: 18g, Fat: 5g"),
+    ("tofu stir fry with vegetables", "Carbs: 25g, Protein: 22g, Fat: 12g"),
+    ("baked salmon with quinoa", "Carbs: 35g, Protein: 30g, Fat: 15g"),
+    ("vegetable curry with chapati", "Carbs: 60g, Protein: 12g, Fat: 14g"),
+    ("scrambled eggs on whole wheat toast", "Carbs: 28g, Protein: 18g, Fat: 16g"),
+    ("banana and peanut butter smoothie", "Carbs: 48g, Protein: 14g, Fat: 12g"),
+    ("chickpea and spinach stew", "Carbs: 40g, Protein: 15g, Fat: 8g"),
+]
+
+
+def _condition_table() -> np.ndarray:
+    """Condition strings indexed by [forced T2D, first pick, second pick or none]
+
+    Encodes the original per-user rules: 1-2 distinct conditions, every fifth
+    user gets Type 2 Diabetes as the first condition, and "None" is dropped
+    when paired with a real condition.
+    """
+    count = len(MEDICAL_CONDITIONS)
+    table = np.empty((2, count, count + 1), dtype=object)
+    for forced in (0, 1):
+        for first in range(count):
+            for second in range(count + 1):
+                conditions = [MEDICAL_CONDITIONS[first]]
+                if second < count:
+                    conditions.append(MEDICAL_CONDITIONS[second])
+                if forced and "Type 2 Diabetes" not in conditions:
+                    conditions[0] = "Type 2 Diabetes"
+                if "None" in conditions and len(conditions) > 1:
+                    conditions.remove("None")
+                table[forced, first, second] = ", ".join(conditions)
+    return table
+
+
+def _generate_chunk(task: tuple) -> tuple:
+    """Build users and log rows for user IDs [first_id, last_id)"""
+    first_id, last_id, config, first_names, last_names = task
+    rng = np.random.default_rng(config["seed"] + first_id)
+    ids = np.arange(first_id, last_id)
+    n = len(ids)
+    end = config["end"]
+    days = config["days"]
+
+    # Users
+    first_pick = rng.integers(0, len(MEDICAL_CONDITIONS), n)
+    second_pick = (first_pick + rng.integers(1, len(MEDICAL_CONDITIONS), n)) % len(MEDICAL_CONDITIONS)
+    second_pick = np.where(rng.random(n) < 0.5, second_pick, len(MEDICAL_CONDITIONS))
+    forced = (ids % 5 == 0).astype(int)
+    conditions = _condition_table()[forced, first_pick, second_pick]
+    diabetic = np.array(["Type 2 Diabetes" in c for c in conditions])
+    users = list(zip(
+        ids.tolist(),
+        np.asarray(first_names, dtype=object)[rng.integers(0, len(first_names), n)].tolist(),
+        np.asarray(last_names, dtype=object)[rng.integers(0, len(last_names), n)].tolist(),
+        np.asarray(CITIES, dtype=object)[rng.integers(0, len(CITIES), n)].tolist(),
+        np.asarray(DIETS, dtype=object)[(ids - 1) % len(DIETS)].tolist(),
+        conditions.tolist(),
+        np.asarray(PHYSICAL_LIMITATIONS, dtype=object)[rng.integers(0, len(PHYSICAL_LIMITATIONS), n)].tolist(),
+    ))
+
+    # CGM: baseline + diurnal swing + smoothed noise, on a per-user phase-shifted grid
+    cgm = []
+    per_user = days * config["readings_per_day"]
+    if per_user:
+        interval = 86400 // config["readings_per_day"]
+        offsets = rng.integers(0, interval, n)[:, None]
+        times = end - days * 86400 + offsets + np.arange(per_user)[None, :] * interval
+        base = rng.normal(115, 15, n) + np.where(diabetic, 45, 0)
+        noise = rng.normal(0, 18, (n, per_user + 3)).cumsum(axis=1)
+        smoothed = (noise[:, 3:] - noise[:, :-3]) / 3
+        swing = 25 * np.sin(2 * np.pi * (times % 86400) / 86400 - np.pi / 2)
+        glucose = np.clip(base[:, None] + swing + smoothed, 40, 400).astype(np.int64)
+        cgm = list(zip(np.repeat(ids, per_user).tolist(), times.ravel().tolist(), glucose.ravel().tolist()))
+
+    # Mood: spread evenly through waking hours (08:00-22:00)
+    moods = []
+    per_user = days * config["moods_per_day"]
+    if per_user:
+        day_start = end - end % 86400 - (days - 1) * 86400
+        slot = np.arange(per_user)
+        times = (day_start + (slot // config["moods_per_day"]) * 86400 + 8 * 3600
+                 + (slot % config["moods_per_day"]) * (14 * 3600 // config["moods_per_day"]))
+        times = times[None, :] + rng.integers(0, 1800, (n, per_user))
+        picks = np.asarray(MOODS, dtype=object)[rng.integers(0, len(MOODS), (n, per_user))]
+        moods = list(zip(np.repeat(ids, per_user).tolist(), times.ravel().tolist(), picks.ravel().tolist()))
+
+    # Food: meals from 07:00 spaced through the day
+    food = []
+    per_user = days * config["meals_per_day"]
+    if per_user:
+        day_start = end - end % 86400 - (days - 1) * 86400
+        slot = np.arange(per_user)
+        times = (day_start + (slot // config["meals_per_day"]) * 86400 + 7 * 3600
+                 + (slot % config["meals_per_day"]) * (12 * 3600 // max(1, config["meals_per_day"] - 1)))
+        times = times[None, :] + rng.integers(0, 3600, (n, per_user))
+        picks = rng.integers(0, len(MEALS), (n, per_user)).ravel()
+        descriptions = np.asarray([m[0] for m in MEALS], dtype=object)[picks].tolist()
+        nutrients = np.asarray([m[1] for m in MEALS], dtype=object)[picks].tolist()
+        food = list(zip(np.repeat(ids, per_user).tolist(), times.ravel().tolist(), descriptions, nutrients))
+
+    return users, cgm, moods, food
+
+
+def generate_synthetic_data(db_file=DB_FILE, num_users=NUM_USERS, days=HISTORY_DAYS,
+                            readings_per_day=READINGS_PER_DAY, moods_per_day=MOODS_PER_DAY,
+                            meals_per_day=MEALS_PER_DAY, workers=1, seed=42):
+    """Generate synthetic users and log history"""
 
-def generate_synthetic_data():
-    """Generate synthetic healthcare data for 100 users"""
-    
     print(f"📊 Generating synthetic data...")
-    print(f"Database location: {DB_FILE}")
-    
+    print(f"Database location: {db_file}")
+    print(f"👥 {num_users} users, {days} days of history "
+          f"({readings_per_day} CGM readings, {moods_per_day} moods, {meals_per_day} meals per day)")
+
     # Ensure directory exists
-    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-    
-    # Connect to database
-    conn = sqlite3.connect(DB_FILE)
+    os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+
+    # Create or upgrade the schema
+    migrate(db_file)
+
+    # Connect to database, tuned for a one-off bulk load
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")
     cursor = conn.cursor()
+
+    # With --keep-existing, new users are appended after the existing ones
+    first_user_id = cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users").fetchone()[0] + 1
+    # Existing rollups stay as they are: archived months' readings are no longer in cgm_logs
+    last_cgm_log_id = cursor.execute("SELECT COALESCE(MAX(log_id), 0) FROM cgm_logs").fetchone()[0]
+
+    # Faker is slow per call; draw a pool of names once and sample from it
     fake = Faker()
+    fake.seed_instance(seed)
+    first_names = [fake.first_name() for _ in range(NAME_POOL_SIZE)]
+    last_names = [fake.last_name() for _ in range(NAME_POOL_SIZE)]
 
-    # Create USERS table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            city TEXT NOT NULL,
-            diet_preference TEXT NOT NULL,
-            medical_conditions TEXT,
-            physical_limitations TEXT
-        )
-    """)
-
-    # Create LOG tables
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS mood_logs (
-            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            mood TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cgm_logs (
-            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            glucose_reading INTEGER NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS food_logs (
-            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            meal_description TEXT NOT NULL,
-            nutrients TEXT,
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
-        )
-    """)
-
-    # Generate user data
-    user_data = []
-    for i in range(1, NUM_USERS + 1):
-        # Ensure even distribution of diets
-        diet = DIETS[(i - 1) % len(DIETS)]
-        
-        # Randomly assign 1-2 medical conditions
-        num_conditions = random.randint(1, 2)
-        conditions = random.sample(MEDICAL_CONDITIONS, k=num_conditions)
-        
-        # Ensure Type 2 Diabetes is present in ~20% of users
-        if i % 5 == 0 and "Type 2 Diabetes" not in conditions:
-            conditions[0] = "Type 2 Diabetes"
-        
-        # Remove duplicates and handle "None"
-        if "None" in conditions and len(conditions) > 1:
-            conditions.remove("None")
-        
-        # Physical limitations
-        limitations = random.choice(PHYSICAL_LIMITATIONS)
-        
-        user_data.append((
-            i,
-            fake.first_name(),
-            fake.last_name(),
-            random.choice(CITIES),
-            diet,
-            ", ".join(conditions),
-            limitations
-        ))
-
-    # Insert data
-    cursor.executemany("""
-        INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, user_data)
-
-    # Commit and close
+    config = {
+        "seed": seed,
+        "end": int(time.time()),
+        "days": days,
+        "readings_per_day": readings_per_day,
+        "moods_per_day": moods_per_day,
+        "meals_per_day": meals_per_day,
+    }
+    rows_per_user = max(1, days * (readings_per_day + moods_per_day + meals_per_day))
+    chunk_users = max(1, min(num_users, ROWS_PER_CHUNK // rows_per_user))
+    end_user_id = first_user_id + num_users
+    tasks = [
+        (first_id, min(first_id + chunk_users, end_user_id), config, first_names, last_names)
+        for first_id in range(first_user_id, end_user_id, chunk_users)
+    ]
+
+    start = time.time()
+    totals = {"users": 0, "cgm": 0, "mood": 0, "food": 0}
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    drop_log_indexes(conn)
+    try:
+        chunks = pool.imap(_generate_chunk, tasks) if pool else map(_generate_chunk, tasks)
+        for done, (users, cgm, moods, food) in enumerate(chunks, 1):
+            # Insert data
+            cursor.executemany("""
+                INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, users)
+            cursor.executemany("""
+                INSERT INTO cgm_logs (user_id, timestamp, glucose_reading) VALUES (?, ?, ?)
+            """, cgm)
+            cursor.executemany("""
+                INSERT INTO mood_logs (user_id, timestamp, mood) VALUES (?, ?, ?)
+            """, moods)
+            cursor.executemany("""
+                INSERT INTO food_logs (user_id, timestamp, meal_description, nutrients) VALUES (?, ?, ?, ?)
+            """, food)
+            conn.commit()
+
+            totals["users"] += len(users)
+            totals["cgm"] += len(cgm)
+            totals["mood"] += len(moods)
+            totals["food"] += len(food)
+            if len(tasks) > 1 and (done % max(1, len(tasks) // 10) == 0 or done == len(tasks)):
+                elapsed = time.time() - start
+                rows = sum(totals.values())
+                print(f"   {done}/{len(tasks)} chunks, {rows:,} rows, {rows / elapsed:,.0f} rows/sec")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        # Rebuild the indexes even if the load failed; only the failed chunk is rolled back
+        conn.rollback()
+        print(f"🗂️  Building log indexes...")
+        create_log_indexes(conn)
+        conn.commit()
+    print(f"📊 Building CGM rollups...")
+    cgm_rollups.backfill(conn, last_cgm_log_id)
     conn.commit()
-    
+    print(f"🏷️  Indexing conditions and limitations...")
+    traits.rebuild(conn)
+    conn.commit()
+
     # Verify data
     cursor.execute("SELECT COUNT(*) FROM users")
     count = cursor.fetchone()[0]
-    
+
+    elapsed = time.time() - start
     print(f"✅ Successfully generated {count} user records")
+    print(f"📈 Logs: {totals['cgm']:,} CGM, {totals['mood']:,} mood, {totals['food']:,} food "
+          f"in {elapsed:.1f}s ({sum(totals.values()) / max(elapsed, 1e-9):,.0f} rows/sec)")
     print(f"📍 Cities: {', '.join(CITIES[:5])}...")
     print(f"🍽️  Diets: {', '.join(DIETS)}")
     print(f"💊 Medical conditions: {len(MEDICAL_CONDITIONS)} types")
     print(f"♿ Physical limitations: {len(PHYSICAL_LIMITATIONS)} types")
-    
+
     conn.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic healthcare data")
+    parser.add_argument("--db-file", default=DB_FILE)
+    parser.add_argument("--users", type=int, default=NUM_USERS)
+    parser.add_argument("--days", type=int, default=HISTORY_DAYS, help="days of log history per user")
+    parser.add_argument("--readings-per-day", type=int, default=READINGS_PER_DAY)
+    parser.add_argument("--moods-per-day", type=int, default=MOODS_PER_DAY)
+    parser.add_argument("--meals-per-day", type=int, default=MEALS_PER_DAY)
+    parser.add_argument("--workers", type=int, default=1, help="generator processes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-existing", action="store_true", help="append new users to an existing database")
+    args = parser.parse_args()
+
     # Clean slate
-    if os.path.exists(DB_FILE):
-        print(f"🗑️  Removing existing database...")
-        os.remove(DB_FILE)
-    
-    generate_synthetic_data()
-    print(f"✅ Data generation complete!\n")
\ No newline at end of file
+    if not args.keep_existing:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db_file + suffix):
+                if not suffix:
+                    print(f"🗑️  Removing existing database...")
+                os.remove(args.db_file + suffix)
+        # Archived logs belong to the database being replaced
+        shutil.rmtree(retention.archive_dir(args.db_file), ignore_errors=True)
+
+    generate_synthetic_data(
+        db_file=args.db_file,
+        num_users=args.users,
+        days=args.days,
+        readings_per_day=args.readings_per_day,
+        moods_per_day=args.moods_per_day,
+        meals_per_day=args.meals_per_day,
+        workers=args.workers,
+        seed=args.seed
+    )
+    print(f"✅ Data generation complete!\n")
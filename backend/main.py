@@ -3,21 +3,56 @@ Healthcare Multi-Agent System Backend
 """
 
 import os
+import asyncio
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from datetime import datetime, timezone
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 
 # Load environment variables
 load_dotenv()
 
 # Import database tools for data operations
-from agents.tools import DatabaseTool
+from agents.db import WORKERS
+from agents.tools import DatabaseTool, AsyncDatabaseTool
+from agents.migrations import LATEST_VERSION, migrate, schema_version
+from agents.ingest import CGMIngestQueue, IngestQueueFull
+from agents.glucose_stats import range_alert
+from agents.router import route_message
+from agents.sessions import get_session_store
+from agents import history, replies
+from agents.nutrition import get_nutrient_estimator
+from agents.meal_plans import MealPlanScheduler, get_meal_planner
+from agents.retention import LogRetention, RetentionScheduler
+from agents import metrics
+from agents.metrics import CHAT_SECONDS, CHAT_STAGE_SECONDS, SWALLOWED_ERRORS, timed
 
-# Initialize database tool
+# Initialize database tool; the chat endpoint goes through the async facade
 db_tool = DatabaseTool()
+async_db = AsyncDatabaseTool(db_tool)
+cgm_ingest = CGMIngestQueue(db_tool.pool, on_commit=db_tool.cgm_committed)
+nutrient_estimator = get_nutrient_estimator()
+meal_planner = get_meal_planner(db_tool.db_file)
+meal_plan_scheduler = MealPlanScheduler(meal_planner)
+session_store = get_session_store(db_tool.db_file)
+log_retention = LogRetention(db_tool.pool)
+retention_scheduler = RetentionScheduler(log_retention)
+# Schema version once the startup migration succeeded; migration_failed is 1 after an error
+schema_status = {"version": 0, "latest_version": LATEST_VERSION, "migration_failed": 0}
+
+metrics.register_gauges("healthcare_profile_cache", db_tool.profiles.stats)
+metrics.register_gauges("healthcare_cgm_ingest", lambda: cgm_ingest.stats)
+metrics.register_gauges("healthcare_nutrient_estimates", nutrient_estimator.stats)
+metrics.register_gauges("healthcare_meal_plan_cache", meal_planner.cache.stats)
+metrics.register_gauges("healthcare_meal_plan_scheduler", lambda: meal_plan_scheduler.stats)
+metrics.register_gauges("healthcare_sessions", session_store.stats)
+metrics.register_gauges("healthcare_trait_index", db_tool.traits.stats)
+metrics.register_gauges("healthcare_log_retention", lambda: log_retention.stats)
+metrics.register_gauges("healthcare_schema", lambda: schema_status)
 
 # Create FastAPI app
 app = FastAPI(
@@ -40,152 +75,440 @@ class ChatMessage(BaseModel):
     message: str
     user_id: Optional[int] = None
 
-class ChatResponse(BaseModel):
-    response: str
-    agent_used: str
+class CGMReading(BaseModel):
+    user_id: int
+    timestamp: datetime
+    glucose: int = Field(gt=0)
+
+def epoch_seconds(value: datetime) -> int:
+    """Unix seconds for a parsed timestamp; naive values are taken as UTC"""
+    return int((value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp())
+
+async def run_migrations():
+    try:
+        version = await asyncio.to_thread(migrate, db_tool.db_file)
+        print(f"Database schema at version {version}")
+    except Exception as e:
+        # Endpoints needing the new tables answer 503 with this reason (see require_schema)
+        app.state.migration_error = f"{type(e).__name__}: {e}"
+        schema_status["migration_failed"] = 1
+        print(f"Database migration failed: {e}")
+        return
+    schema_status["version"] = version
+    if os.environ.get("PROFILE_CACHE_WARM", "").lower() in ("1", "true", "yes"):
+        try:
+            loaded = await async_db.warm_profiles()
+            print(f"Profile cache warmed with {loaded} users")
+        except Exception as e:
+            print(f"Profile cache warm-up failed: {e}")
+    try:
+        loaded = await async_db.rebuild_glucose_stats()
+        print(f"Glucose statistics rebuilt from {loaded} readings")
+    except Exception as e:
+        print(f"Glucose statistics rebuild failed: {e}")
+    # Started after the rebuild so bands known at startup do not trigger precomputes
+    meal_plan_scheduler.start()
+    retention_scheduler.start()
+
+@app.on_event("startup")
+async def start_migrations():
+    # Upgrade in the background; old-layout tables keep serving meanwhile
+    app.state.migration_error = None
+    app.state.migration = asyncio.create_task(run_migrations())
+
+async def require_schema(version: int) -> None:
+    """503 unless the schema has reached version: the upgrade is still running or it failed"""
+    if schema_status["version"] >= version:
+        return
+    error = getattr(app.state, "migration_error", None)
+    if error:
+        raise HTTPException(status_code=503, detail=f"Database upgrade failed: {error}")
+    if await asyncio.to_thread(schema_version, db_tool.pool) >= version:
+        return
+    raise HTTPException(status_code=503, detail="Database upgrade in progress; retry shortly")
+
+@app.on_event("startup")
+async def start_cgm_ingest():
+    cgm_ingest.start()
+
+@app.on_event("shutdown")
+async def shutdown_database():
+    await asyncio.to_thread(meal_plan_scheduler.stop)
+    await asyncio.to_thread(retention_scheduler.stop)
+    await asyncio.to_thread(cgm_ingest.stop)
+    async_db.shutdown()
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "Healthcare Multi-Agent System"}
+    return {
+        "status": "degraded" if schema_status["migration_failed"] else "healthy",
+        "service": "Healthcare Multi-Agent System",
+        "schema": {**schema_status, "migration_error": getattr(app.state, "migration_error", None)},
+        "nutrient_estimates": nutrient_estimator.stats(),
+        "meal_plans": {**meal_planner.cache.stats(), "scheduler": meal_plan_scheduler.stats}
+    }
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency histograms, swallowed-error counters and cache/client gauges"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=0)")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # CopilotKit API endpoints
 @app.get("/agno")
 async def copilotkit_root():
     return {"message": "CopilotKit API is running"}
 
-@app.post("/agno")
-async def copilotkit_chat(request: dict):
-    """CopilotKit chat endpoint"""
+async def is_known_user(user_id: Optional[int], session=None) -> bool:
+    """Check a user ID against the session, or the profile cache / users table"""
+    if not user_id:
+        return False
+    if session is not None and session.user_id == user_id:
+        return True
     try:
-        message = request.get("message", "").lower()
-        user_id = request.get("user_id")
-        
-        # Extract user ID from message if present
-        import re
-        user_id_match = re.search(r'\d+', message)
-        if user_id_match:
-            user_id = int(user_id_match.group())
-        
-        # Handle different types of messages
-        if any(keyword in message for keyword in ["hello", "hi", "start", "begin", "user id", "id"]):
-            if user_id and 1 <= user_id <= 100:
-                # Validate user with database
+        with timed(CHAT_STAGE_SECONDS, "validate"):
+            return (await async_db.validate_user(user_id))["valid"]
+    except Exception:
+        SWALLOWED_ERRORS.inc("validate")
+        return False
+
+async def resolve_turn(request: dict) -> tuple:
+    """(session, route, user ID, lower-cased message) for one chat request
+
+    With a live ``session_token`` the user comes from the session, so it is
+    neither parsed from the message nor validated again, and a message
+    without intent keywords answers the question the last reply asked. A
+    greeting naming another user ID starts over without the session.
+    """
+    message = request.get("message", "").lower()
+    token = request.get("session_token")
+    session = session_store.get_cached(token)
+    if session is None and token and session_store.persistent:
+        session = await asyncio.get_running_loop().run_in_executor(async_db.executor, session_store.load, token)
+    
+    with timed(CHAT_STAGE_SECONDS, "route"):
+        route = route_message(message, session.pending if session is not None else None)
+    if session is not None and route.intent == "greeting" and route.user_id not in (None, session.user_id):
+        session = None
+    user_id = session.user_id if session is not None else route.user_id or request.get("user_id")
+    return session, route, user_id, message
+
+async def open_session(user_id: int, profile: dict):
+    if session_store.persistent:
+        return await asyncio.get_running_loop().run_in_executor(
+            async_db.executor, session_store.create, user_id, profile
+        )
+    return session_store.create(user_id, profile)
+
+async def save_session(session) -> None:
+    """Write the session through when sessions are persisted"""
+    if session is not None and session_store.persistent:
+        await asyncio.get_running_loop().run_in_executor(async_db.executor, session_store.save, session)
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {replies.dumps(data).decode()}\n\n"
+
+def reply_events(reply: replies.Reply):
+    reply = reply.to_dict()
+    yield sse_event("token", {"content": reply.pop("content")})
+    yield sse_event("done", reply)
+
+async def stream_chat(request: dict):
+    """Server-Sent Events for /agno: "token" events with content deltas, then "done"
+
+    Meal plans are streamed from the model as they are generated (a cached
+    plan arrives as one token). Other intents send their reply as a single
+    token. When the client disconnects, Starlette cancels this generator,
+    which cancels the upstream LLM request.
+    """
+    try:
+        session, route, user_id, message = await resolve_turn(request)
+        if route.intent != "meal_planner" or not await is_known_user(user_id, session):
+            reply = await answer_turn(session, route, user_id, message)
+            for event in reply_events(reply):
+                yield event
+            return
+    except Exception as e:
+        SWALLOWED_ERRORS.inc("chat")
+        print(f"Chat request failed: {e}")
+        for event in reply_events(replies.STATIC["fallback"]):
+            yield event
+        return
+    
+    if session is not None:
+        session_store.record(session, route.intent, message)
+        await save_session(session)
+    with timed(CHAT_SECONDS, route.intent):
+        started = False
+        try:
+            state = await asyncio.get_running_loop().run_in_executor(
+                async_db.executor, meal_planner.state_for, user_id
+            )
+            async for delta in meal_planner.stream_plan(state):
+                if not started:
+                    started = True
+                    yield sse_event("token", {"content": replies.MEAL_PLAN_HEADER})
+                yield sse_event("token", {"content": delta})
+            yield sse_event("done", {"role": "assistant", "agent": "meal_planner"})
+            return
+        except Exception as e:
+            SWALLOWED_ERRORS.inc("meal_plan_stream")
+            print(f"Meal plan stream failed: {e}")
+            if started:
+                yield sse_event("error", {"content": "The meal plan was interrupted. Please try again."})
+                return
+        # Nothing sent yet: answer like the non-streaming endpoint (cached or sample plan)
+        reply = await chat_reply(route, message, user_id, session)
+    for event in reply_events(reply):
+        yield event
+
+async def chat_reply(route, message: str, user_id: Optional[int], session=None) -> replies.Reply:
+    """Reply to one routed chat message; a greeting with a valid user ID opens a session"""
+    # Handle different types of messages
+    if route.intent == "greeting":
+        if user_id:
+            # Validate user with database; the profile cache drops a profile when it
+            # is updated, so a session takes the current one from it
+            try:
+                result = await async_db.validate_user(user_id)
+                if not result["valid"]:
+                    return replies.unknown_user(user_id)
+                reply = replies.greeting(user_id, result)
+                if session is None:
+                    reply.session_token = (await open_session(user_id, result)).token
+                else:
+                    session.profile = result
+                return reply
+            except:
+                SWALLOWED_ERRORS.inc("greeting")
+            return replies.greeting(user_id)
+        return replies.STATIC["ask_user_id"]
+    
+    elif route.intent == "mood":
+        if await is_known_user(user_id, session):
+            # Try to log mood if user provided one
+            detected_mood = route.mood
+    
+            if detected_mood:
                 try:
-                    result = db_tool.validate_user(user_id)
-                    if result["valid"]:
-                        return {
-                            "content": f"Hello! Welcome to the Healthcare Multi-Agent System! 👋\n\nUser ID {user_id} validated successfully!\n\nName: {result['first_name']} {result['last_name']}\nCity: {result['city']}\nDiet: {result['diet_preference']}\nMedical Conditions: {result['medical_conditions']}\nPhysical Limitations: {result['physical_limitations']}\n\nHow can I assist you today? I can help you with:\n- Logging your mood\n- Recording CGM readings\n- Tracking food intake\n- Generating personalized meal plans\n- Answering general questions",
-                            "role": "assistant"
-                        }
+                    result = await async_db.log_mood(user_id, detected_mood)
+                    return replies.mood_logged(detected_mood, result["message"])
                 except:
-                    pass
-                return {
-                    "content": f"Hello! Welcome to the Healthcare Multi-Agent System! 👋\n\nUser ID {user_id} validated successfully!\n\nHow can I assist you today? I can help you with:\n- Logging your mood\n- Recording CGM readings\n- Tracking food intake\n- Generating personalized meal plans\n- Answering general questions",
-                    "role": "assistant"
-                }
-            return {
-                "content": "Hello! Please enter your User ID (1-100) to get started. 👋",
-                "role": "assistant"
-            }
-        
-        elif any(keyword in message for keyword in ["mood", "feeling", "happy", "sad", "tired", "excited"]):
-            if user_id and 1 <= user_id <= 100:
-                # Try to log mood if user provided one
-                mood_keywords = ["happy", "sad", "tired", "excited", "anxious", "angry", "calm", "stressed"]
-                detected_mood = None
-                for mood in mood_keywords:
-                    if mood in message:
-                        detected_mood = mood
-                        break
-                
-                if detected_mood:
+                    SWALLOWED_ERRORS.inc("mood")
+                    return replies.mood_logged(detected_mood)
+    
+        if session is not None:
+            session.pending = "mood"
+        return replies.STATIC["ask_mood"]
+    
+    elif route.intent == "cgm":
+        if await is_known_user(user_id, session):
+            # Glucose reading extracted by the router
+            glucose_reading = route.glucose
+            if glucose_reading is not None:
+                if 50 <= glucose_reading <= 500:  # Reasonable range
                     try:
-                        result = db_tool.log_mood(user_id, detected_mood)
-                        return {
-                            "content": f"✅ {result['message']}\n\nYour mood ({detected_mood}) has been logged successfully!",
-                            "role": "assistant"
-                        }
+                        result = await async_db.log_cgm(user_id, glucose_reading)
+                        return replies.cgm_logged(glucose_reading, result["message"], result["alert"],
+                                                  result["stats"])
                     except:
-                        return {
-                            "content": f"✅ Your mood ({detected_mood}) has been logged successfully!",
-                            "role": "assistant" "mood"
-                        }
-            
-            return {
-                "content": "I'd be happy to help you log your mood! How are you feeling right now? (happy, sad, tired, excited, anxious, etc.)",
-                "role": "assistant" "mood"
-            }
-        
-        elif any(keyword in message for keyword in ["glucose", "cgm", "blood sugar", "reading"]):
-            if user_id and 1 <= user_id <= 100:
-                # Try to extract glucose reading
-                glucose_match = re.search(r'\d+', message)
-                if glucose_match:
-                    glucose_reading = int(glucose_match.group())
-                    if 50 <= glucose_reading <= 500:  # Reasonable range
-                        try:
-                            result = db_tool.log_cgm(user_id, glucose_reading)
-                            alert_msg = ""
-                            if glucose_reading > 200 or glucose_reading < 85:
-                                alert_msg = f"\n\n⚠️ Alert: Glucose reading {glucose_reading} mg/dL is outside normal range (80-300 mg/dL)"
-                            return {
-                                "content": f"✅ {result['message']}{alert_msg}",
-                                "role": "assistant" "cgm"
-                            }
-                        except:
-                            alert_msg = ""
-                            if glucose_reading > 200 or glucose_reading < 85:
-                                alert_msg = f"\n\n⚠️ Alert: Glucose reading {glucose_reading} mg/dL is outside normal range (80-300 mg/dL)"
-                            return {
-                                "content": f"✅ CGM reading {glucose_reading} mg/dL logged successfully!{alert_msg}",
-                                "role": "assistant" "cgm"
-                            }
-            
-            return {
-                "content": "I can help you log your CGM reading! What's your current glucose reading in mg/dL?",
-                "role": "assistant" "cgm"
-            }
-        
-        elif any(keyword in message for keyword in ["food", "meal", "ate", "eating", "breakfast", "lunch", "dinner"]):
-            if user_id and 1 <= user_id <= 100:
-                # Extract meal description
-                meal_description = message
-                try:
-                    result = db_tool.log_food(user_id, meal_description, "Carbs: 30g, Protein: 15g, Fat: 10g")
-                    return {
-                        "content": f"✅ {result['message']}\n\n🍽️ Meal: {meal_description}\n📊 Estimated nutrients: Carbs: 30g, Protein: 15g, Fat: 10g\n\nYour food intake has been logged!",
-                        "role": "assistant" "food"
-                    }
-                except:
-                    return {
-                        "content": f"✅ Your meal has been logged successfully!\n\n🍽️ Meal: {meal_description}\n📊 Estimated nutrients: Carbs: 30g, Protein: 15g, Fat: 10g",
-                        "role": "assistant" "food"
-                    }
-            
-            return {
-                "content": "I can help you log your food intake! Please describe what you ate (e.g., 'oatmeal with berries and coffee').",
-                "role": "assistant" "food"
-            }
-        
-        elif any(keyword in message for keyword in ["plan", "meal plan", "menu", "suggest"]):
-            return {
-                "content": "🍽️ **Your Personalized Meal Plan**\n\n🌅 BREAKFAST: Healthy Oatmeal Bowl\n- Steel-cut oats with berries\n- Greek yogurt\n- Nuts and seeds\n📊 Macros: Carbs: 45g | Protein: 20g | Fat: 12g\n💡 Note: High fiber for stable glucose\n\n☀️ LUNCH: Grilled Chicken Salad\n- Mixed greens with vegetables\n- Grilled chicken breast\n- Olive oil dressing\n📊 Macros: Carbs: 15g | Protein: 35g | Fat: 18g\n💡 Note: Low-carb, high protein\n\n🌙 DINNER: Baked Salmon with Quinoa\n- Baked salmon fillet\n- Quinoa and vegetables\n- Herbs and lemon\n📊 Macros: Carbs: 35g | Protein: 30g | Fat: 15g\n💡 Note: Omega-3 rich, balanced meal\n\n🎯 PLAN RATIONALE: This plan provides balanced nutrition with controlled carbohydrates to help maintain stable blood glucose levels.",
-                "role": "assistant" "meal_planner"
-            }
-        
-        else:
-            return {
-                "content": "I'm here to help with your healthcare needs! You can ask me about:\n- Logging your mood\n- Recording CGM readings\n- Tracking food intake\n- Generating meal plans\n- General health questions\n\nIs there anything specific I can help you with?",
-                "role": "assistant" "interrupt"
-            }
+                        SWALLOWED_ERRORS.inc("cgm")
+                        return replies.cgm_logged(glucose_reading, alert=range_alert(glucose_reading))
+    
+        if session is not None:
+            session.pending = "cgm"
+        return replies.STATIC["ask_cgm"]
+    
+    elif route.intent == "food":
+        if await is_known_user(user_id, session):
+            # Extract meal description
+            meal_description = message
+            try:
+                with timed(CHAT_STAGE_SECONDS, "nutrients"):
+                    nutrients = await nutrient_estimator.estimate_async(meal_description)
+            except Exception as e:
+                SWALLOWED_ERRORS.inc("nutrients")
+                print(f"Nutrient estimation failed: {e}")
+                nutrients = "not available"
+            try:
+                result = await async_db.log_food(user_id, meal_description, nutrients)
+                return replies.food_logged(meal_description, nutrients, result["message"])
+            except:
+                SWALLOWED_ERRORS.inc("food")
+                return replies.food_logged(meal_description, nutrients)
+    
+        if session is not None:
+            session.pending = "food"
+        return replies.STATIC["ask_food"]
+    
+    elif route.intent == "meal_planner":
+        if await is_known_user(user_id, session):
+            try:
+                with timed(CHAT_STAGE_SECONDS, "meal_plan"):
+                    meal_plan = await asyncio.get_running_loop().run_in_executor(
+                        async_db.executor, meal_planner.cached_plan, user_id
+                    )
+            except Exception as e:
+                SWALLOWED_ERRORS.inc("meal_plan")
+                print(f"Meal plan lookup failed: {e}")
+                meal_plan = None
+            if meal_plan is not None:
+                return replies.meal_plan(meal_plan)
+            # No plan for this health state yet: prepare one in the background
+            meal_plan_scheduler.request(user_id)
+        return replies.STATIC["sample_meal_plan"]
+    
+    else:
+        return replies.STATIC["help"]
+
+async def answer_turn(session, route, user_id: Optional[int], message: str) -> replies.Reply:
+    """Reply to a resolved turn, recording it in the session"""
+    if session is not None:
+        session_store.record(session, route.intent, message)
+    
+    with timed(CHAT_SECONDS, route.intent):
+        reply = await chat_reply(route, message, user_id, session)
+    await save_session(session)
+    return reply
+
+async def chat_turn(request: dict) -> replies.Reply:
+    try:
+        # Classify the message and pull out mood / glucose / user ID in one pass
+        session, route, user_id, message = await resolve_turn(request)
+        return await answer_turn(session, route, user_id, message)
         
     except Exception as e:
-        return {
-            "content": "I'm experiencing some technical difficulties right now, but I'm still here to help! Please try asking me about:\n- Logging your mood\n- Recording CGM readings\n- Tracking food intake\n- Generating meal plans",
-            "role": "assistant" "fallback"
-        }
+        SWALLOWED_ERRORS.inc("chat")
+        print(f"Chat request failed: {e}")
+        return replies.STATIC["fallback"]
+
+@app.post("/agno")
+async def copilotkit_chat(request: dict):
+    """CopilotKit chat endpoint; {"stream": true} answers with Server-Sent Events"""
+    if request.get("stream"):
+        return StreamingResponse(
+            stream_chat(request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    return replies.ReplyResponse(await chat_turn(request))
+
 
+# Bulk CGM ingestion for sensor gateways
+@app.post("/cgm/batch")
+async def ingest_cgm_batch(readings: List[CGMReading], wait_for_commit: bool = True):
+    """Buffer CGM readings for group commit
+
+    Returns 200 once the readings are committed, or 202 as soon as they are
+    buffered when wait_for_commit is false. Responds 429 when the ingest
+    buffer is full; nothing from the request was stored and it can be retried.
+    """
+    rows = [(r.user_id, epoch_seconds(r.timestamp), r.glucose) for r in readings]
+    try:
+        future = cgm_ingest.submit(rows)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"CGM ingest buffer full: {e}", headers={"Retry-After": "1"})
+    
+    if not wait_for_commit:
+        return JSONResponse(status_code=202, content={"accepted": len(rows), "committed": False})
+    await asyncio.wrap_future(future)
+    return {"accepted": len(rows), "committed": True}
+
+# Downsampled CGM history for charts
+@app.get("/users/{user_id}/cgm/history")
+async def cgm_history(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      resolution: str = "auto", max_points: int = Query(500, ge=1, le=10000)):
+    """CGM readings or hourly/daily aggregates between start and end
+
+    Defaults to the last 7 days. resolution=auto returns raw readings for
+    short ranges and the coarsest rollup that still gives about
+    max_points points otherwise; raw, hour and day force one.
+    """
+    await require_schema(5)  # cgm_rollups
+    end_ts = epoch_seconds(end) if end else int(datetime.now(timezone.utc).timestamp())
+    start_ts = epoch_seconds(start) if start else end_ts - 7 * 86400
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    try:
+        return await async_db.get_cgm_history(user_id, start_ts, end_ts, resolution, max_points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Full log history, one keyset page at a time
+@app.get("/users/{user_id}/logs/{kind}")
+async def log_history(user_id: int, kind: str, cursor: Optional[str] = None,
+                      limit: int = Query(history.PAGE_SIZE, ge=1, le=history.MAX_PAGE_SIZE)):
+    """Newest-first mood, cgm or food logs; pass next_cursor back for the following page"""
+    try:
+        return await async_db.get_log_page(kind, user_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def export_logs(kind: str, user_id: Optional[int], fmt: str):
+    """Yield an export one batch at a time; stops early if the client disconnects"""
+    if fmt == "csv":
+        yield history.to_csv(kind, [], header=True)
+    after = None
+    while True:
+        rows, after = await async_db.export_log_batch(kind, user_id, after)
+        if rows:
+            yield history.to_csv(kind, rows) if fmt == "csv" else history.to_ndjson(kind, rows)
+        if after is None:
+            return
+
+# Streaming bulk export for nightly jobs
+@app.get("/export/{kind}")
+async def export_log_history(kind: str, format: str = "ndjson", user_id: Optional[int] = None):
+    """Stream every mood, cgm or food log, for one user or everyone, as NDJSON or CSV"""
+    if kind not in history.LOG_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown log kind {kind!r}")
+    if format not in history.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format {format!r}")
+    filename = f"{kind}_logs{f'_user_{user_id}' if user_id is not None else ''}.{format}"
+    return StreamingResponse(
+        export_logs(kind, user_id, format),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Cohort lookups over the in-memory condition/limitation bitmaps
+@app.get("/users")
+async def find_users(diet: Optional[str] = None, city: Optional[str] = None,
+                     condition: List[str] = Query([]), limitation: List[str] = Query([]),
+                     after: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000)):
+    """IDs of the users matching every filter, e.g. ?diet=vegan&condition=Celiac Disease
+    &limitation=Swallowing difficulties; pass next_after back as after for the next page"""
+    await require_schema(6)  # user_conditions / user_limitations
+    labels = {dimension: value for dimension, value in
+              (("diet", diet), ("city", city), ("condition", condition), ("limitation", limitation)) if value}
+    return await async_db.find_users(after, limit, **labels)
+
+def population_analytics():
+    """Analytics engine, imported on first use to keep NumPy off the startup path"""
+    from agents.analytics import get_population_analytics
+    engine = get_population_analytics(db_tool.db_file)
+    metrics.register_gauges("healthcare_analytics", engine.stats)
+    return engine
+
+# Population cohort reports
+@app.get("/analytics/cohorts")
+async def cohort_report(metric: str = "cgm", by: str = "", days: int = Query(7, ge=1, le=3650),
+                        city: Optional[str] = None, diet: Optional[str] = None,
+                        condition: Optional[str] = None, limitation: Optional[str] = None):
+    """Aggregate cgm, mood or food logs of the last days, grouped by a comma-separated
+    list of city, diet, condition and limitation, optionally within one cohort"""
+    await require_schema(5)  # cgm_rollups
+    group_by = [dimension.strip() for dimension in by.split(",") if dimension.strip()]
+    filters = {dimension: label for dimension, label in
+               (("city", city), ("diet", diet), ("condition", condition), ("limitation", limitation))
+               if label is not None}
+    try:
+        return await asyncio.to_thread(population_analytics().report, metric, group_by, filters, days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Agent info endpoint
 @app.get("/agno/agents")
@@ -208,11 +531,15 @@ if __name__ == "__main__":
     print(f"OpenAI API Key: {'Set' if os.environ.get('OPENAI_API_KEY') else 'Missing'}")
     print(f"Server: http://0.0.0.0:8000")
     print(f"API Docs: http://0.0.0.0:8000/docs")
-    print(f"Agno Endpoint: http://0.0.0.0:8000/agno\n")
+    print(f"Agno Endpoint: http://0.0.0.0:8000/agno")
+    print(f"Workers: {WORKERS}\n")
     
+    # Several workers need the app as an import string; they share the
+    # database through WAL and the cross-process write lock (agents.db)
     uvicorn.run(
-        app,
+        "main:app" if WORKERS > 1 else app,
         host=os.environ.get("AGNO_HOST", "0.0.0.0"),
         port=int(os.environ.get("AGNO_PORT", 8000)),
+        workers=WORKERS,
         log_level="info"
     )
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""
+Tests for appending synthetic users to an existing database
+"""
+
+from agents import cgm_rollups
+from agents.db import get_pool
+from agents.retention import MIN_RETENTION_DAYS, LogRetention
+from data_generator import generate_synthetic_data
+
+SIZE = {"days": 60, "readings_per_day": 4, "moods_per_day": 1, "meals_per_day": 1}
+
+
+def rollups(pool, where: str = "", params: tuple = ()) -> list:
+    with pool.connection() as conn:
+        return conn.execute(f"SELECT * FROM cgm_rollups {where} ORDER BY user_id, span, bucket", params).fetchall()
+
+
+def test_appending_users_keeps_archived_rollups(tmp_path):
+    db_file = str(tmp_path / "user_data.db")
+    generate_synthetic_data(db_file, num_users=5, **SIZE)
+    pool = get_pool(db_file)
+    cutoff = LogRetention(pool, days=MIN_RETENTION_DAYS).run()["cutoff"]
+    archived = rollups(pool, "WHERE bucket < ?", (cutoff,))
+    assert archived
+
+    generate_synthetic_data(db_file, num_users=3, seed=7, **SIZE)
+    assert rollups(pool, "WHERE user_id <= 5 AND bucket < ?", (cutoff,)) == archived
+    with pool.connection() as conn:
+        readings = conn.execute("SELECT COUNT(*) FROM cgm_logs WHERE user_id > 5").fetchone()[0]
+    day = cgm_rollups.SPANS["day"]
+    assert sum(row[3] for row in rollups(pool, "WHERE user_id > 5 AND span = ?", (day,))) == readings
@@ -0,0 +1,47 @@
+"""
+Tests for the meal plan cache and the planner's LLM call count
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.db import get_pool
+from agents.meal_plans import HealthState, MealPlanCache, MealPlanner
+from agents.migrations import migrate
+
+STATE = ("vegetarian", ("type 2 diabetes",), (), "high", None)
+
+
+def test_plans_are_shared_between_workers(tmp_path):
+    db_file = str(tmp_path / "plans.db")
+    migrate(db_file)
+    pool = get_pool(db_file)
+    nightly, other = MealPlanCache(pool=pool), MealPlanCache(pool=pool)
+    assert other.get(STATE) is None
+    nightly.put(STATE, "BREAKFAST: oats")
+    assert other.get(STATE) == "BREAKFAST: oats"
+    assert other.age(STATE) < 5
+    assert other.stats()["loaded"] == 1
+
+
+def test_shared_plans_keep_their_expiry(tmp_path):
+    db_file = str(tmp_path / "plans.db")
+    migrate(db_file)
+    pool = get_pool(db_file)
+    MealPlanCache(ttl=0.05, pool=pool).put(STATE, "BREAKFAST: oats")
+    time.sleep(0.1)
+    cache = MealPlanCache(ttl=0.05, pool=pool)
+    assert cache.get(STATE) is None
+    assert cache.purge_expired() == 1
+
+
+def test_llm_calls_are_counted_from_every_thread():
+    class LLM:
+        def complete_sync(self, messages, max_tokens):
+            return "BREAKFAST: oats"
+
+    planner = MealPlanner(db_tool=None, llm=LLM())
+    states = [HealthState("vegan", (), (), band, None) for band in ("low", "in_range", "high", None)] * 500
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(planner.generate, states))
+    assert planner.llm_calls == len(states)
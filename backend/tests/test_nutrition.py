@@ -0,0 +1,40 @@
+"""
+Tests for the nutrient cache key and the local food index
+"""
+
+import pytest
+
+from agents.nutrition import FoodIndex, normalize_meal
+
+
+@pytest.mark.parametrize("first, second", [
+    ("I ate Oatmeal with berries & coffee!", "oatmeal with berry and coffee"),
+    ("a plate of rice", "rice"),
+    ("some rice for lunch", "Rice."),
+])
+def test_same_meal_shares_a_key(first, second):
+    assert normalize_meal(first) == normalize_meal(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("large burrito", "small burrito"),
+    ("large burrito", "burrito"),
+    ("fried rice", "rice"),
+    ("grilled chicken", "chicken"),
+])
+def test_size_and_preparation_stay_in_the_key(first, second):
+    assert normalize_meal(first) != normalize_meal(second)
+
+
+def test_index_scales_by_size_and_quantity():
+    index = FoodIndex()
+    burrito = index.estimate("burrito")
+    assert index.estimate("large burrito") == pytest.approx(tuple(value * 1.5 for value in burrito))
+    assert index.estimate("2 large eggs") == pytest.approx(tuple(value * 3 for value in index.estimate("egg")))
+
+
+def test_index_skips_only_preparations_it_assumes():
+    index = FoodIndex()
+    assert index.estimate("grilled chicken salad") is not None
+    assert index.estimate("fried rice") is None
+    assert index.estimate("scrambled eggs") is not None
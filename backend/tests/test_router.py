@@ -0,0 +1,111 @@
+"""
+Tests for agents.router against the current keyword set
+"""
+
+import pytest
+
+from agents.router import INTENT_KEYWORDS, route_message
+
+
+def as_tuple(route) -> tuple:
+    return (route.intent, route.mood, route.glucose, route.user_id)
+
+
+@pytest.mark.parametrize("message, expected", [
+    # message -> (intent, mood, glucose, user_id)
+    ("Hello!", ("greeting", None, None, None)),
+    ("hi, my user id is 42", ("greeting", None, None, 42)),
+    ("hello 7", ("greeting", None, None, 7)),
+    ("Let's begin", ("greeting", None, None, None)),
+    ("I'm feeling happy today", ("mood", "happy", None, None)),
+    ("log my mood please", ("mood", None, None, None)),
+    ("so tired and sad", ("mood", "tired", None, None)),
+    ("I feel anxious", ("mood", "anxious", None, None)),
+    ("glucose reading 150", ("cgm", None, 150, None)),
+    ("my blood sugar is 95 mg/dl", ("cgm", None, 95, None)),
+    ("CGM 210", ("cgm", None, 210, None)),
+    ("reading", ("cgm", None, None, None)),
+    ("I ate oatmeal with berries and coffee", ("food", None, None, None)),
+    ("had eggs for breakfast", ("food", None, None, None)),
+    ("eating 2 bananas", ("food", None, None, None)),
+    ("generate a meal plan", ("meal_planner", None, None, None)),
+    ("what's on the menu?", ("meal_planner", None, None, None)),
+    ("can you suggest something", ("meal_planner", None, None, None)),
+    ("what is the capital of France?", ("interrupt", None, None, None)),
+    ("this is great, thanks", ("interrupt", None, None, None)),
+    ("which one did you mean", ("interrupt", None, None, None)),
+    ("I was late for the meeting", ("interrupt", None, None, None)),
+])
+def test_routes(message, expected):
+    assert as_tuple(route_message(message)) == expected
+
+
+@pytest.mark.parametrize("intent, keyword", [
+    (intent, keyword) for intent, keywords in INTENT_KEYWORDS.items() for keyword in keywords
+    if keyword not in ("id", "user id", "meal")
+])
+def test_every_keyword_routes_to_its_intent(intent, keyword):
+    assert route_message(f"something about {keyword.upper()} here").intent == intent
+
+
+def test_longer_phrase_wins_over_its_prefix():
+    assert route_message("meal plan").intent == "meal_planner"
+    assert route_message("meal").intent == "food"
+    assert route_message("blood   sugar 101").glucose == 101
+
+
+def test_keywords_match_whole_words_only():
+    assert route_message("chips").intent == "interrupt"
+    assert route_message("plant").intent == "interrupt"
+    assert route_message("update").intent == "interrupt"
+    assert route_message("his").intent == "interrupt"
+    assert route_message("ids").intent == "interrupt"
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("what meals should I eat", ("food", None, None, None)),
+    ("my readings are 150", ("cgm", None, 150, None)),
+    ("blood sugars 140", ("cgm", None, 140, None)),
+    ("any suggestions?", ("meal_planner", None, None, None)),
+    ("plans for the week", ("meal_planner", None, None, None)),
+    ("meal plans", ("meal_planner", None, None, None)),
+    ("any moods to log", ("mood", None, None, None)),
+])
+def test_keyword_inflections_route_like_the_keyword(message, expected):
+    assert as_tuple(route_message(message)) == expected
+
+
+def test_intent_priority():
+    assert route_message("hello, I'm happy").intent == "greeting"
+    assert route_message("happy after my glucose reading").intent == "mood"
+    assert route_message("glucose after breakfast 130").intent == "cgm"
+
+
+@pytest.mark.parametrize("message, user_id", [
+    ("id: 13", 13),
+    ("user id 5", 5),
+    ("my id is 12", 12),
+    ("ID number 99", 99),
+])
+def test_bare_user_id_is_a_greeting(message, user_id):
+    assert as_tuple(route_message(message)) == ("greeting", None, None, user_id)
+
+
+def test_user_id_with_another_intent_keeps_that_intent():
+    assert as_tuple(route_message("user id 5, glucose 120")) == ("cgm", None, 120, 5)
+    assert as_tuple(route_message("id 12, feeling sad")) == ("mood", "sad", None, 12)
+    assert as_tuple(route_message("id 3 ate toast")) == ("food", None, None, 3)
+
+
+def test_bare_number_is_glucose_not_user_id():
+    route = route_message("reading 150")
+    assert (route.glucose, route.user_id) == (150, None)
+    route = route_message("eating 2 bananas")
+    assert (route.glucose, route.user_id) == (None, None)
+
+
+def test_follow_up_applies_only_without_keywords():
+    assert as_tuple(route_message("142", follow_up="cgm")) == ("cgm", None, 142, None)
+    assert route_message("oatmeal with berries", follow_up="food").intent == "food"
+    assert route_message("hello", follow_up="cgm").intent == "greeting"
+    assert route_message("142").intent == "interrupt"
@@ -0,0 +1,41 @@
+"""
+Tests for the in-memory session store
+"""
+
+import time
+
+from agents.sessions import SessionStore
+
+PROFILE = {"valid": True, "first_name": "Ada"}
+
+
+def test_expired_sessions_are_dropped_as_new_ones_arrive():
+    store = SessionStore(ttl=0.05)
+    old = [store.create(user_id, PROFILE) for user_id in range(100)]
+    time.sleep(0.1)
+    fresh = store.create(1000, PROFILE)
+    assert store.stats()["size"] == 1
+    assert store.stats()["expired"] == 100
+    assert store.get_cached(old[0].token) is None
+    assert store.get_cached(fresh.token) is fresh
+
+
+def test_lookup_keeps_a_session_alive():
+    store = SessionStore(ttl=0.2)
+    kept = store.create(1, PROFILE)
+    dropped = store.create(2, PROFILE)
+    time.sleep(0.12)
+    assert store.get_cached(kept.token) is kept
+    time.sleep(0.12)
+    store.create(3, PROFILE)
+    assert store.get_cached(kept.token) is kept
+    assert store.get_cached(dropped.token) is None
+
+
+def test_purge_expired_in_memory_mode():
+    store = SessionStore(ttl=0.05)
+    for user_id in range(10):
+        store.create(user_id, PROFILE)
+    time.sleep(0.1)
+    assert store.purge_expired() == 10
+    assert store.stats()["size"] == 0
@@ -0,0 +1,27 @@
+"""
+Tests for the trait bitmaps
+"""
+
+import random
+
+import pytest
+
+from agents.traits import from_bitmap, to_bitmap
+
+
+@pytest.mark.parametrize("size, share", [(1000, 0.5), (200000, 0.3), (200000, 0.0005)])
+def test_from_bitmap_pages(size, share):
+    rng = random.Random(size)
+    user_ids = sorted(rng.sample(range(size), int(size * share)))
+    bitmap = to_bitmap(user_ids)
+    assert from_bitmap(bitmap) == user_ids
+    for after in (-1, 0, 7, user_ids[len(user_ids) // 2], size):
+        above = [user_id for user_id in user_ids if user_id > after]
+        assert from_bitmap(bitmap, after) == above
+        for limit in (1, 9, 100, size):
+            assert from_bitmap(bitmap, after, limit) == above[:limit]
+
+
+def test_from_bitmap_empty():
+    assert from_bitmap(0) == []
+    assert from_bitmap(0, 5, 10) == []